@@ -0,0 +1,110 @@
+"""
+Offline batch scorer for CSV/Parquet patient files.
+
+Rows use the same column names as the /ml/predict request bodies (see
+HeartDiseaseData, DiabetesData, ClusteringData) and go through the exact
+preprocessing in routers/ml_models.py. Input is read in chunks, scored in a
+process pool and written incrementally, so file size is not bounded by RAM.
+
+Usage (from backend/):
+    python batch_score.py patients.csv scored.csv --models heart cluster
+    python batch_score.py patients.parquet scored.parquet --models diabetes --shap-top-k 3
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from routers.ml_models import score_dataframe
+
+def is_parquet(path):
+    return path.lower().endswith((".parquet", ".pq"))
+
+def read_chunks(path, chunk_size):
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+class ChunkWriter:
+    """Append scored chunks to a CSV or Parquet file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet_writer = None
+        self.wrote_header = False
+
+    def write(self, df):
+        if is_parquet(self.path):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self.parquet_writer is None:
+                self.parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self.parquet_writer.write_table(table.cast(self.parquet_writer.schema))
+        else:
+            df.to_csv(self.path, mode="a" if self.wrote_header else "w", header=not self.wrote_header, index=False)
+            self.wrote_header = True
+
+    def close(self):
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+
+def score_chunk(chunk, model_names, shap_top_k):
+    """Worker entry point: score one chunk with every requested model."""
+    scored = [chunk]
+    for name in model_names:
+        scored.append(score_dataframe(name, chunk, shap_top_k=shap_top_k if name != 'cluster' else 0))
+    return pd.concat(scored, axis=1)
+
+def run(input_path, output_path, model_names, chunk_size, workers, shap_top_k):
+    writer = ChunkWriter(output_path)
+    start = time.perf_counter()
+    rows = 0
+    in_flight = deque()
+
+    def drain_one():
+        nonlocal rows
+        result = in_flight.popleft().result()
+        writer.write(result)
+        rows += len(result)
+        elapsed = time.perf_counter() - start
+        print(f"   ✅ {rows:,} rows scored | {rows / elapsed:,.0f} rows/s", flush=True)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for chunk in read_chunks(input_path, chunk_size):
+                in_flight.append(pool.submit(score_chunk, chunk, model_names, shap_top_k))
+                # Bounded look-ahead keeps memory flat and output in input order
+                if len(in_flight) >= workers * 2:
+                    drain_one()
+            while in_flight:
+                drain_one()
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"🏁 Scored {rows:,} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s) -> {output_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch-score a CSV/Parquet file of patients")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--models", nargs="+", choices=['heart', 'diabetes', 'cluster'], required=True)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--shap-top-k", type=int, default=0, help="Add the top-k SHAP contributions per row")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"❌ Input file not found: {args.input}")
+        sys.exit(1)
+
+    print(f"🧮 Scoring {args.input} with {', '.join(args.models)} ({args.workers} workers, chunks of {args.chunk_size})")
+    run(args.input, args.output, args.models, args.chunk_size, args.workers, args.shap_top_k)
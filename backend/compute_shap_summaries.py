@@ -0,0 +1,176 @@
+"""
+Offline population-level SHAP summaries for the heart and diabetes models.
+
+Computes SHAP values over the training datasets in models/data in parallel
+chunks, then stores per model version:
+  - global mean |SHAP| and mean signed SHAP per feature
+  - the same broken down by clustering risk level
+  - dependence curves (feature value bin -> mean SHAP)
+Results are upserted into shap_summaries and served by /ml/explain/summary.
+
+Usage (from backend/):
+    python compute_shap_summaries.py --models heart diabetes --workers 4
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from database.database import mongo_db
+from routers.ml_models import (
+    get_model, get_model_version, heart_matrix, preprocess_clustering, assign_clusters,
+    positive_class_shap, HEART_FEATURES, DIABETES_FEATURES
+)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, 'models', 'data')
+
+# Dataset column -> DiabetesData field
+DIABETES_COLUMNS = dict(zip([
+    'Age', 'Gender', 'Polyuria', 'Polydipsia', 'sudden weight loss',
+    'weakness', 'Polyphagia', 'Genital thrush', 'visual blurring',
+    'Itching', 'Irritability', 'delayed healing', 'partial paresis',
+    'muscle stiffness', 'Alopecia', 'Obesity'
+], DIABETES_FEATURES))
+
+# Training columns that carry over to the clustering feature space
+HEART_TO_CLUSTERING = {
+    'age': 'age', 'sex': 'gender', 'cp': 'chest_pain_type', 'trestbps': 'blood_pressure',
+    'chol': 'cholesterol', 'thalach': 'max_heart_rate', 'exang': 'exercise_angina'
+}
+
+DEPENDENCE_BINS = 10
+
+# --- Data loading ---
+
+def load_heart():
+    df = pd.read_csv(os.path.join(DATA_DIR, 'Heart_disease_cleveland_new.csv'), encoding='utf-8-sig')
+    X = pd.DataFrame(heart_matrix(df), columns=HEART_FEATURES)
+    clustering_inputs = df[list(HEART_TO_CLUSTERING)].rename(columns=HEART_TO_CLUSTERING)
+    return X, clustering_inputs
+
+def load_diabetes():
+    df = pd.read_csv(os.path.join(DATA_DIR, 'diabetes_data_upload.csv'))
+    encoders = get_model('diabetes')['encoders']
+    # The model was trained on encodable rows only (e.g. a single gender)
+    for col, le in encoders.items():
+        df = df[df[col].isin(le.classes_)]
+    clustering_inputs = pd.DataFrame({
+        'age': df['Age'].astype(float),
+        'gender': (df['Gender'] == 'Male').astype(float)
+    })
+    for col, le in encoders.items():
+        df[col] = le.transform(df[col])
+    X = df[list(DIABETES_COLUMNS)].rename(columns=DIABETES_COLUMNS).reset_index(drop=True)
+    return X, clustering_inputs.reset_index(drop=True)
+
+def risk_levels(clustering_inputs):
+    m = get_model('clustering')
+    if not m:
+        return np.array(["Unknown"] * len(clustering_inputs))
+    df = preprocess_clustering(clustering_inputs, m)
+    clusters, _ = assign_clusters(df, m)
+    return np.array([m['mapping'].get(c, "Unknown") for c in clusters])
+
+# --- SHAP (runs in worker processes) ---
+
+def _base_value(expected):
+    expected = np.atleast_1d(expected)
+    return float(expected[1] if len(expected) > 1 else expected[0])
+
+def shap_chunk(model_name, chunk):
+    import shap
+    model = get_model('heart') if model_name == 'heart' else get_model('diabetes')['model']
+    explainer = shap.TreeExplainer(model)
+    values = explainer.shap_values(chunk.to_numpy() if model_name == 'heart' else chunk)
+    return positive_class_shap(values), _base_value(explainer.expected_value)
+
+# --- Aggregation ---
+
+def importance(values, features):
+    return sorted([
+        {
+            "feature": f,
+            "mean_abs_shap": float(np.abs(values[:, i]).mean()),
+            "mean_shap": float(values[:, i].mean())
+        }
+        for i, f in enumerate(features)
+    ], key=lambda x: x["mean_abs_shap"], reverse=True)
+
+def dependence_curves(X, values):
+    curves = {}
+    for i, f in enumerate(X.columns):
+        col = X[f].to_numpy(dtype=float)
+        uniques = np.unique(col)
+        if len(uniques) <= DEPENDENCE_BINS:
+            bins = np.searchsorted(uniques, col)
+            centers = uniques
+        else:
+            edges = np.unique(np.quantile(col, np.linspace(0, 1, DEPENDENCE_BINS + 1)))
+            bins = np.clip(np.searchsorted(edges, col, side='right') - 1, 0, len(edges) - 2)
+            centers = (edges[:-1] + edges[1:]) / 2
+        counts = np.bincount(bins, minlength=len(centers))
+        sums = np.bincount(bins, weights=values[:, i], minlength=len(centers))
+        curves[f] = [
+            {"value": float(c), "mean_shap": float(s / n), "count": int(n)}
+            for c, s, n in zip(centers, sums, counts) if n > 0
+        ]
+    return curves
+
+def summarize(model_name, X, values, base_value, risks):
+    by_cluster = {}
+    for risk in np.unique(risks):
+        mask = risks == risk
+        by_cluster[str(risk)] = {
+            "n_rows": int(mask.sum()),
+            "importance": importance(values[mask], X.columns)
+        }
+    return {
+        "model": model_name,
+        "model_version": get_model_version(model_name),
+        "base_value": base_value,
+        "n_rows": int(len(X)),
+        "importance": importance(values, X.columns),
+        "by_cluster": by_cluster,
+        "dependence": dependence_curves(X, values),
+        "computed_at": datetime.utcnow()
+    }
+
+async def compute(model_names, workers, chunk_size):
+    loaders = {'heart': load_heart, 'diabetes': load_diabetes}
+    loop = asyncio.get_running_loop()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for name in model_names:
+            start = time.perf_counter()
+            X, clustering_inputs = loaders[name]()
+            risks = risk_levels(clustering_inputs)
+
+            chunks = [X.iloc[i:i + chunk_size] for i in range(0, len(X), chunk_size)]
+            results = await asyncio.gather(*[
+                loop.run_in_executor(pool, shap_chunk, name, chunk) for chunk in chunks
+            ])
+            values = np.vstack([r[0] for r in results])
+
+            summary = summarize(name, X, values, results[0][1], risks)
+            await mongo_db.shap_summaries.update_one(
+                {"model": name, "model_version": summary["model_version"]},
+                {"$set": summary},
+                upsert=True
+            )
+            print(f"✅ {name}: {len(X)} rows in {len(chunks)} chunks, {time.perf_counter() - start:.1f}s "
+                  f"(version {summary['model_version']})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute population SHAP summaries")
+    parser.add_argument("--models", nargs="+", choices=['heart', 'diabetes'], default=['heart', 'diabetes'])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--chunk-size", type=int, default=64)
+    args = parser.parse_args()
+
+    asyncio.run(compute(args.models, args.workers, args.chunk_size))
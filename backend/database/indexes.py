@@ -0,0 +1,75 @@
+from database.database import mongo_db
+
+async def ensure_indexes():
+    """Create MongoDB indexes used by the hot read paths (idempotent)."""
+    # Feature store: one document per patient
+    await mongo_db.patient_features.create_index("patient_id", unique=True)
+
+    # Latest-prediction lookups
+    await mongo_db.heart_predictions.create_index([("patient_id", 1), ("created_at", -1)])
+    await mongo_db.diabetes_predictions.create_index([("patient_id", 1), ("created_at", -1)])
+    await mongo_db.clustering_predictions.create_index([("patient_id", 1), ("created_at", -1)])
+    # Idempotent rescoring upserts
+    for collection in ("heart_predictions", "diabetes_predictions", "clustering_predictions"):
+        await mongo_db[collection].create_index([("patient_id", 1), ("model_version", 1), ("source", 1)])
+
+    # Population SHAP summaries
+    await mongo_db.shap_summaries.create_index([("model", 1), ("model_version", 1)], unique=True)
+    await mongo_db.shap_summaries.create_index([("model", 1), ("computed_at", -1)])
+
+    # Completed stays (length-of-stay training data)
+    await mongo_db.admissions.create_index([("patient_id", 1), ("admitted_at", 1)])
+    await mongo_db.beds.create_index("status")
+
+    # Resumable batch jobs
+    await mongo_db.job_checkpoints.create_index("job", unique=True)
+
+    # Latest observations overlaid by change-driven re-scoring
+    await mongo_db.lab_results.create_index([("patient_id", 1), ("lab_type", 1), ("imported_at", -1)])
+    await mongo_db.vitals_checks.create_index([("patient_id", 1), ("checked_at", -1)])
+
+    # Population risk rollups
+    await mongo_db.risk_rollups.create_index("model", unique=True)
+    await mongo_db.risk_rollup_state.create_index([("patient_id", 1), ("model", 1)], unique=True)
+
+    # Cohort engine: facts on patient_features and materialized membership
+    await mongo_db.patient_features.create_index([("risk_level", 1), ("age", 1)])
+    await mongo_db.patient_features.create_index("age")
+    await mongo_db.patient_features.create_index("conditions")
+    await mongo_db.patient_features.create_index("heart_probability")
+    await mongo_db.patient_features.create_index("diabetes_probability")
+    await mongo_db.cohort_members.create_index([("cohort_id", 1), ("patient_id", 1)], unique=True)
+    await mongo_db.cohort_members.create_index("patient_id")
+    await mongo_db.cohort_comparisons.create_index("key", unique=True)
+    await mongo_db.cohort_comparisons.create_index("computed_at", expireAfterSeconds=7 * 24 * 3600)
+    await mongo_db.beds.create_index("patient_id")
+
+    # Adverse-event daily buckets
+    await mongo_db.adverse_event_daily.create_index("day", unique=True)
+
+    # Treatment outcomes (nightly watermark job)
+    await mongo_db.admissions.create_index("discharged_at")
+    await mongo_db.treatment_outcomes.create_index([("condition", 1), ("month", 1)], unique=True)
+    await mongo_db.stay_outcomes.create_index([("condition", 1), ("month", 1)])
+    await mongo_db.bed_events.create_index([("patient_id", 1), ("at", 1)])
+    await mongo_db.prescriptions.create_index([("patient_id", 1), ("date", 1)])
+    await mongo_db.medical_history.create_index("patient_id")
+
+    # Bed event log and daily utilization summaries
+    await mongo_db.bed_events.create_index([("bed_id", 1), ("at", 1)])
+    await mongo_db.bed_events.create_index("at")
+    await mongo_db.bed_utilization_daily.create_index([("day", 1), ("ward", 1), ("bed_type", 1)], unique=True)
+
+    # Cost-per-patient sketches
+    await mongo_db.cost_sketches.create_index([("day", 1), ("department", 1), ("category", 1)], unique=True)
+    await mongo_db.bed_occupancy_hourly.create_index("hour", unique=True)
+
+    # Waitlist queue / matcher rebuilt from waiting entries at startup
+    await mongo_db.waitlist.create_index("status")
+
+    # Delta sync: documents stamped with their last revision
+    await mongo_db.beds.create_index("rev")
+    await mongo_db.resources.create_index("rev")
+
+    # Hospital topology
+    await mongo_db.wards.create_index("name", unique=True)
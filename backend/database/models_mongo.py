@@ -123,6 +123,7 @@ class ReadmissionData(BaseModel):
 class BillItem(BaseModel):
     description: str
     cost: float
+    category: Optional[str] = None # consultations, procedures, medications, room, other
 
 class BillData(BaseModel):
     patient_id: str
@@ -130,6 +131,7 @@ class BillData(BaseModel):
     items: List[BillItem]
     amount: float
     status: str = "Pending"
+    department: Optional[str] = None
     date: datetime = Field(default_factory=datetime.utcnow)
 
 class DailySales(BaseModel):
@@ -189,8 +191,27 @@ class BedData(BaseModel):
     type: str # 'General', 'ICU', 'Private', 'Emergency'
     status: str = "Available" # Available, Occupied, Maintenance
     patient_id: Optional[str] = None
+    ward: Optional[str] = None
+    floor: Optional[int] = None
+    building: Optional[str] = None
+    room: Optional[str] = None
+    capabilities: List[str] = [] # isolation, oxygen, ventilator, telemetry, ...
     last_updated: datetime = Field(default_factory=datetime.utcnow)
 
+class WardData(BaseModel):
+    name: str
+    building: str = "Main"
+    floor: int = 0
+    position: int = 0 # order of the ward along its floor
+    departments: List[str] = [] # waitlist departments this ward admits
+
+class BedLocation(BaseModel):
+    building: Optional[str] = None
+    floor: Optional[int] = None
+    ward: Optional[str] = None
+    room: Optional[str] = None
+    capabilities: Optional[List[str]] = None
+
 class BedAllocation(BaseModel):
     bed_id: str
     patient_id: str
@@ -204,5 +225,6 @@ class WaitlistEntry(BaseModel):
     priority: str # High, Medium, Low
     reason: str
     department: str
+    required_bed_type: Optional[str] = None # General, ICU, Private, Emergency
     status: str = "Waiting" # Waiting, Admitted, Cancelled
     created_at: datetime = Field(default_factory=datetime.utcnow)
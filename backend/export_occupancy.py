@@ -0,0 +1,48 @@
+"""
+Export the hourly bed occupancy series as daily resource-forecasting training rows.
+
+Brings the series up to date, then converts it in one aggregation into the
+resources_ai.csv layout (date, beds, icu, er_visits, occupancy_rate).
+With --merge-into, the observed columns replace or extend an existing
+training CSV. Columns that beds cannot provide (oxygen, weather, staff,
+holiday) are left empty (NaN) on new dates rather than invented; drop or
+impute those rows explicitly before training.
+
+Usage (from backend/):
+    python export_occupancy.py --output occupancy_daily.csv
+    python export_occupancy.py --merge-into models/data/resources_ai.csv
+"""
+import argparse
+import asyncio
+
+import pandas as pd
+
+from utils.bed_occupancy import extend_series, daily_training_frame
+
+async def export(output, merge_into):
+    written = await extend_series()
+    print(f"🕒 Occupancy series extended by {written} hours")
+    observed = await daily_training_frame()
+    print(f"📤 {len(observed)} days of observed occupancy")
+
+    if merge_into:
+        base = pd.read_csv(merge_into)
+        merged = base.set_index("date").combine_first(observed.set_index("date"))
+        merged.update(observed.set_index("date"))
+        merged = merged.sort_index().reset_index()[base.columns]
+        merged.to_csv(output or merge_into, index=False)
+        new_days = len(merged) - len(base)
+        print(f"✅ Merged into {output or merge_into} ({len(merged)} rows, {new_days} new with bed-derived columns only)")
+    else:
+        observed.to_csv(output, index=False)
+        print(f"✅ Wrote {output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export bed occupancy history for resource forecasting")
+    parser.add_argument("--output", help="CSV to write (defaults to --merge-into when merging)")
+    parser.add_argument("--merge-into", help="Existing training CSV (resources_ai.csv layout) to update")
+    args = parser.parse_args()
+    if not args.output and not args.merge_into:
+        parser.error("provide --output and/or --merge-into")
+
+    asyncio.run(export(args.output, args.merge_into))
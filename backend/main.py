@@ -8,6 +8,7 @@ from routers import (
 from database.database import engine, Base
 from middleware.audit import AuditMiddleware
 import uvicorn
+import asyncio
 
 # Create Tables (SQL)
 Base.metadata.create_all(bind=engine)
@@ -63,6 +64,65 @@ app.include_router(reports.router)
 async def startup_event():
     """Initialize heavy resources at startup"""
     print("🚀 Starting HealthForesight API...")
+    try:
+        from database.indexes import ensure_indexes
+        await ensure_indexes()
+    except Exception as e:
+        print(f"⚠️ Index creation skipped: {e}")
+    try:
+        from utils.adverse_trends import ensure_buckets
+        await ensure_buckets()
+    except Exception as e:
+        print(f"⚠️ Adverse-event bucket backfill skipped: {e}")
+    try:
+        from utils.cost_analytics import ensure_sketches
+        await ensure_sketches()
+    except Exception as e:
+        print(f"⚠️ Cost sketch backfill skipped: {e}")
+    try:
+        from utils.live_counters import live_counters
+        await live_counters.reconcile()
+    except Exception as e:
+        print(f"⚠️ Live counters not seeded: {e}")
+    try:
+        from utils.revisions import revisions
+        await revisions.load()
+    except Exception as e:
+        print(f"⚠️ Board revisions not loaded: {e}")
+    try:
+        from utils.waitlist_queue import waitlist_queue
+        await waitlist_queue.load()
+        from utils.waitlist_matching import waitlist_matcher
+        await waitlist_matcher.load()
+    except Exception as e:
+        print(f"⚠️ Waitlist queue/matcher not loaded: {e}")
+    try:
+        from utils.bed_topology import bed_index
+        await bed_index.load()
+    except Exception as e:
+        print(f"⚠️ Bed index not loaded: {e}")
+    
+    # Background monitors
+    from utils.drift_monitor import drift_monitor
+    asyncio.create_task(drift_monitor.run())
+    from utils.shadow import shadow_evaluator
+    asyncio.create_task(shadow_evaluator.run())
+    from utils.vitals_stream import vitals_stream
+    asyncio.create_task(vitals_stream.run())
+    from utils.repredict import repredict_queue
+    asyncio.create_task(repredict_queue.run())
+    from utils import outcomes
+    asyncio.create_task(outcomes.run())
+    from utils import bed_utilization
+    asyncio.create_task(bed_utilization.run())
+    from utils import bed_occupancy
+    asyncio.create_task(bed_occupancy.run())
+    from utils import cost_analytics
+    asyncio.create_task(cost_analytics.run())
+    from utils.revisions import revisions
+    asyncio.create_task(revisions.run())
+    from utils.live_counters import live_counters
+    asyncio.create_task(live_counters.run())
     print("📦 Pre-loading RAG components for faster chatbot responses...")
     from routers.chatbot import initialize_rag
     initialize_rag()
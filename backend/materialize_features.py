@@ -0,0 +1,67 @@
+"""
+Backfill patient_features from patient_profiles and rebuild cohort membership.
+
+Needed after FEATURE_SCHEMA_VERSION changes, or for profiles that were
+written outside /portal/profile (seed scripts, sync_profiles.py). Latest
+risk outputs are copied from the prediction collections onto the facts
+before every cohort is re-materialized.
+
+Usage (from backend/):
+    python materialize_features.py --batch-size 1000
+"""
+import argparse
+import asyncio
+import time
+
+from pymongo import UpdateOne
+
+from database.database import mongo_db
+from utils.cohort_engine import RISK_FACTS, materialize_cohort
+from utils.feature_store import build_feature_doc
+from utils.population_scoring import TARGET_COLLECTIONS
+
+async def backfill_features(batch_size):
+    processed = 0
+    batch = []
+    async for profile in mongo_db.patient_profiles.find({}, {"_id": 0}).batch_size(batch_size):
+        batch.append(UpdateOne({"patient_id": profile["patient_id"]}, {"$set": build_feature_doc(profile)}, upsert=True))
+        if len(batch) >= batch_size:
+            await mongo_db.patient_features.bulk_write(batch, ordered=False)
+            processed += len(batch)
+            batch = []
+            print(f"   ✅ {processed} profiles materialized")
+    if batch:
+        await mongo_db.patient_features.bulk_write(batch, ordered=False)
+        processed += len(batch)
+    return processed
+
+async def backfill_risk_facts(batch_size):
+    for model, (field, source) in RISK_FACTS.items():
+        cursor = mongo_db[TARGET_COLLECTIONS[model]].aggregate([
+            {"$sort": {"patient_id": 1, "created_at": -1}},
+            {"$group": {"_id": "$patient_id", "value": {"$first": f"${source}"}}}
+        ], allowDiskUse=True)
+        batch = []
+        async for row in cursor:
+            batch.append(UpdateOne({"patient_id": row["_id"]}, {"$set": {field: row["value"]}}))
+            if len(batch) >= batch_size:
+                await mongo_db.patient_features.bulk_write(batch, ordered=False)
+                batch = []
+        if batch:
+            await mongo_db.patient_features.bulk_write(batch, ordered=False)
+
+async def main(batch_size):
+    start = time.perf_counter()
+    processed = await backfill_features(batch_size)
+    await backfill_risk_facts(batch_size)
+    async for cohort in mongo_db.cohorts.find({}, {"name": 1, "filters": 1}):
+        count = await materialize_cohort(cohort["_id"], cohort.get("filters") or {})
+        print(f"   👥 Cohort '{cohort.get('name')}': {count} patients")
+    print(f"🏁 Done: {processed} profiles in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill patient features and cohort membership")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.batch_size))
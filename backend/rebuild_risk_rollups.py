@@ -0,0 +1,72 @@
+"""
+Rebuild the population risk rollups from the prediction collections.
+
+Takes each patient's latest prediction per model, recomputes the rollup
+cells from scratch and replaces risk_rollups / risk_rollup_state. The
+clustering model is rebuilt first because the other models' cells take
+the patient's cluster from its state. Run it
+once after deploying, or whenever the live counters are suspected to have
+drifted (e.g. after deleting predictions by hand).
+
+Usage (from backend/):
+    python rebuild_risk_rollups.py --models heart diabetes cluster
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime
+
+from pymongo import InsertOne
+
+from database.database import mongo_db
+from utils.population_scoring import TARGET_COLLECTIONS
+from utils.risk_rollups import ROLLUP_MODELS, cell_of, current_clusters
+
+STATE_BATCH_SIZE = 5000
+
+async def rebuild(model):
+    start = time.perf_counter()
+    clusters = {}
+    if model != 'cluster':
+        clusters = await current_clusters(await mongo_db[TARGET_COLLECTIONS['cluster']].distinct("patient_id"))
+    # Uses the (patient_id, created_at) index: one latest document per patient
+    cursor = mongo_db[TARGET_COLLECTIONS[model]].aggregate([
+        {"$sort": {"patient_id": 1, "created_at": -1}},
+        {"$group": {"_id": "$patient_id", "doc": {"$first": "$$ROOT"}}}
+    ], allowDiskUse=True)
+
+    counts = Counter()
+    now = datetime.utcnow()
+    await mongo_db.risk_rollup_state.delete_many({"model": model})
+    pending = []
+    async for row in cursor:
+        cell = list(cell_of(model, row["doc"], clusters.get(row["_id"])))
+        counts[tuple(cell)] += 1
+        pending.append(InsertOne({"patient_id": row["_id"], "model": model, "cell": cell, "updated_at": now}))
+        if len(pending) >= STATE_BATCH_SIZE:
+            await mongo_db.risk_rollup_state.bulk_write(pending, ordered=False)
+            pending = []
+    if pending:
+        await mongo_db.risk_rollup_state.bulk_write(pending, ordered=False)
+
+    cells = {}
+    for (band, gender, cluster, bucket), n in counts.items():
+        cells.setdefault(band, {}).setdefault(gender, {}).setdefault(cluster, {})[bucket] = n
+    await mongo_db.risk_rollups.replace_one(
+        {"model": model},
+        {"model": model, "patients": sum(counts.values()), "cells": cells, "updated_at": now, "rebuilt_at": now},
+        upsert=True
+    )
+    print(f"✅ {model}: {sum(counts.values())} patients in {len(counts)} cells ({time.perf_counter() - start:.1f}s)")
+
+async def main(models):
+    for model in sorted(models, key=lambda m: m != 'cluster'):
+        await rebuild(model)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild population risk rollups")
+    parser.add_argument("--models", nargs="+", choices=ROLLUP_MODELS, default=list(ROLLUP_MODELS))
+    args = parser.parse_args()
+
+    asyncio.run(main(args.models))
@@ -0,0 +1,122 @@
+"""
+Re-score every patient profile after a model retrain.
+
+Streams patient_profiles in _id order, scores each batch in a process pool
+and writes fresh documents to heart_predictions, diabetes_predictions and
+clustering_predictions with unordered bulk writes. Progress is checkpointed
+in job_checkpoints so an interrupted run can continue with --resume. Writes
+are upserts keyed on (patient_id, model_version, source), so a batch
+replayed after a crash between its write and its checkpoint adds no rows.
+Profiles skipped per model (missing or invalid features) are counted in the
+checkpoint alongside the processed count.
+
+Usage (from backend/):
+    python rescore_population.py --batch-size 2000 --workers 4
+    python rescore_population.py --resume
+"""
+import argparse
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from database.database import mongo_db
+from utils.population_scoring import score_profiles, write_results, SCORABLE_MODELS
+
+JOB_NAME = "rescore_population"
+
+async def save_checkpoint(last_id, processed, skipped, model_names, status="running"):
+    await mongo_db.job_checkpoints.update_one(
+        {"job": JOB_NAME},
+        {"$set": {
+            "last_id": last_id,
+            "processed": processed,
+            "skipped": dict(skipped),
+            "models": list(model_names),
+            "status": status,
+            "updated_at": datetime.utcnow()
+        }},
+        upsert=True
+    )
+
+async def rescore(batch_size, workers, model_names, resume):
+    query = {}
+    processed = 0
+    skipped = {name: 0 for name in model_names}
+    if resume:
+        checkpoint = await mongo_db.job_checkpoints.find_one({"job": JOB_NAME})
+        if checkpoint and checkpoint.get("status") == "running" and checkpoint.get("last_id"):
+            query = {"_id": {"$gt": checkpoint["last_id"]}}
+            processed = checkpoint.get("processed", 0)
+            for name, count in (checkpoint.get("skipped") or {}).items():
+                if name in skipped:
+                    skipped[name] = count
+            print(f"⏩ Resuming after {checkpoint['last_id']} ({processed} profiles already scored, skipped so far: {skipped})")
+        else:
+            print("ℹ️ No unfinished checkpoint found, starting from the beginning")
+
+    total = await mongo_db.patient_profiles.count_documents(query)
+    print(f"🧮 Re-scoring {total} profiles with {workers} workers (models: {', '.join(model_names)})")
+
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    rows_written = 0
+    # Batches complete in submission order so the checkpoint only ever moves forward
+    in_flight = deque()
+
+    async def drain_one():
+        nonlocal processed, rows_written
+        future, last_id, size = in_flight.popleft()
+        results = await future
+        rows_written += await write_results(results, model_names, upsert=True)
+        processed += size
+        for name, count in results.get("skipped", {}).items():
+            skipped[name] = skipped.get(name, 0) + count
+        await save_checkpoint(last_id, processed, skipped, model_names)
+        elapsed = time.perf_counter() - start
+        print(f"   ✅ {processed} profiles | {rows_written} predictions | skipped {sum(skipped.values())} | {processed / elapsed:,.0f} rows/s")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        cursor = mongo_db.patient_profiles.find(query).sort("_id", 1).batch_size(batch_size)
+        batch = []
+        async for profile in cursor:
+            batch.append(profile)
+            if len(batch) >= batch_size:
+                last_id = batch[-1]["_id"]
+                for p in batch:
+                    p.pop("_id", None)
+                in_flight.append((loop.run_in_executor(pool, score_profiles, batch, model_names), last_id, len(batch)))
+                batch = []
+                if len(in_flight) >= workers * 2:
+                    await drain_one()
+
+        if batch:
+            last_id = batch[-1]["_id"]
+            for p in batch:
+                p.pop("_id", None)
+            in_flight.append((loop.run_in_executor(pool, score_profiles, batch, model_names), last_id, len(batch)))
+
+        while in_flight:
+            await drain_one()
+
+    elapsed = time.perf_counter() - start
+    await mongo_db.job_checkpoints.update_one(
+        {"job": JOB_NAME},
+        {"$set": {"status": "completed", "completed_at": datetime.utcnow(), "processed": processed, "skipped": skipped}},
+        upsert=True
+    )
+    rate = processed / elapsed if elapsed > 0 else 0
+    print(f"🏁 Done: {processed} profiles, {rows_written} predictions in {elapsed:.1f}s ({rate:,.0f} rows/s)")
+    print("   ⚠️ Skipped (missing/invalid features): " + ", ".join(f"{name}={count}" for name, count in skipped.items()))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk re-score patient profiles after a model update")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--models", nargs="+", choices=SCORABLE_MODELS, default=list(SCORABLE_MODELS))
+    parser.add_argument("--resume", action="store_true", help="Continue from the last checkpoint")
+    args = parser.parse_args()
+
+    asyncio.run(rescore(args.batch_size, args.workers, tuple(args.models), args.resume))
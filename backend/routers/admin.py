@@ -14,6 +14,7 @@ router = APIRouter(
 )
 
 from database.database import mongo_db
+from utils.live_counters import live_counters
 
 # Dependency to check for Admin role
 def get_current_admin(current_user: User = Depends(get_current_user)):
@@ -25,20 +26,14 @@ def get_current_admin(current_user: User = Depends(get_current_user)):
     return current_user
 
 @router.get("/overview-stats")
-async def get_overview_stats(db: Session = Depends(get_db), admin: User = Depends(get_current_admin)):
-    # 1. SQL Stats
-    total_users = db.query(User).count()
-    active_doctors = db.query(User).filter(User.role == UserRole.doctor).count()
-    
-    # 2. Mongo Stats
-    total_appointments = await mongo_db.appointments.count_documents({})
-    pending_appointments = await mongo_db.appointments.count_documents({"status": "Requested"})
-    
+async def get_overview_stats(admin: User = Depends(get_current_admin)):
+    # In-memory counters (SQL users, Mongo appointments), bounded staleness
+    counters = await live_counters.fresh()
     return {
-        "total_users": total_users,
-        "active_doctors": active_doctors,
-        "total_appointments": total_appointments,
-        "pending_appointments": pending_appointments
+        "total_users": counters.get("users"),
+        "active_doctors": counters.get("users", UserRole.doctor.value),
+        "total_appointments": counters.get("appointments"),
+        "pending_appointments": counters.get("appointments", "Requested")
     }
 
 
@@ -87,6 +82,7 @@ def update_user(user_id: int, user_update: UserUpdate, db: Session = Depends(get
         user.username = user_update.username
     if user_update.email:
         user.email = user_update.email
+    previous_role = user.role
     if user_update.role:
         user.role = user_update.role
     if user_update.specialization is not None:
@@ -95,26 +91,37 @@ def update_user(user_id: int, user_update: UserUpdate, db: Session = Depends(get
         user.is_active = user_update.is_active
         
     db.commit()
+    if user.role != previous_role:
+        live_counters.user_role_changed(previous_role, user.role)
     return {"message": "User updated successfully"}
 
 @router.get("/resources")
-def get_admin_resources(db: Session = Depends(get_db), admin: User = Depends(get_current_admin)):
-    # Enhanced data for Recharts
-    # Beds: Occupied vs Available
-    # ICU: Occupied vs Available
-    # Oxygen: Just a value for gauge/area
+async def get_admin_resources(admin: User = Depends(get_current_admin)):
+    # Beds / ICU: in-memory bed counters by status and type
+    counters = await live_counters.fresh()
+    counts = {
+        (True, status): counters.get("beds", status, "ICU") for status in ("Occupied", "Available")
+    }
+    counts.update({
+        (False, status): counters.get("beds", status) - counts[(True, status)] for status in ("Occupied", "Available")
+    })
+    # Oxygen: level as a percentage of capacity from /resources/update
+    oxygen = await mongo_db.resources.find_one({"type": "oxygen"})
+    level = 0
+    if oxygen and oxygen.get("total_capacity"):
+        level = round(100 * oxygen.get("count", 0) / oxygen["total_capacity"])
     return {
         "beds": [
-            {"name": "Occupied", "value": 165, "fill": "#ef4444"},
-            {"name": "Available", "value": 35, "fill": "#3b82f6"}
+            {"name": "Occupied", "value": counts.get((False, "Occupied"), 0), "fill": "#ef4444"},
+            {"name": "Available", "value": counts.get((False, "Available"), 0), "fill": "#3b82f6"}
         ],
         "icu": [
-             {"name": "Occupied", "value": 42, "fill": "#f59e0b"},
-             {"name": "Available", "value": 8, "fill": "#10b981"}
+             {"name": "Occupied", "value": counts.get((True, "Occupied"), 0), "fill": "#f59e0b"},
+             {"name": "Available", "value": counts.get((True, "Available"), 0), "fill": "#10b981"}
         ],
         "oxygen": [
-            {"name": "Level", "value": 88, "fill": "#3b82f6"},
-            {"name": "Remaining", "value": 12, "fill": "#e2e8f0"}
+            {"name": "Level", "value": level, "fill": "#3b82f6"},
+            {"name": "Remaining", "value": 100 - level, "fill": "#e2e8f0"}
         ]
     }
 
@@ -6,7 +6,6 @@ from typing import Optional, List
 from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor
 import joblib
 import os
 
@@ -15,6 +14,9 @@ router = APIRouter(
     tags=["Analytics & Insights"]
 )
 
+# Outcome data keeps arriving while membership is unchanged, so cached comparisons also expire
+COMPARISON_CACHE_SECONDS = int(os.getenv("COMPARISON_CACHE_SECONDS", "3600"))
+
 # --- Patient Cohort Analysis ---
 
 @router.post("/cohorts/create")
@@ -24,73 +26,154 @@ async def create_cohort(
     current_user: User = Depends(get_current_user)
 ):
     """
-    Create patient cohort based on filters.
-    Filters: {"age_min": 50, "conditions": ["diabetes"], "risk_level": "high"}
+    Create patient cohort based on filters and materialize its membership.
+    Filters: {"age_min": 50, "conditions": ["diabetes"], "risk_level": "High Risk"}
+    Supported keys: age_min, age_max, gender, risk_level, conditions,
+    heart_probability_min, diabetes_probability_min.
     """
+    from utils.cohort_engine import validate_filters, materialize_cohort, invalidate_cohorts
+
+    try:
+        validate_filters(filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     cohort = {
         "name": name,
         "filters": filters,
         "created_by": current_user.username,
         "created_at": datetime.utcnow(),
-        "patient_count": 0  # Calculate from filters
+        "patient_count": 0,
+        "version": 0
     }
     
     result = await mongo_db.cohorts.insert_one(cohort)
-    return {"id": str(result.inserted_id), "message": "Cohort created"}
+    invalidate_cohorts()
+    patient_count = await materialize_cohort(result.inserted_id, filters)
+    return {"id": str(result.inserted_id), "patient_count": patient_count, "message": "Cohort created"}
 
-@router.get("/cohorts/{cohort_id}/stats")
-async def get_cohort_stats(cohort_id: str, current_user: User = Depends(get_current_user)):
-    """Get statistics for a patient cohort with real data aggregation"""
+@router.delete("/cohorts/{cohort_id}")
+async def delete_cohort(cohort_id: str, current_user: User = Depends(get_current_user)):
+    """Delete a cohort and its materialized membership (creator or admin)"""
+    from utils.cohort_engine import invalidate_cohorts
+
+    cohort = await _get_cohort(cohort_id)
+    if current_user.role != UserRole.admin and cohort.get("created_by") != current_user.username:
+        raise HTTPException(status_code=403, detail="Only the creator or an admin can delete a cohort")
+    await mongo_db.cohorts.delete_one({"_id": cohort["_id"]})
+    invalidate_cohorts()
+    await mongo_db.cohort_members.delete_many({"cohort_id": cohort_id})
+    return {"message": "Cohort deleted"}
+
+async def _get_cohort(cohort_id: str):
     from bson import ObjectId
-    
-    # Get cohort definition
-    cohort = await mongo_db.cohorts.find_one({"_id": ObjectId(cohort_id)})
+    from bson.errors import InvalidId
+
+    try:
+        cohort = await mongo_db.cohorts.find_one({"_id": ObjectId(cohort_id)})
+    except InvalidId:
+        cohort = None
     if not cohort:
         raise HTTPException(status_code=404, detail="Cohort not found")
-    
-    filters = cohort.get("filters", {})
-    
-    # Build aggregation pipeline based on filters
-    match_stage = {}
-    
-    # Example: age filter
-    if "age_min" in filters:
-        match_stage["age"] = {"$gte": filters["age_min"]}
-    if "age_max" in filters:
-        if "age" not in match_stage:
-            match_stage["age"] = {}
-        match_stage["age"]["$lte"] = filters["age_max"]
-    
-    # Risk level filter
-    if "risk_level" in filters:
-        match_stage["risk_level"] = filters["risk_level"]
-    
-    # Aggregate data from multiple collections
-    stats = {
+    return cohort
+
+@router.get("/cohorts/{cohort_id}/stats")
+async def get_cohort_stats(cohort_id: str, current_user: User = Depends(get_current_user)):
+    """Get statistics for a patient cohort (its materialized members joined to their facts)"""
+    from utils.cohort_engine import cohort_stats
+
+    cohort = await _get_cohort(cohort_id)
+    stats = await cohort_stats(cohort_id)
+    return {
         "cohort_id": cohort_id,
         "cohort_name": cohort.get("name"),
-        "total_patients": 0,
-        "avg_age": 0,
-        "risk_distribution": {},
-        "common_conditions": []
+        "version": cohort.get("version", 0),
+        **stats
+    }
+
+@router.get("/cohorts/{cohort_id}/members")
+async def get_cohort_members(
+    cohort_id: str,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_user)
+):
+    """Page through a cohort's materialized membership"""
+    cohort = await _get_cohort(cohort_id)
+    members = await mongo_db.cohort_members.find(
+        {"cohort_id": cohort_id}, {"_id": 0, "patient_id": 1}
+    ).sort("patient_id", 1).skip(skip).limit(limit).to_list(limit)
+    return {
+        "cohort_id": cohort_id,
+        "version": cohort.get("version", 0),
+        "patient_count": cohort.get("patient_count", 0),
+        "patient_ids": [m["patient_id"] for m in members]
+    }
+
+@router.get("/cohorts/compare")
+async def compare_cohorts(
+    cohort_ids: List[str] = Query(..., description="Two or more cohort ids"),
+    metric: str = "readmission",
+    horizon_days: int = Query(90, ge=1, le=3650),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Compare cohorts on risk, readmission or length of stay.
+    readmission/los return Kaplan-Meier curves and a log-rank test.
+    Cached per (cohort versions, metric, horizon) for COMPARISON_CACHE_SECONDS.
+    """
+    from utils.cohort_compare import COMPARE_METRICS, compare
+
+    if current_user.role == UserRole.patient:
+        raise HTTPException(status_code=403, detail="Staff access required")
+    if metric not in COMPARE_METRICS:
+        raise HTTPException(status_code=400, detail=f"Invalid metric. Options: {list(COMPARE_METRICS)}")
+    if len(cohort_ids) < 2:
+        raise HTTPException(status_code=400, detail="Provide at least two cohort_ids")
+
+    cohorts = [await _get_cohort(cid) for cid in cohort_ids]
+    cache_key = "|".join(f"{c['_id']}:{c.get('version', 0)}" for c in cohorts) + f"|{metric}|{horizon_days}"
+
+    cached = await mongo_db.cohort_comparisons.find_one({"key": cache_key}, {"_id": 0, "report": 1, "computed_at": 1})
+    if cached and datetime.utcnow() - cached["computed_at"] < timedelta(seconds=COMPARISON_CACHE_SECONDS):
+        return {**cached["report"], "computed_at": cached["computed_at"], "cached": True}
+
+    try:
+        report = await compare([(str(c["_id"]), c.get("name")) for c in cohorts], metric, horizon_days)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Cohort comparison failed: {str(e)}")
+
+    computed_at = datetime.utcnow()
+    await mongo_db.cohort_comparisons.update_one(
+        {"key": cache_key},
+        {"$set": {"report": report, "computed_at": computed_at}},
+        upsert=True
+    )
+    return {**report, "computed_at": computed_at, "cached": False}
+
+# --- Population Risk Dashboard ---
+
+@router.get("/risk/dashboard")
+async def get_risk_dashboard(
+    model: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Population risk distribution by age band, gender, cluster and model.
+    Reads the incrementally maintained rollups, so cost does not grow with population size.
+    """
+    from utils.risk_rollups import ROLLUP_MODELS, summarize
+
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    if model and model not in ROLLUP_MODELS:
+        raise HTTPException(status_code=400, detail=f"Invalid model. Options: {list(ROLLUP_MODELS)}")
+
+    query = {"model": model} if model else {"model": {"$in": list(ROLLUP_MODELS)}}
+    rollups = await mongo_db.risk_rollups.find(query, {"_id": 0}).to_list(len(ROLLUP_MODELS))
+    return {
+        "models": {r["model"]: summarize(r) for r in rollups}
     }
-    
-    # Count patients in clustering data
-    if match_stage:
-        patients = await mongo_db.clustering_predictions.find(match_stage).to_list(1000)
-        stats["total_patients"] = len(patients)
-        
-        if patients:
-            # Calculate average age
-            ages = [p.get("age", 0) for p in patients if "age" in p]
-            stats["avg_age"] = round(sum(ages) / len(ages), 1) if ages else 0
-            
-            # Risk distribution
-            risks = [p.get("risk_level", "Unknown") for p in patients]
-            for risk in set(risks):
-                stats["risk_distribution"][risk] = risks.count(risk)
-    
-    return stats
 
 # --- Length of Stay Prediction ---
 
@@ -100,13 +183,30 @@ async def predict_los(
     diagnosis: str,
     severity: int,  # 1-5 scale
     comorbidities: int,
+    bed_type: str = "General",
     current_user: User = Depends(get_current_user)
 ):
     """
     Predict hospital length of stay.
-    Returns estimated days and confidence interval.
+    Returns estimated days and confidence interval (10th-90th percentile).
     """
-    # Simplified prediction (in production, use trained model)
+    from routers.ml_models import get_model, los_matrix, predict_los_quantiles
+
+    bundle = get_model('los')
+    if bundle:
+        X = los_matrix([{"age": age, "severity": severity, "comorbidities": comorbidities, "bed_type": bed_type}], bundle['bed_types'])
+        low, median, high = predict_los_quantiles(bundle, X)[0]
+        return {
+            "predicted_days": round(float(median), 1),
+            "confidence_interval": [round(float(low), 1), round(float(high), 1)],
+            "factors": {
+                f"{name}_importance": round(float(w), 3)
+                for name, w in zip(bundle['features'], bundle['model'].feature_importances_)
+            },
+            "model": "quantile_gradient_boosting"
+        }
+
+    # No trained model yet (too few recorded admissions): heuristic fallback
     base_days = 3
     age_factor = (age - 50) / 10 * 0.5
     severity_factor = severity * 0.8
@@ -121,7 +221,61 @@ async def predict_los(
             "age_impact": round(age_factor, 2),
             "severity_impact": round(severity_factor, 2),
             "comorbidity_impact": round(comorbidity_factor, 2)
-        }
+        },
+        "model": "heuristic"
+    }
+
+@router.get("/predict/length-of-stay/census")
+async def predict_census_los(
+    horizon_days: int = Query(7, ge=1, le=30),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Batch LOS quantiles for every currently occupied bed, plus expected
+    discharges per day for bed planning. One vectorized model call.
+    """
+    from routers.ml_models import get_model
+    from utils.discharge_forecast import model_quantiles, elapsed_days
+
+    if current_user.role == UserRole.patient:
+        raise HTTPException(status_code=403, detail="Staff access required")
+    bundle = get_model('los')
+    if not bundle:
+        raise HTTPException(status_code=503, detail="Length-of-stay model not trained yet (run train_los_model.py)")
+
+    beds = await mongo_db.beds.find(
+        {"status": "Occupied"},
+        {"patient_id": 1, "bed_number": 1, "type": 1, "severity": 1, "allocated_at": 1}
+    ).to_list(None)
+    if not beds:
+        return {"census": 0, "patients": [], "expected_discharges": []}
+
+    quantiles = await model_quantiles(beds, bundle)
+    now = datetime.utcnow()
+    elapsed = elapsed_days(beds, now)
+    remaining = np.maximum(quantiles - elapsed[:, None], 0)
+
+    # Expected discharges per day from the median remaining stay
+    day_index = np.floor(remaining[:, 1]).astype(int)
+    per_day = np.bincount(day_index[day_index < horizon_days], minlength=horizon_days)
+
+    return {
+        "census": len(beds),
+        "patients": [
+            {
+                "patient_id": b.get("patient_id"),
+                "bed_number": b.get("bed_number"),
+                "bed_type": b.get("type"),
+                "elapsed_days": round(float(e), 1),
+                "los_days": {"p10": round(float(q[0]), 1), "p50": round(float(q[1]), 1), "p90": round(float(q[2]), 1)},
+                "remaining_days": {"p10": round(float(r[0]), 1), "p50": round(float(r[1]), 1), "p90": round(float(r[2]), 1)}
+            }
+            for b, e, q, r in zip(beds, elapsed, quantiles, remaining)
+        ],
+        "expected_discharges": [
+            {"date": (now + timedelta(days=i)).strftime("%Y-%m-%d"), "count": int(c)}
+            for i, c in enumerate(per_day)
+        ]
     }
 
 # --- Outcome Tracking ---
@@ -135,58 +289,86 @@ async def get_treatment_success_rates(
     """
     Get treatment success rates by condition.
     Success defined as: readmission within 30 days = failure
+    Reads totals precomputed by the nightly outcomes job (utils/outcomes.py).
     """
-    # TODO: Calculate from actual patient outcomes
-    return {
-        "condition": condition or "all",
-        "success_rate": 0.85,
-        "total_treatments": 0,
-        "avg_recovery_days": 0
-    }
+    from utils.outcomes import summarize
+
+    start_month = None
+    if start_date:
+        try:
+            start_month = datetime.fromisoformat(start_date).strftime("%Y-%m")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="start_date must be ISO formatted (YYYY-MM-DD)")
+
+    return await summarize(condition, start_month)
 
 # --- Cost Optimization ---
 
 @router.get("/resource-utilization")
 async def get_resource_utilization(
-    days: int = 30,
+    days: int = Query(30, ge=1, le=365),
     current_user: User = Depends(get_current_user)
 ):
     """
     Analyze resource utilization and identify waste.
+    Bed occupancy is derived from the bed event log (daily summaries + live today).
     """
+    from utils.bed_utilization import utilization
+
     if current_user.role != UserRole.admin:
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    # TODO: Implement actual utilization analysis
+    try:
+        report = await utilization(days)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Utilization analysis failed: {str(e)}")
+
+    icu = report["by_bed_type"].get("ICU", {})
+    recommendations = []
+    for bed_type, stats in report["by_bed_type"].items():
+        u = stats.get("utilization")
+        if u is None:
+            continue
+        if u < 0.5:
+            recommendations.append(f"{bed_type} beds were {u:.0%} utilized; consider consolidating capacity during off-peak hours")
+        elif u > 0.9:
+            recommendations.append(f"{bed_type} beds were {u:.0%} utilized; capacity is tight (peak {stats['peak_occupied']} of {stats['beds']} occupied)")
+    
     return {
         "period_days": days,
-        "bed_utilization": 0.78,
-        "oxygen_waste_estimate": 0,
-        "icu_idle_hours": 0,
-        "recommendations": [
-            "Consider reducing ICU capacity by 2 beds during off-peak hours",
-            "Oxygen usage is optimal"
-        ]
+        "bed_utilization": report["total"].get("utilization"),
+        "oxygen_waste_estimate": None,  # No oxygen consumption log yet
+        "icu_idle_hours": icu.get("idle_hours", 0),
+        "by_ward": report["by_ward"],
+        "by_bed_type": report["by_bed_type"],
+        "recommendations": recommendations or ["Bed utilization is within the normal range"]
     }
 
 @router.get("/cost-per-patient")
 async def get_cost_per_patient(
     department: Optional[str] = None,
+    days: int = Query(30, ge=1, le=365),
     current_user: User = Depends(get_current_user)
 ):
-    """Average cost per patient by department"""
+    """Cost per bill by department: mean, median and p90 from merged daily t-digests (bills, not patients)"""
+    from utils.cost_analytics import cost_summary
+
     if current_user.role != UserRole.admin:
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    # TODO: Calculate from billing data
+    try:
+        summary = await cost_summary(days, department)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Cost analysis failed: {str(e)}")
+
+    overall = summary["overall"]
     return {
         "department": department or "all",
-        "avg_cost": 0,
-        "median_cost": 0,
-        "cost_breakdown": {
-            "consultations": 0,
-            "procedures": 0,
-            "medications": 0,
-            "room": 0
-        }
+        "period_days": days,
+        "bills": overall["count"],
+        "avg_cost_per_bill": overall["mean"],
+        "median_cost_per_bill": overall["median"],
+        "p90_cost_per_bill": overall["p90"],
+        "cost_breakdown": overall["cost_breakdown"],
+        "by_department": summary["by_department"]
     }
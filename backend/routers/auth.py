@@ -7,6 +7,7 @@ from auth.auth import Hash, create_access_token, create_refresh_token, get_curre
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 from jose import JWTError, jwt
+from utils.live_counters import live_counters
 
 router = APIRouter(
     prefix="/auth",
@@ -53,6 +54,7 @@ def signup(user: UserCreate, db: Session = Depends(get_db), current_user: User =
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
+    live_counters.user_added(new_user.role)
     
     access_token = create_access_token(data={"sub": new_user.username, "role": new_user.role})
     refresh_token = create_refresh_token(data={"sub": new_user.username, "role": new_user.role})
@@ -83,6 +85,7 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
+    live_counters.user_added(new_user.role)
     
     access_token = create_access_token(data={"sub": new_user.username, "role": new_user.role})
     refresh_token = create_refresh_token(data={"sub": new_user.username, "role": new_user.role})
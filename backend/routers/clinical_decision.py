@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from database.database import mongo_db
 from auth.auth import get_current_user
 from database.models_sql import User
@@ -90,12 +90,71 @@ async def check_vitals(
     }
     await mongo_db.vitals_checks.insert_one(vitals_log)
     
+    # Feed the continuous ICU-transfer scorer (admitted patients only)
+    await _stream_vitals(vitals.patient_id, vitals.dict(), admitted_only=True)
+    
+    from utils.repredict import repredict_queue
+    repredict_queue.enqueue(vitals.patient_id)
+    
     return {
         "status": "critical" if any(a["severity"] == "critical" for a in alerts) else "normal",
         "alerts": alerts,
         "alert_count": len(alerts)
     }
 
+# --- Continuous ICU-Transfer Monitoring ---
+
+class VitalsReading(BaseModel):
+    patient_id: str
+    o2_saturation: Optional[float] = None
+    heart_rate: Optional[float] = None
+    bp_systolic: Optional[float] = None
+    temperature: Optional[float] = None
+    age: Optional[float] = None
+
+async def _stream_vitals(patient_id: str, reading: dict, age: Optional[float] = None, admitted_only: bool = False):
+    from utils.vitals_stream import vitals_stream
+    
+    if admitted_only and not vitals_stream.is_monitored(patient_id) \
+            and not await mongo_db.beds.find_one({"patient_id": patient_id, "status": "Occupied"}, {"_id": 1}):
+        # Spot checks of outpatients are not monitored
+        return
+    if age is None and not vitals_stream.is_monitored(patient_id):
+        # First reading for this patient: look the age up once
+        profile = await mongo_db.patient_profiles.find_one({"patient_id": patient_id}, {"age": 1})
+        age = profile.get("age") if profile else None
+    vitals_stream.ingest(patient_id, reading, age=age)
+
+@router.post("/vitals/stream")
+async def stream_vitals(
+    readings: List[VitalsReading],
+    current_user: User = Depends(get_current_user)
+):
+    """Ingest a batch of bedside vitals readings for continuous ICU-transfer scoring."""
+    for reading in readings:
+        await _stream_vitals(reading.patient_id, reading.dict(), age=reading.age)
+    return {"ingested": len(readings)}
+
+@router.get("/monitoring/icu-risk")
+async def get_icu_risk_board(
+    min_risk: float = 0.0,
+    current_user: User = Depends(get_current_user)
+):
+    """Latest streaming ICU-transfer risk for every monitored patient, highest first."""
+    from utils.vitals_stream import vitals_stream
+    
+    board = [
+        {"patient_id": pid, **score}
+        for pid, score in vitals_stream.latest_scores.items()
+        if score["risk"] >= min_risk
+    ]
+    board.sort(key=lambda x: x["risk"], reverse=True)
+    return {
+        "monitored": len(vitals_stream.slots),
+        "last_scored_at": vitals_stream.last_scored_at,
+        "patients": board
+    }
+
 # --- Fall Risk Assessment ---
 
 class FallRiskData(BaseModel):
@@ -252,19 +311,20 @@ async def log_adverse_event(
     }
     
     result = await mongo_db.adverse_events.insert_one(event_data)
+    
+    from utils.adverse_trends import record_event
+    await record_event(event.event_type, event.severity, event_data["reported_at"])
     return {"id": str(result.inserted_id), "message": "Event logged"}
 
 @router.get("/adverse-events/trends")
 async def get_adverse_event_trends(
-    days: int = 30,
+    days: int = Query(30, ge=1, le=365),
     current_user: User = Depends(get_current_user)
 ):
-    """Analyze adverse event patterns"""
-    # TODO: Aggregate event data and identify trends
-    return {
-        "period_days": days,
-        "total_events": 0,
-        "by_type": {},
-        "by_severity": {},
-        "trending_up": []
-    }
+    """Analyze adverse event patterns from daily buckets (rolling totals + EWMA trend detection)"""
+    from utils.adverse_trends import trends
+    
+    try:
+        return await trends(days)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Trend analysis failed: {str(e)}")
@@ -7,6 +7,8 @@ from database.models_sql import User, UserRole
 from sqlalchemy.orm import Session
 from auth.auth import get_current_user
 from bson import ObjectId
+from pymongo import ReturnDocument
+from utils.live_counters import live_counters
 
 router = APIRouter(
     prefix="/frontdesk",
@@ -98,6 +100,7 @@ async def create_appointment(appt: AppointmentData):
         # Insert Appointment
         result = await mongo_db.appointments.insert_one(appt_dict)
         appointment_id = str(result.inserted_id)
+        live_counters.appointment_added(appt_dict.get("status"))
         
         # Update meeting with actual appointment ID
         if appt.type and appt.type.lower() == "online":
@@ -186,12 +189,14 @@ async def update_appointment(id: str, update_data: dict):
             raise HTTPException(status_code=400, detail="Status is required")
             
         status = update_data["status"]
-        result = await mongo_db.appointments.update_one(
+        previous = await mongo_db.appointments.find_one_and_update(
             {"_id": ObjectId(id)},
-            {"$set": {"status": status}}
+            {"$set": {"status": status}},
+            return_document=ReturnDocument.BEFORE
         )
-        if result.modified_count == 0:
+        if not previous or previous.get("status") == status:
             raise HTTPException(status_code=404, detail="Appointment not found")
+        live_counters.appointment_status_changed(previous.get("status"), status)
         return {"message": "Appointment updated"}
     except HTTPException as he:
         raise he
@@ -201,10 +206,13 @@ async def update_appointment(id: str, update_data: dict):
 @router.delete("/appointments/{id}")
 async def delete_appointment(id: str):
     try:
-        result = await mongo_db.appointments.delete_one({"_id": ObjectId(id)})
-        if result.deleted_count == 0:
+        deleted = await mongo_db.appointments.find_one_and_delete({"_id": ObjectId(id)})
+        if not deleted:
             raise HTTPException(status_code=404, detail="Appointment not found")
+        live_counters.appointment_removed(deleted.get("status"))
         return {"message": "Appointment cancelled"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -214,6 +222,9 @@ async def delete_appointment(id: str):
 async def create_bill(bill: BillData):
     try:
         result = await mongo_db.bills.insert_one(bill.dict())
+        
+        from utils.cost_analytics import record_bill_costs
+        await record_bill_costs(bill.dict())
         return {"id": str(result.inserted_id), "message": "Invoice generated"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -108,6 +108,11 @@ async def import_lab_results(
             from utils.email import send_critical_lab_alert
             # await send_critical_lab_alert(lab.patient_id, lab.lab_type, lab.value)
     
+    # Re-score affected patients with the new values
+    from utils.repredict import repredict_queue
+    for patient_id in {lab.patient_id for lab in labs}:
+        repredict_queue.enqueue(patient_id)
+    
     return {
         "imported_count": imported_count,
         "message": f"Imported {imported_count} lab results"
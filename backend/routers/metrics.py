@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Response
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 
 router = APIRouter(
     tags=["Observability"]
@@ -24,6 +24,31 @@ ml_predictions_total = Counter(
     ['model', 'prediction']
 )
 
+# Input drift (updated by utils.drift_monitor)
+ml_input_drift_psi = Gauge(
+    'ml_input_drift_psi',
+    'Population Stability Index of live inputs vs training data',
+    ['model', 'feature']
+)
+
+ml_input_drift_ks = Gauge(
+    'ml_input_drift_ks',
+    'Kolmogorov-Smirnov statistic (binned) of live inputs vs training data',
+    ['model', 'feature']
+)
+
+ml_input_mean = Gauge(
+    'ml_input_mean',
+    'Running mean of live numeric inputs',
+    ['model', 'feature']
+)
+
+ml_drift_observations = Gauge(
+    'ml_drift_observations',
+    'Predictions observed by the drift monitor',
+    ['model']
+)
+
 @router.get("/metrics")
 def metrics():
     """
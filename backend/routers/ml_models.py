@@ -1,15 +1,20 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, BackgroundTasks, UploadFile, File
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import joblib
 import pandas as pd
 import numpy as np
+import asyncio
 import os
+import time
 from typing import Optional, List, Dict
 from datetime import datetime, timedelta
 from prophet.serialize import model_from_json
 from database.database import mongo_db
 from auth.auth import get_current_user
-from database.models_sql import User
+from database.models_sql import User, UserRole
+from utils.drift_monitor import drift_monitor
+from utils.shadow import shadow_evaluator
 
 router = APIRouter(
     prefix="/ml",
@@ -47,12 +52,14 @@ RESOURCE_MODELS = {
 
 # Global variable for models - initialized as empty
 models = {}
+# Modification time of a LOS artifact rejected for lacking quantile models
+_rejected_los_mtime = None
 
 def get_model(model_type, resource_name=None):
     """
     Lazy load models only when requested.
     """
-    global models
+    global models, _rejected_los_mtime
     
     # Initialize category if missing
     if model_type not in models:
@@ -67,6 +74,11 @@ def get_model(model_type, resource_name=None):
         return models['diabetes']
     if model_type == 'resources' and resource_name and resource_name in models['resources']:
         return models['resources'][resource_name]
+    if model_type in ('readmission', 'icu_transfer', 'los') and models[model_type]:
+        return models[model_type]
+    if model_type == 'los' and _rejected_los_mtime is not None and os.path.exists(LOS_MODEL_PATH) \
+            and os.path.getmtime(LOS_MODEL_PATH) == _rejected_los_mtime:
+        return None
         
     print(f"🔄 Loading {model_type} model..." + (f" ({resource_name})" if resource_name else ""))
     
@@ -112,14 +124,239 @@ def get_model(model_type, resource_name=None):
              if os.path.exists(ICU_TRANSFER_MODEL_PATH):
                 models['icu_transfer'] = joblib.load(ICU_TRANSFER_MODEL_PATH)
              return models.get('icu_transfer')
+
+        elif model_type == 'los':
+            if os.path.exists(LOS_MODEL_PATH):
+                mtime = os.path.getmtime(LOS_MODEL_PATH)
+                bundle = joblib.load(LOS_MODEL_PATH)
+                if 'quantile_models' in bundle:
+                    models['los'] = bundle
+                else:
+                    # Not reloaded until the artifact changes
+                    _rejected_los_mtime = mtime
+                    print("⚠️ LOS model has no quantile models; retrain with train_los_model.py")
+            return models.get('los')
              
     except Exception as e:
         print(f"❌ Error loading {model_type}: {e}")
         return None
 
+def get_model_version(model_type, candidate=False):
+    """
+    Version tag for the model artifact on disk (its modification time).
+    Changes whenever the model is retrained.
+    """
+    path = {
+        'clustering': CLUSTERING_MODEL_PATH,
+        'heart': HEART_MODEL_PATH,
+        'diabetes': DIABETES_MODEL_PATH,
+    }.get(model_type)
+    if path and candidate:
+        path = os.path.join(CANDIDATES_DIR, os.path.basename(path))
+    if not path or not os.path.exists(path):
+        return None
+    return datetime.utcfromtimestamp(os.path.getmtime(path)).strftime("%Y%m%d%H%M%S")
+
+# Candidate (shadow) models: retrained artifacts dropped into artifacts/candidates/
+# with the same file names as the live ones.
+CANDIDATES_DIR = os.path.join(ARTIFACTS_DIR, 'candidates')
+
+candidate_models = {}
+
+def get_candidate_model(model_type):
+    """
+    Lazy load the candidate version of 'heart' or 'diabetes'.
+    Reloads automatically when the candidate artifact changes.
+    """
+    version = get_model_version(model_type, candidate=True)
+    if version is None:
+        candidate_models.pop(model_type, None)
+        return None
+
+    cached = candidate_models.get(model_type)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    print(f"🔄 Loading candidate {model_type} model (version {version})...")
+    try:
+        if model_type == 'heart':
+            model = joblib.load(os.path.join(CANDIDATES_DIR, os.path.basename(HEART_MODEL_PATH)))
+        elif model_type == 'diabetes':
+            model = joblib.load(os.path.join(CANDIDATES_DIR, os.path.basename(DIABETES_MODEL_PATH)))
+        else:
+            return None
+        candidate_models[model_type] = (version, model)
+        return model
+    except Exception as e:
+        print(f"❌ Error loading candidate {model_type}: {e}")
+        return None
+
 # Remove global immediate call
 # load_models()
 
+# --- Feature Layouts & Preprocessing ---
+# Shared by the request endpoints and the feature store so both paths
+# produce identical model inputs.
+
+# Input order must match training
+HEART_FEATURES = [
+    'age', 'sex', 'cp', 'trestbps', 'chol', 'fbs', 'restecg',
+    'thalach', 'exang', 'oldpeak', 'slope', 'ca', 'thal'
+]
+
+DIABETES_FEATURES = [
+    'age', 'gender', 'polyuria', 'polydipsia', 'sudden_weight_loss',
+    'weakness', 'polyphagia', 'genital_thrush', 'visual_blurring',
+    'itching', 'irritability', 'delayed_healing', 'partial_paresis',
+    'muscle_stiffness', 'alopecia', 'obesity'
+]
+
+CLUSTERING_FEATURES = [
+    'age', 'gender', 'chest_pain_type', 'blood_pressure', 'cholesterol',
+    'max_heart_rate', 'exercise_angina', 'plasma_glucose', 'skin_thickness',
+    'insulin', 'bmi', 'diabetes_pedigree', 'hypertension',
+    'residence_type', 'smoking_status'
+]
+
+def heart_matrix(df):
+    """Heart model input matrix (n_rows x 13) in training order."""
+    return df[HEART_FEATURES].to_numpy(dtype=float)
+
+def preprocess_diabetes(df, diabetes_models):
+    """Select diabetes columns and label-encode gender."""
+    df = df[DIABETES_FEATURES].copy()
+    if 'Gender' in diabetes_models['encoders']:
+        df['gender'] = diabetes_models['encoders']['Gender'].transform(df['gender'])
+    elif 'gender' in diabetes_models['encoders']:
+        df['gender'] = diabetes_models['encoders']['gender'].transform(df['gender'])
+    return df
+
+def preprocess_clustering(df, m):
+    """Impute and encode clustering inputs. Unseen categories map to 0."""
+    df = df.reindex(columns=CLUSTERING_FEATURES).copy()
+    numeric_cols = m['feature_names']['numeric']
+    categorical_cols = m['feature_names']['categorical']
+
+    df[numeric_cols] = m['imputers']['num'].transform(df[numeric_cols])
+    df[categorical_cols] = m['imputers']['cat'].transform(df[categorical_cols])
+
+    for col in categorical_cols:
+        le = m['encoders'][col]
+        lookup = {label: idx for idx, label in enumerate(le.classes_)}
+        df[col] = df[col].map(lookup).fillna(0).astype(int)
+
+    return df[CLUSTERING_FEATURES]
+
+def assign_clusters(df, m):
+    """Scale, project and cluster preprocessed rows. Returns (clusters, pca_coords)."""
+    scaled_data = m['scaler'].transform(df)
+    pca_data = m['pca'].transform(scaled_data)
+    return m['model'].predict(pca_data), pca_data
+
+def positive_class_shap(values):
+    """Positive-class SHAP matrix across shap/estimator output formats."""
+    if isinstance(values, list):
+        return np.asarray(values[1])
+    values = np.asarray(values)
+    return values[:, :, 1] if values.ndim == 3 else values
+
+def _shap_top_k(estimator, X, feature_names, k):
+    import shap
+    values = positive_class_shap(shap.TreeExplainer(estimator).shap_values(X))
+    order = np.argsort(-np.abs(values), axis=1)[:, :k]
+    return [
+        [f"{feature_names[j]}:{values[i, j]:+.4f}" for j in row]
+        for i, row in enumerate(order)
+    ]
+
+def score_dataframe(model_type, df, shap_top_k=0):
+    """
+    Batch-score rows whose columns follow the request schema of
+    /ml/predict/{heart|diabetes|cluster}. Returns a DataFrame of output
+    columns aligned with df.index; rows that cannot be scored are left empty.
+    """
+    out = pd.DataFrame(index=df.index)
+
+    if model_type == 'heart':
+        model = get_model('heart')
+        if model is None:
+            raise RuntimeError("Heart Disease model not available")
+        valid = df[HEART_FEATURES].notna().all(axis=1)
+        estimator, X, feature_names = model, heart_matrix(df[valid]), HEART_FEATURES
+        labels = ("Heart Disease Detected", "No Heart Disease")
+
+    elif model_type == 'diabetes':
+        diabetes_models = get_model('diabetes')
+        if not diabetes_models:
+            raise RuntimeError("Diabetes model not available")
+        encoder = diabetes_models['encoders'].get('Gender') or diabetes_models['encoders'].get('gender')
+        valid = df[DIABETES_FEATURES].notna().all(axis=1)
+        if encoder is not None:
+            valid &= df['gender'].isin(encoder.classes_)
+        estimator, X, feature_names = diabetes_models['model'], preprocess_diabetes(df[valid], diabetes_models), DIABETES_FEATURES
+        labels = ("Diabetes Detected", "No Diabetes")
+
+    elif model_type == 'cluster':
+        m = get_model('clustering')
+        if not m:
+            raise RuntimeError("Clustering model not available")
+        clusters, pca_data = assign_clusters(preprocess_clustering(df, m), m)
+        out['cluster'] = clusters.astype(int)
+        out['risk_level'] = [m['mapping'].get(c, "Unknown") for c in clusters]
+        out['pca_1'] = pca_data[:, 0]
+        out['pca_2'] = pca_data[:, 1]
+        return out
+
+    else:
+        raise ValueError(f"Unknown model type: {model_type}")
+
+    out[f'{model_type}_prediction'] = pd.Series(dtype='Int64')
+    out[f'{model_type}_probability'] = np.nan
+    out[f'{model_type}_label'] = None
+    # Created even when no row is scorable, so every chunk has the same columns
+    for rank in range(shap_top_k):
+        out[f'{model_type}_shap_top_{rank + 1}'] = None
+    if valid.any():
+        proba = estimator.predict_proba(X)
+        predictions = estimator.classes_.take(np.argmax(proba, axis=1))
+        out.loc[valid, f'{model_type}_prediction'] = predictions.astype(int)
+        out.loc[valid, f'{model_type}_probability'] = proba[:, 1]
+        out.loc[valid, f'{model_type}_label'] = [labels[0] if p == 1 else labels[1] for p in predictions]
+        if shap_top_k:
+            top = _shap_top_k(estimator, X, feature_names, shap_top_k)
+            for rank in range(shap_top_k):
+                out.loc[valid, f'{model_type}_shap_top_{rank + 1}'] = [row[rank] if rank < len(row) else None for row in top]
+    return out
+
+# Length-of-stay model (see train_los_model.py): features known at admission
+LOS_FEATURES = ['age', 'severity', 'comorbidities', 'bed_type_code']
+LOS_QUANTILES = (0.1, 0.5, 0.9)
+
+def los_matrix(rows, bed_types):
+    """LOS model input matrix from dicts with age/severity/comorbidities/bed_type."""
+    codes = {t: i for i, t in enumerate(bed_types)}
+    return np.array([
+        [
+            float(r.get("age") or 50),
+            float(r.get("severity") or 3),
+            float(r.get("comorbidities") or 0),
+            float(codes.get(r.get("bed_type"), codes.get("General", 0)))
+        ]
+        for r in rows
+    ], dtype=float).reshape(-1, len(LOS_FEATURES))
+
+def predict_los_quantiles(bundle, X, quantiles=LOS_QUANTILES):
+    """
+    Quantile LOS predictions (days) for every row: one quantile-loss gradient
+    boosting model per quantile. Returns (n_rows, n_quantiles).
+    """
+    missing = [q for q in quantiles if q not in bundle['quantile_models']]
+    if missing:
+        raise ValueError(f"LOS model was not trained for quantiles {missing}")
+    preds = np.column_stack([bundle['quantile_models'][q].predict(X) for q in quantiles])
+    # Independently fitted quantiles can cross; sorting restores the order (quantiles are ascending)
+    return np.sort(np.maximum(preds, 0.0), axis=1)
+
 # --- Data Models ---
 
 class ClusteringData(BaseModel):
@@ -175,7 +412,15 @@ class DiabetesData(BaseModel):
 # --- Endpoints ---
 
 @router.post("/predict/cluster")
-def predict_cluster(data: ClusteringData):
+async def predict_cluster(
+    data: ClusteringData,
+    patient_id: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Assign a risk cluster. Patients' own predictions are recorded; staff
+    using the risk calculator are recorded only when they pass `patient_id`.
+    """
     # Ensure model is loaded
     clustering_model = get_model('clustering')
     if not clustering_model:
@@ -183,59 +428,59 @@ def predict_cluster(data: ClusteringData):
     
     try:
         m = clustering_model
-        input_dict = data.dict()
-        df = pd.DataFrame([input_dict])
-        
-        # Preprocessing
-        numeric_cols = m['feature_names']['numeric']
-        categorical_cols = m['feature_names']['categorical']
-        
-        df[numeric_cols] = m['imputers']['num'].transform(df[numeric_cols])
-        df[categorical_cols] = m['imputers']['cat'].transform(df[categorical_cols])
-        
-        for col in categorical_cols:
-            le = m['encoders'][col]
-            try:
-                df[col] = le.transform(df[col])
-            except:
-                df[col] = 0
-                
-        expected_cols = [
-            'age', 'gender', 'chest_pain_type', 'blood_pressure', 'cholesterol', 
-            'max_heart_rate', 'exercise_angina', 'plasma_glucose', 'skin_thickness', 
-            'insulin', 'bmi', 'diabetes_pedigree', 'hypertension', 
-            'residence_type', 'smoking_status'
-        ]
-        df = df[expected_cols]
-        
-        scaled_data = m['scaler'].transform(df)
-        pca_data = m['pca'].transform(scaled_data)
+        df = pd.DataFrame([data.dict()])
+        df = preprocess_clustering(df, m)
+        clusters, _ = assign_clusters(df, m)
         
-        cluster = m['model'].predict(pca_data)[0]
+        cluster = clusters[0]
         risk = m['mapping'].get(cluster, "Unknown")
         
+        subject = current_user.username if current_user.role == UserRole.patient else patient_id
+        if subject:
+            result = {
+                "patient_id": subject,
+                "cluster": int(cluster),
+                "risk_level": risk,
+                "age": data.age,
+                "gender": data.gender,
+                "created_at": datetime.utcnow(),
+                "input_data": data.dict()
+            }
+            await mongo_db.clustering_predictions.insert_one(result.copy())
+            await track_prediction('cluster', result)
+        
         return {"cluster": int(cluster), "risk_level": risk}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Clustering failed: {str(e)}")
 
+async def track_prediction(model, result):
+    """Keep risk rollups and cohort facts in step with a new prediction (never fails the request)."""
+    from utils.risk_rollups import record_prediction
+    from utils.cohort_engine import record_risk_facts
+    try:
+        await record_prediction(model, result)
+        await record_risk_facts(model, [result])
+    except Exception as e:
+        print(f"⚠️ Prediction tracking failed ({model}): {e}")
+
 @router.post("/predict/heart")
-async def predict_heart(data: HeartDiseaseData, current_user: User = Depends(get_current_user)):
+async def predict_heart(data: HeartDiseaseData, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user)):
     heart_model = get_model('heart')
     if not heart_model:
         raise HTTPException(status_code=500, detail="Heart Disease model not available")
     
     try:
-        # Input order must match training
-        # age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal
-        features = [[
-            data.age, data.sex, data.cp, data.trestbps, data.chol, data.fbs,
-            data.restecg, data.thalach, data.exang, data.oldpeak, data.slope,
-            data.ca, data.thal
-        ]]
+        features = heart_matrix(pd.DataFrame([data.dict()]))
         
+        started = time.perf_counter()
         prediction = heart_model.predict(features)[0]
         probability = heart_model.predict_proba(features)[0][1]
+        primary_latency = time.perf_counter() - started
+        
+        # Shadow-score a sample of requests after the response is sent
+        if shadow_evaluator.should_sample('heart'):
+            background_tasks.add_task(shadow_evaluator.evaluate, 'heart', features, int(prediction), float(probability), primary_latency)
         
         result = {
             "prediction": int(prediction),
@@ -246,8 +491,11 @@ async def predict_heart(data: HeartDiseaseData, current_user: User = Depends(get
             "input_data": data.dict()
         }
         
+        drift_monitor.observe('heart', result["input_data"])
+        
         # Save to MongoDB
         await mongo_db.heart_predictions.insert_one(result.copy())
+        await track_prediction('heart', result)
         
         return result
     except Exception as e:
@@ -275,6 +523,188 @@ async def get_heart_prediction(patient_id: str, current_user: User = Depends(get
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/predict/{model_name}/by-patient/{patient_id}")
+async def predict_by_patient(model_name: str, patient_id: str, current_user: User = Depends(get_current_user)):
+    """Score a patient from their stored feature vector (no request body)."""
+    from utils.feature_store import load_features
+
+    store_keys = {'heart': 'heart', 'diabetes': 'diabetes', 'cluster': 'clustering'}
+    if model_name not in store_keys:
+        raise HTTPException(status_code=400, detail=f"Invalid model. Options: {list(store_keys.keys())}")
+    if current_user.role == UserRole.patient and patient_id != current_user.username:
+        raise HTTPException(status_code=403, detail="Patients can only score their own profile")
+
+    features = await load_features(patient_id, store_keys[model_name])
+    if features is None:
+        raise HTTPException(status_code=404, detail="No profile found for patient")
+    vector, missing, unsupported = features
+    if unsupported:
+        raise HTTPException(status_code=422, detail=f"Profile cannot be scored by {model_name}: {'; '.join(unsupported)}")
+    if missing:
+        raise HTTPException(status_code=422, detail=f"Profile is missing fields required by {model_name}: {missing}")
+
+    try:
+        if model_name == 'cluster':
+            m = get_model('clustering')
+            if not m:
+                raise HTTPException(status_code=503, detail="Clustering model not available")
+            clusters, _ = assign_clusters(pd.DataFrame([vector], columns=CLUSTERING_FEATURES), m)
+            cluster = clusters[0]
+            return {"patient_id": patient_id, "cluster": int(cluster), "risk_level": m['mapping'].get(cluster, "Unknown")}
+
+        if model_name == 'heart':
+            model = get_model('heart')
+            X = vector.reshape(1, -1)
+            feature_names = HEART_FEATURES
+            collection = mongo_db.heart_predictions
+            labels = ("Heart Disease Detected", "No Heart Disease")
+        else:
+            diabetes_models = get_model('diabetes')
+            model = diabetes_models['model'] if diabetes_models else None
+            # Vector is already encoded; keep DataFrame columns as in predict_diabetes
+            X = pd.DataFrame([vector], columns=DIABETES_FEATURES)
+            feature_names = DIABETES_FEATURES
+            collection = mongo_db.diabetes_predictions
+            labels = ("Diabetes Detected", "No Diabetes")
+
+        if model is None:
+            raise HTTPException(status_code=500, detail=f"{model_name} model not available")
+
+        prediction = model.predict(X)[0]
+        probability = model.predict_proba(X)[0][1]
+
+        result = {
+            "prediction": int(prediction),
+            "probability": float(probability),
+            "label": labels[0] if prediction == 1 else labels[1],
+            "patient_id": patient_id,
+            "created_at": datetime.utcnow(),
+            "input_data": {name: float(val) for name, val in zip(feature_names, vector)},
+            "source": "feature_store"
+        }
+        await collection.insert_one(result.copy())
+        await track_prediction(model_name, result)
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
+SCORE_FILE_COLUMNS = {'heart': HEART_FEATURES, 'diabetes': DIABETES_FEATURES}
+
+def _open_scored_csv(handle, model_name, chunk_size):
+    """Read, validate and score the first chunk before any byte is streamed, so bad files fail with 400."""
+    reader = pd.read_csv(handle, chunksize=chunk_size)
+    first = next(reader, None)
+    if first is None or first.empty:
+        raise ValueError("File has no data rows")
+    missing = [c for c in SCORE_FILE_COLUMNS.get(model_name, []) if c not in first.columns]
+    if missing:
+        raise ValueError(f"Missing columns for {model_name}: {missing}")
+    return reader, pd.concat([first, score_dataframe(model_name, first)], axis=1)
+
+def _scored_csv_stream(handle, reader, first_scored, model_name):
+    """Sync generator: StreamingResponse iterates it in the threadpool, off the event loop."""
+    rows = 0
+    try:
+        yield first_scored.to_csv(index=False)
+        rows += len(first_scored)
+        for chunk in reader:
+            scored = pd.concat([chunk, score_dataframe(model_name, chunk)], axis=1)
+            yield scored.to_csv(index=False, header=False)
+            rows += len(chunk)
+    except Exception as e:
+        # The 200 status is already sent: end with an explicit error row, then abort the connection
+        print(f"❌ Streaming {model_name} scoring failed after {rows} rows: {e}")
+        yield f"# ERROR: scoring failed after {rows} rows, output is incomplete: {e}\n"
+        raise
+    finally:
+        handle.close()
+
+@router.post("/score-file")
+async def score_file(
+    file: UploadFile = File(...),
+    model: str = Query(..., description="heart, diabetes or cluster"),
+    chunk_size: int = Query(1000, ge=100, le=20000),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Score an uploaded CSV (columns as in the predict request bodies) and stream
+    the scored CSV back chunk by chunk, so memory use is independent of file size.
+    The header and first chunk are validated before streaming (400 on error); a
+    failure later ends the file with a "# ERROR:" row and aborts the response.
+    """
+    if current_user.role == UserRole.patient:
+        raise HTTPException(status_code=403, detail="Staff access required")
+    if model not in ('heart', 'diabetes', 'cluster'):
+        raise HTTPException(status_code=400, detail="Invalid model. Options: ['heart', 'diabetes', 'cluster']")
+    if not get_model('clustering' if model == 'cluster' else model):
+        raise HTTPException(status_code=503, detail=f"{model} model not available")
+
+    # The upload is spooled to a temp file; take our own descriptor so the
+    # stream outlives the request's UploadFile cleanup.
+    file.file.seek(0)
+    handle = os.fdopen(os.dup(file.file.fileno()), 'rb')
+    handle.seek(0)
+
+    try:
+        reader, first_scored = await asyncio.to_thread(_open_scored_csv, handle, model, chunk_size)
+    except (ValueError, KeyError, pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+        handle.close()
+        raise HTTPException(status_code=400, detail=f"Invalid CSV: {str(e)}")
+    except Exception as e:
+        handle.close()
+        raise HTTPException(status_code=500, detail=f"Scoring failed: {str(e)}")
+
+    filename = os.path.splitext(file.filename or "upload")[0]
+    return StreamingResponse(
+        _scored_csv_stream(handle, reader, first_scored, model),
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}_scored_{model}.csv"}
+    )
+
+@router.get("/similar/{patient_id}")
+async def get_similar_patients(patient_id: str, k: int = Query(20, ge=1, le=200), current_user: User = Depends(get_current_user)):
+    """k most similar patients in the clustering feature space, with their latest outcomes."""
+    from utils.similarity_index import similarity_index
+
+    if current_user.role == UserRole.patient:
+        raise HTTPException(status_code=403, detail="Clinician access required")
+    if not get_model('clustering'):
+        raise HTTPException(status_code=503, detail="Clustering model not available")
+
+    await similarity_index.ensure_ready()
+    neighbours = similarity_index.query(patient_id, k)
+    if neighbours is None:
+        raise HTTPException(status_code=404, detail="Patient has no stored feature vector")
+
+    # Latest heart/diabetes outcome for each neighbour (indexed on patient_id, created_at)
+    ids = [pid for pid, _, _ in neighbours]
+    latest = {}
+    for name, collection in (("heart", mongo_db.heart_predictions), ("diabetes", mongo_db.diabetes_predictions)):
+        rows = await collection.aggregate([
+            {"$match": {"patient_id": {"$in": ids}}},
+            {"$sort": {"patient_id": 1, "created_at": -1}},
+            {"$group": {"_id": "$patient_id", "prediction": {"$first": "$prediction"}, "probability": {"$first": "$probability"}}}
+        ]).to_list(len(ids))
+        for row in rows:
+            latest.setdefault(row["_id"], {})[name] = {"prediction": row["prediction"], "probability": row["probability"]}
+
+    return {
+        "patient_id": patient_id,
+        "k": k,
+        "indexed_patients": len(similarity_index),
+        "neighbours": [
+            {
+                "patient_id": pid,
+                "distance": round(distance, 4),
+                "risk_level": risk,
+                "outcomes": latest.get(pid, {})
+            }
+            for pid, distance, risk in neighbours
+        ]
+    }
+
 import shap
 
 @router.post("/explain/heart")
@@ -285,18 +715,11 @@ def explain_heart(data: HeartDiseaseData):
     
     try:
         # Prepare features
-        features = [[
-            data.age, data.sex, data.cp, data.trestbps, data.chol, data.fbs,
-            data.restecg, data.thalach, data.exang, data.oldpeak, data.slope,
-            data.ca, data.thal
-        ]]
-        feature_names = [
-            'age', 'sex', 'cp', 'trestbps', 'chol', 'fbs', 'restecg', 
-            'thalach', 'exang', 'oldpeak', 'slope', 'ca', 'thal'
-        ]
+        features = heart_matrix(pd.DataFrame([data.dict()]))
+        feature_names = HEART_FEATURES
         
         explainer = shap.TreeExplainer(heart_model)
-        shap_values = explainer.shap_values(np.array(features))
+        shap_values = explainer.shap_values(features)
         
         # shap_values for binary classification is a list of arrays [class_0, class_1]
         # We want class_1 (Disease)
@@ -324,25 +747,46 @@ def explain_heart(data: HeartDiseaseData):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"SHAP explanation failed: {str(e)}")
 
+@router.get("/shadow/report")
+async def get_shadow_report(current_user: User = Depends(get_current_user)):
+    """Live shadow-evaluation stats plus the most recently flushed reports."""
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    recent = await mongo_db.shadow_reports.find({}, {"_id": 0}).sort("flushed_at", -1).to_list(10)
+    return {"live": shadow_evaluator.snapshot(), "recent_reports": recent}
+
+@router.get("/explain/summary/{model_name}")
+async def get_shap_summary(model_name: str, version: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    """Precomputed population SHAP summary (see compute_shap_summaries.py)."""
+    if model_name not in ('heart', 'diabetes'):
+        raise HTTPException(status_code=400, detail="Invalid model. Options: ['heart', 'diabetes']")
+
+    query = {"model": model_name}
+    if version:
+        query["model_version"] = version
+    summary = await mongo_db.shap_summaries.find_one(query, {"_id": 0}, sort=[("computed_at", -1)])
+    if not summary:
+        raise HTTPException(status_code=404, detail="No SHAP summary computed for this model yet")
+    summary["current_model_version"] = get_model_version(model_name)
+    return summary
+
 @router.post("/predict/diabetes")
-async def predict_diabetes(data: DiabetesData, current_user: User = Depends(get_current_user)):
+async def predict_diabetes(data: DiabetesData, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user)):
     diabetes_models = get_model('diabetes')
     if not diabetes_models:
         raise HTTPException(status_code=500, detail="Diabetes model not available")
     
     try:
-        input_dict = data.dict()
-        df = pd.DataFrame([input_dict])
-        
-        # Encoding
-        if 'Gender' in diabetes_models['encoders']:
-            df['gender'] = diabetes_models['encoders']['Gender'].transform(df['gender'])
-        elif 'gender' in diabetes_models['encoders']:
-            df['gender'] = diabetes_models['encoders']['gender'].transform(df['gender'])
-            
+        df = preprocess_diabetes(pd.DataFrame([data.dict()]), diabetes_models)
+        
         model = diabetes_models['model']
+        started = time.perf_counter()
         prediction = model.predict(df)[0]
         probability = model.predict_proba(df)[0][1]
+        primary_latency = time.perf_counter() - started
+        
+        if shadow_evaluator.should_sample('diabetes'):
+            background_tasks.add_task(shadow_evaluator.evaluate, 'diabetes', df, int(prediction), float(probability), primary_latency)
         
         result = {
             "prediction": int(prediction),
@@ -353,8 +797,11 @@ async def predict_diabetes(data: DiabetesData, current_user: User = Depends(get_
             "input_data": data.dict()
         }
         
+        drift_monitor.observe('diabetes', result["input_data"])
+        
         # Save to MongoDB
         await mongo_db.diabetes_predictions.insert_one(result.copy())
+        await track_prediction('diabetes', result)
         
         return result
     except Exception as e:
@@ -389,15 +836,9 @@ def explain_diabetes(data: DiabetesData):
          raise HTTPException(status_code=500, detail="Diabetes model not available")
     
     try:
-        input_dict = data.dict()
-        df = pd.DataFrame([input_dict])
-        
         # Encoding (Same as predict)
-        if 'Gender' in diabetes_models['encoders']:
-            df['gender'] = diabetes_models['encoders']['Gender'].transform(df['gender'])
-        elif 'gender' in diabetes_models['encoders']:
-            df['gender'] = diabetes_models['encoders']['gender'].transform(df['gender'])
-            
+        df = preprocess_diabetes(pd.DataFrame([data.dict()]), diabetes_models)
+        
         model = diabetes_models['model']
         explainer = shap.TreeExplainer(model)
         shap_values = explainer.shap_values(df)
@@ -431,6 +872,7 @@ def explain_diabetes(data: DiabetesData):
 # Paths
 READMISSION_MODEL_PATH = os.path.join(ARTIFACTS_DIR, 'readmission_model.joblib')
 ICU_TRANSFER_MODEL_PATH = os.path.join(ARTIFACTS_DIR, 'icu_transfer_model.joblib')
+LOS_MODEL_PATH = os.path.join(ARTIFACTS_DIR, 'los_model.joblib')
 
 # Load Advanced Models logic moved to get_model
 
@@ -496,7 +938,8 @@ async def predict_resources(days: int = 7):
         import json
         
         # 1. Get Real-time Baseline from DB
-        occupied_count = await mongo_db.beds.count_documents({"status": "Occupied"})
+        from utils.live_counters import live_counters
+        occupied_count = (await live_counters.fresh()).get("beds", "Occupied")
         
         # Try to load pattern from forecast_output.json
         forecast_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'forecast_output.json')
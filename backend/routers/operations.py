@@ -1,8 +1,11 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import List
 from database.database import mongo_db
 from database.models_mongo import WaitlistEntry, InventoryItem
 from bson import ObjectId
+from pymongo import ReturnDocument
+from utils.waitlist_matching import waitlist_matcher
+from utils.waitlist_queue import waitlist_queue, PRIORITY_RANK
 
 router = APIRouter(
     prefix="/operations",
@@ -16,18 +19,24 @@ async def add_to_waitlist(entry: WaitlistEntry):
     try:
         entry_dict = entry.dict()
         result = await mongo_db.waitlist.insert_one(entry_dict)
+        if entry_dict["status"] == "Waiting":
+            waitlist_queue.add(entry_dict)
+            waitlist_matcher.add_patient(entry_dict)
         return {"id": str(result.inserted_id), "message": "Added to waitlist"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/waitlist", response_model=List[dict])
-async def get_waitlist():
+async def get_waitlist(limit: int = Query(100, ge=1, le=1000)):
+    """Waiting patients in priority order (High first, then by time joined)."""
     try:
-        waitlist = await mongo_db.waitlist.find().to_list(100)
-        # Convert ObjectId to str
-        for w in waitlist:
-            w["id"] = str(w["_id"])
-            del w["_id"]
+        waitlist = []
+        for position, entry in enumerate(waitlist_queue.ordered(limit), start=1):
+            # Convert ObjectId to str
+            w = {k: v for k, v in entry.items() if k != "_id"}
+            w["id"] = str(entry["_id"])
+            w["position"] = position
+            waitlist.append(w)
         return waitlist
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -41,7 +50,74 @@ async def update_waitlist_status(id: str, status: str):
         )
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Entry not found")
+        if status == "Waiting":
+            entry = await mongo_db.waitlist.find_one({"_id": ObjectId(id)})
+            waitlist_queue.add(entry)
+            waitlist_matcher.add_patient(entry)
+        else:
+            waitlist_queue.remove(id)
+            waitlist_matcher.remove_patient(id)
         return {"message": "Status updated"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.put("/waitlist/{id}/priority")
+async def update_waitlist_priority(id: str, priority: str):
+    if priority not in PRIORITY_RANK:
+        raise HTTPException(status_code=400, detail=f"Invalid priority. Options: {list(PRIORITY_RANK)}")
+    try:
+        entry = await mongo_db.waitlist.find_one_and_update(
+            {"_id": ObjectId(id)},
+            {"$set": {"priority": priority}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not entry:
+            raise HTTPException(status_code=404, detail="Entry not found")
+        if id in waitlist_queue.entries:
+            waitlist_queue.set_priority(id, priority)
+            waitlist_matcher.add_patient(entry)
+        return {"message": "Priority updated"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/waitlist/{id}/position")
+async def get_waitlist_position(id: str):
+    """Live queue position and estimated wait (hours, from discharge forecasts)."""
+    from utils.waitlist_queue import estimate_wait
+    if id not in waitlist_queue.entries:
+        raise HTTPException(status_code=404, detail="Entry is not waiting")
+    try:
+        return await estimate_wait(id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/waitlist/matches")
+async def get_waitlist_matches():
+    """Current optimal waitlist-to-bed assignment (re-solved on every waitlist or bed change)."""
+    return waitlist_matcher.summary()
+
+@router.post("/waitlist/{id}/admit")
+async def admit_from_waitlist(id: str):
+    """Claim the bed proposed for this waitlist entry and mark the entry admitted."""
+    from utils.bed_allocation import claim_bed
+    try:
+        match = waitlist_matcher.match_for(id)
+        if not match:
+            raise HTTPException(status_code=409, detail="No bed is currently matched to this entry")
+        entry = waitlist_matcher.patients[id]
+        bed = await claim_bed(match["bed_id"], entry["patient_id"], diagnosis=entry.get("reason"))
+        if not bed:
+            # Taken since the last solve; re-solve without it
+            waitlist_matcher.bed_taken(match["bed_id"])
+            raise HTTPException(status_code=409, detail="Matched bed was taken, a new match has been computed")
+        # claim_bed marked the entry Admitted and removed it from the queue and matcher
+        return {"message": "Patient admitted", "bed_id": match["bed_id"], "bed_number": bed.get("bed_number")}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
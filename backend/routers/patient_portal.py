@@ -53,6 +53,22 @@ class PatientProfile(BaseModel):
     skin_thickness: Optional[int] = None
     diabetes_pedigree: Optional[float] = None
     
+    # Symptoms (Diabetes risk model, 0 or 1)
+    polyuria: Optional[int] = None
+    polydipsia: Optional[int] = None
+    sudden_weight_loss: Optional[int] = None
+    weakness: Optional[int] = None
+    polyphagia: Optional[int] = None
+    genital_thrush: Optional[int] = None
+    visual_blurring: Optional[int] = None
+    itching: Optional[int] = None
+    irritability: Optional[int] = None
+    delayed_healing: Optional[int] = None
+    partial_paresis: Optional[int] = None
+    muscle_stiffness: Optional[int] = None
+    alopecia: Optional[int] = None
+    obesity: Optional[int] = None
+    
     # History
     conditions: Optional[str] = None
     medications: Optional[str] = None
@@ -77,6 +93,17 @@ async def save_patient_profile(
         upsert=True
     )
     
+    # Refresh model-ready feature vectors
+    try:
+        from utils.feature_store import materialize_profile
+        await materialize_profile(profile_data)
+    except Exception as e:
+        print(f"⚠️ Feature materialization failed for {current_user.username}: {e}")
+    
+    # Refresh risk predictions once the burst of edits settles
+    from utils.repredict import repredict_queue
+    repredict_queue.enqueue(current_user.username)
+    
     return {"success": True, "message": "Profile saved successfully"}
 
 @router.get("/profile")
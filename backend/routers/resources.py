@@ -1,10 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
 from pydantic import BaseModel
 from database.database import mongo_db
-from database.models_mongo import ResourceData, BedData, BillData
+from database.models_mongo import ResourceData, BedData, BillData, WardData, BedLocation
 from bson import ObjectId
+from pymongo import ReturnDocument
+from utils.live_counters import live_counters
+from utils.revisions import revisions
 
 router = APIRouter(
     tags=["Resource & Bed Management"]
@@ -19,76 +22,215 @@ def serialize_doc(doc):
 def serialize_list(cursor):
     return [serialize_doc(doc) for doc in cursor]
 
+async def board(stream, request, response, since, limit):
+    """
+    Delta sync for a board collection. Without `since`: the full list (legacy
+    shape). With `since`: {rev, full, <stream>} holding only documents changed
+    after `since` (a full snapshot if `since` predates a reseed).
+    Answers 304 when the client's ETag is current.
+    """
+    rev = revisions.watermark(stream)
+    etag = revisions.etag(stream, rev)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    collection = mongo_db[stream]
+    if since is None:
+        return serialize_list(await collection.find({}).to_list(length=limit))
+    full = revisions.needs_snapshot(stream, since)
+    query = {} if full else {"rev": {"$gt": since, "$lte": rev}}
+    docs = await collection.find(query).to_list(length=limit if full else None)
+    return {"rev": rev, "full": full, stream: serialize_list(docs)}
+
 # --- Resources ---
 
-@router.get("/resources/current", response_model=List[dict])
-async def get_resources():
-    cursor = mongo_db.resources.find({})
-    resources = await cursor.to_list(length=100)
-    return serialize_list(resources)
+@router.get("/resources/current")
+async def get_resources(request: Request, response: Response, since: Optional[int] = Query(None, ge=0)):
+    return await board("resources", request, response, since, 100)
 
 @router.post("/resources/update")
 async def update_resource(data: ResourceData):
     try:
         # Update or Insert
-        await mongo_db.resources.update_one(
-            {"type": data.type},
-            {"$set": data.dict(exclude={"last_updated"}), "$currentDate": {"last_updated": True}},
-            upsert=True
-        )
+        async with revisions.stamp("resources") as rev:
+            await mongo_db.resources.update_one(
+                {"type": data.type},
+                {"$set": {**data.dict(exclude={"last_updated"}), "rev": rev}, "$currentDate": {"last_updated": True}},
+                upsert=True
+            )
         return {"message": f"Resource {data.type} updated"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # --- Beds ---
 
-@router.get("/beds", response_model=List[dict])
-async def get_beds():
-    cursor = mongo_db.beds.find({})
-    beds = await cursor.to_list(length=1000)
-    return serialize_list(beds)
+@router.get("/beds")
+async def get_beds(request: Request, response: Response, since: Optional[int] = Query(None, ge=0)):
+    """All beds, or with `since=<rev>` only beds changed after that revision."""
+    return await board("beds", request, response, since, 1000)
+
+@router.get("/beds/occupancy/history")
+async def get_occupancy_history(hours: int = Query(168, ge=1, le=24 * 366), bed_type: Optional[str] = None):
+    """Hourly occupancy series (average occupied beds per hour) derived from the bed event log."""
+    from utils.bed_occupancy import series, floor_hour
+    try:
+        end = floor_hour(datetime.utcnow())
+        return await series(end - timedelta(hours=hours), end, bed_type)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/beds/topology")
+async def get_bed_topology():
+    """building -> floor -> ward -> room -> beds."""
+    from utils.bed_topology import topology
+    try:
+        return await topology()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/beds/search")
+async def search_beds(
+    near: Optional[str] = Query(None, description="Ward to search outward from"),
+    bed_type: Optional[str] = None,
+    capabilities: Optional[str] = Query(None, description="Comma-separated tags, e.g. isolation,oxygen"),
+    limit: int = Query(10, ge=1, le=100)
+):
+    """Free beds with every required capability, nearest ward first (in-memory index)."""
+    from utils.bed_topology import bed_index
+    tags = [t for t in (capabilities or "").split(",") if t.strip()]
+    return bed_index.search(near, bed_type, tags, limit)
+
+@router.put("/wards")
+async def upsert_ward(data: WardData):
+    from utils.bed_topology import bed_index
+    from utils.waitlist_matching import waitlist_matcher
+    try:
+        await mongo_db.wards.update_one({"name": data.name}, {"$set": data.dict()}, upsert=True)
+        bed_index.set_ward(data.dict())
+        waitlist_matcher.set_ward(data.dict())
+        return {"message": f"Ward {data.name} saved"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.put("/beds/{bed_id}/location")
+async def update_bed_location(bed_id: str, data: BedLocation):
+    """Move a bed in the topology or change its capability tags."""
+    from utils.bed_topology import bed_index
+    from utils.waitlist_matching import waitlist_matcher
+    changes = data.dict(exclude_none=True)
+    if "capabilities" in changes:
+        changes["capabilities"] = sorted({t.strip().lower() for t in changes["capabilities"] if t.strip()})
+    if not changes:
+        raise HTTPException(status_code=400, detail="Nothing to update")
+    try:
+        async with revisions.stamp("beds") as rev:
+            bed = await mongo_db.beds.find_one_and_update(
+                {"_id": ObjectId(bed_id)},
+                {"$set": {**changes, "rev": rev}},
+                return_document=ReturnDocument.AFTER
+            )
+        if not bed:
+            raise HTTPException(status_code=404, detail="Bed not found")
+        if bed.get("status") == "Available":
+            # Re-index under the new ward / capability bitset
+            bed_index.bed_freed(bed)
+            waitlist_matcher.bed_freed(bed)
+        return {"message": "Bed location updated"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/beds/{bed_id}/events", response_model=List[dict])
+async def get_bed_events(bed_id: str, limit: int = Query(100, ge=1, le=1000)):
+    """Transition history of one bed, newest first."""
+    events = await mongo_db.bed_events.find({"bed_id": bed_id}, {"_id": 0}).sort("at", -1).to_list(limit)
+    return events
 
 class BedAllocation(BaseModel):
     bed_id: str
     patient_id: str
+    diagnosis: Optional[str] = None
+    severity: Optional[int] = None  # 1-5 scale
 
 class BedDeallocation(BaseModel):
     bed_id: str
 
+class BulkPatient(BaseModel):
+    patient_id: str
+    diagnosis: Optional[str] = None
+    severity: Optional[int] = None  # 1-5 scale
+    bed_type: Optional[str] = None  # preferred type; falls back by severity
+
+class BulkBedAllocation(BaseModel):
+    patients: List[BulkPatient]
+    ward: Optional[str] = None  # preferred ward
+
 @router.post("/beds/allocate")
 async def allocate_bed(data: BedAllocation):
+    from utils.bed_allocation import claim_bed
     try:
-        bed = await mongo_db.beds.find_one({"_id": ObjectId(data.bed_id)})
+        bed = await claim_bed(data.bed_id, data.patient_id, data.diagnosis, data.severity)
         if not bed:
-            raise HTTPException(status_code=404, detail="Bed not found")
-        if bed.get("status") != "Available":
+            if await mongo_db.beds.count_documents({"_id": ObjectId(data.bed_id)}, limit=1) == 0:
+                raise HTTPException(status_code=404, detail="Bed not found")
             raise HTTPException(status_code=400, detail="Bed is not available")
-            
-        await mongo_db.beds.update_one(
-            {"_id": ObjectId(data.bed_id)},
-            {"$set": {"status": "Occupied", "patient_id": data.patient_id}}
-        )
         return {"message": "Bed allocated successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/beds/allocate/bulk")
+async def allocate_beds_bulk(data: BulkBedAllocation):
+    """Mass-casualty mode: assign many patients to the best-matching free beds at once."""
+    from utils.bed_allocation import allocate_bulk
+    ids = [p.patient_id for p in data.patients]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Duplicate patient_id in request")
+    try:
+        allocated, unallocated = await allocate_bulk([p.dict() for p in data.patients], data.ward)
+        return {
+            "message": f"Allocated {len(allocated)} of {len(ids)} patients",
+            "allocated": allocated,
+            "unallocated": unallocated
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/beds/deallocate")
 async def deallocate_bed(data: BedDeallocation):
+    from utils.bed_allocation import release_bed
     try:
-        bed = await mongo_db.beds.find_one({"_id": ObjectId(data.bed_id)})
+        # 1. Update Bed Status (returns the bed as it was while occupied)
+        bed, discharged_at = await release_bed(data.bed_id)
         if not bed:
-            raise HTTPException(status_code=404, detail="Bed not found")
-        if bed.get("status") != "Occupied":
+            if await mongo_db.beds.count_documents({"_id": ObjectId(data.bed_id)}, limit=1) == 0:
+                raise HTTPException(status_code=404, detail="Bed not found")
             raise HTTPException(status_code=400, detail="Bed is not occupied")
             
         patient_id = bed.get("patient_id")
         bed_type = bed.get("type", "General")
         
-        # 1. Update Bed Status
-        await mongo_db.beds.update_one(
-            {"_id": ObjectId(data.bed_id)},
-            {"$set": {"status": "Available", "patient_id": None}}
-        )
+        # Stop continuous vitals monitoring for the discharged patient
+        if patient_id:
+            from utils.vitals_stream import vitals_stream
+            vitals_stream.discharge(patient_id)
+        
+        # Record the completed stay (training data for the length-of-stay model)
+        if patient_id and bed.get("allocated_at"):
+            await mongo_db.admissions.insert_one({
+                "patient_id": patient_id,
+                "bed_id": data.bed_id,
+                "bed_number": bed.get("bed_number"),
+                "bed_type": bed_type,
+                "diagnosis": bed.get("diagnosis"),
+                "severity": bed.get("severity"),
+                "admitted_at": bed["allocated_at"],
+                "discharged_at": discharged_at,
+                "los_days": (discharged_at - bed["allocated_at"]).total_seconds() / 86400
+            })
         
         # 2. Trigger Billing (Hospital Stay)
         # Rates: General=1200, ICU=1500, Private=2000, Emergency=500
@@ -106,12 +248,17 @@ async def deallocate_bed(data: BedDeallocation):
                 appointment_id="hospital_stay", # Placeholder
                 amount=cost, 
                 status="Pending",
-                items=[{"description": f"Hospital Stay - {bed_type} Bed {bed.get('bed_number')}", "cost": cost}],
+                items=[{"description": f"Hospital Stay - {bed_type} Bed {bed.get('bed_number')}", "cost": cost, "category": "room"}],
+                department=bed.get("ward") or bed_type,
                 date=datetime.utcnow()
             )
             await mongo_db.bills.insert_one(bill.dict())
+            from utils.cost_analytics import record_bill_costs
+            await record_bill_costs(bill.dict())
             
         return {"message": "Bed deallocated and bill generated"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -184,8 +331,9 @@ async def get_ops_stats():
         
         revenue = sales_doc.get("total_revenue", 0.0) if sales_doc else 0.0
         
-        # Count staff - checking doctors for now or users
-        staff_count = await mongo_db.users.count_documents({"role": {"$in": ["doctor", "frontdesk"]}})
+        # Count staff (users live in SQL; served from in-memory counters)
+        counters = await live_counters.fresh()
+        staff_count = counters.get("users", "doctor") + counters.get("users", "frontdesk")
         
         return {
             "daily_revenue": revenue,
@@ -1,7 +1,8 @@
 
 import asyncio
 from database.database import mongo_db
-from database.models_mongo import BedData
+from database.models_mongo import BedData, WardData
+from utils.revisions import next_revision, mark_reset
 from bson import ObjectId
 
 async def seed_beds():
@@ -17,7 +18,11 @@ async def seed_beds():
             ward="Floor 1 - General",
             status="Available",
             type="General",
-            floor=1
+            floor=1,
+            building="Main",
+            room=f"G1-R{(i + 1) // 2:02d}",
+            # Last room doubles as isolation
+            capabilities=["isolation"] if i > 18 else []
         ).dict())
 
     # Floor 2: Private Rooms (10 Beds)
@@ -27,7 +32,10 @@ async def seed_beds():
             ward="Floor 2 - Private",
             status="Available",
             type="Private",
-            floor=2
+            floor=2,
+            building="Main",
+            room=f"P2-R{i:02d}",
+            capabilities=["oxygen"]
         ).dict())
 
     # Floor 3: ICU (5 Beds)
@@ -37,7 +45,10 @@ async def seed_beds():
             ward="Floor 3 - ICU",
             status="Available",
             type="ICU",
-            floor=3
+            floor=3,
+            building="Main",
+            room=f"ICU-R{i:02d}",
+            capabilities=["oxygen", "ventilator", "telemetry"] + (["isolation", "negative_pressure"] if i <= 2 else [])
         ).dict())
 
     # Emergency Ward (Ground Floor) (5 Beds)
@@ -47,12 +58,32 @@ async def seed_beds():
             ward="Ground - Emergency",
             status="Available",
             type="Emergency",
-            floor=0
+            floor=0,
+            building="Main",
+            room="ER-BAY",
+            capabilities=["oxygen", "telemetry"]
         ).dict())
         
+    # Ward topology (position = order along the floor)
+    wards = [
+        WardData(name="Ground - Emergency", building="Main", floor=0, position=0, departments=["Emergency"]),
+        WardData(name="Floor 1 - General", building="Main", floor=1, position=0,
+                 departments=["General Medicine", "Cardiology", "Endocrinology", "Orthopedics"]),
+        WardData(name="Floor 2 - Private", building="Main", floor=2, position=0),
+        WardData(name="Floor 3 - ICU", building="Main", floor=3, position=0, departments=["Critical Care", "Cardiology"]),
+    ]
+    for ward in wards:
+        await mongo_db.wards.update_one({"name": ward.name}, {"$set": ward.dict()}, upsert=True)
+
+    # Board clients older than this revision resync from a full snapshot
+    rev = await next_revision("beds")
+    for bed in beds_to_add:
+        bed["rev"] = rev
+
     print(f"🛏️ Seeding {len(beds_to_add)} beds...")
     if beds_to_add:
         await mongo_db.beds.insert_many(beds_to_add)
+    await mark_reset("beds", rev)
     
     print("✅ Bed seeding complete!")
 
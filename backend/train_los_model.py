@@ -0,0 +1,90 @@
+"""
+Train the length-of-stay model from completed admissions.
+
+Admissions are recorded by /beds/deallocate (bed allocate -> deallocate
+timestamps). Features known at admission time are joined from
+patient_profiles (age) and medical_history (active conditions):
+    age, severity, comorbidities, bed type
+The bundle served by get_model('los') holds a RandomForestRegressor for the
+point estimate and one GradientBoostingRegressor(loss="quantile") per
+quantile in LOS_QUANTILES (see predict_los_quantiles).
+
+Usage (from backend/):
+    python train_los_model.py
+"""
+import asyncio
+import os
+from datetime import datetime
+
+import joblib
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import train_test_split
+
+from database.database import mongo_db
+from routers.ml_models import LOS_MODEL_PATH, LOS_FEATURES, LOS_QUANTILES, los_matrix, predict_los_quantiles
+from utils.discharge_forecast import fetch_los_context
+
+MIN_ADMISSIONS = 50
+BED_TYPES = ['General', 'ICU', 'Private', 'Emergency']
+
+async def load_admissions():
+    admissions = await mongo_db.admissions.find(
+        {"los_days": {"$gt": 0}},
+        {"_id": 0, "patient_id": 1, "bed_type": 1, "severity": 1, "los_days": 1}
+    ).to_list(None)
+
+    ages, comorbidities = await fetch_los_context(list({a["patient_id"] for a in admissions}))
+    for a in admissions:
+        a["age"] = ages.get(a["patient_id"])
+        a["comorbidities"] = comorbidities.get(a["patient_id"], 0)
+    return admissions
+
+async def train():
+    admissions = await load_admissions()
+    print(f"✅ Loaded {len(admissions)} completed admissions")
+    if len(admissions) < MIN_ADMISSIONS:
+        print(f"❌ Need at least {MIN_ADMISSIONS} admissions to train; keeping the current model.")
+        return
+
+    X = los_matrix(admissions, BED_TYPES)
+    y = np.array([a["los_days"] for a in admissions])
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    print("🚀 Training RandomForest length-of-stay model...")
+    model = RandomForestRegressor(n_estimators=200, min_samples_leaf=5, n_jobs=-1, random_state=42)
+    model.fit(X_train, y_train)
+
+    mae = mean_absolute_error(y_test, model.predict(X_test))
+    print(f"\n📊 MAE: {mae:.2f} days\n")
+
+    print(f"🚀 Training quantile models for {LOS_QUANTILES}...")
+    quantile_models = {}
+    for q in LOS_QUANTILES:
+        quantile_models[q] = GradientBoostingRegressor(
+            loss="quantile", alpha=q, n_estimators=200, max_depth=3, min_samples_leaf=5, random_state=42
+        ).fit(X_train, y_train)
+
+    bands = predict_los_quantiles({'quantile_models': quantile_models}, X_test)
+    coverage = float(np.mean((y_test >= bands[:, 0]) & (y_test <= bands[:, -1])))
+    print(f"📊 {LOS_QUANTILES[0]:.0%}-{LOS_QUANTILES[-1]:.0%} interval coverage on test set: {coverage:.1%}\n")
+
+    bundle = {
+        'model': model,
+        'quantile_models': quantile_models,
+        'quantiles': LOS_QUANTILES,
+        'interval_coverage': coverage,
+        'features': LOS_FEATURES,
+        'bed_types': BED_TYPES,
+        'mae_days': float(mae),
+        'n_samples': len(admissions),
+        'trained_at': datetime.utcnow()
+    }
+    os.makedirs(os.path.dirname(LOS_MODEL_PATH), exist_ok=True)
+    joblib.dump(bundle, LOS_MODEL_PATH)
+    print(f"💾 Model saved to: {LOS_MODEL_PATH}")
+
+if __name__ == "__main__":
+    asyncio.run(train())
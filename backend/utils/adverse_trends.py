@@ -0,0 +1,141 @@
+"""
+Adverse-event trend engine.
+
+Logging an event increments a per-day bucket in `adverse_event_daily`:
+
+    {"day": <UTC midnight>, "total": 7, "counts": {"<event_type>": {"<severity>": 3}}}
+
+Trend queries read at most one bucket per day of the requested window
+(an indexed range scan whose size does not depend on how many events were
+logged), expand them into a dense event_type x day matrix and compute
+rolling totals and EWMA-based "trending up" flags vectorized in NumPy.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from database.database import mongo_db
+
+EWMA_SHORT_SPAN = 7
+EWMA_LONG_SPAN = 28
+# Flag a type when its short EWMA exceeds the long one by this factor...
+TRENDING_RATIO = 1.5
+# ...and it had at least this many events in the last EWMA_SHORT_SPAN days
+TRENDING_MIN_EVENTS = 3
+
+def _day(ts):
+    return datetime(ts.year, ts.month, ts.day)
+
+def _key(value):
+    # Field names in the bucket document cannot contain dots or start with $
+    return str(value or "unknown").strip().lower().replace(".", "_").lstrip("$") or "unknown"
+
+async def record_event(event_type, severity, reported_at):
+    await mongo_db.adverse_event_daily.update_one(
+        {"day": _day(reported_at)},
+        {"$inc": {"total": 1, f"counts.{_key(event_type)}.{_key(severity)}": 1}},
+        upsert=True
+    )
+
+async def rebuild_buckets():
+    """Recompute every daily bucket from adverse_events (backfill / repair)."""
+    rows = await mongo_db.adverse_events.aggregate([
+        {"$group": {
+            "_id": {
+                "day": {"$dateFromParts": {
+                    "year": {"$year": "$reported_at"},
+                    "month": {"$month": "$reported_at"},
+                    "day": {"$dayOfMonth": "$reported_at"}
+                }},
+                "event_type": "$event_type",
+                "severity": "$severity"
+            },
+            "count": {"$sum": 1}
+        }}
+    ], allowDiskUse=True).to_list(None)
+
+    buckets = {}
+    for row in rows:
+        b = buckets.setdefault(row["_id"]["day"], {"day": row["_id"]["day"], "total": 0, "counts": {}})
+        by_severity = b["counts"].setdefault(_key(row["_id"]["event_type"]), {})
+        severity = _key(row["_id"]["severity"])
+        by_severity[severity] = by_severity.get(severity, 0) + row["count"]
+        b["total"] += row["count"]
+
+    await mongo_db.adverse_event_daily.delete_many({})
+    if buckets:
+        await mongo_db.adverse_event_daily.insert_many(list(buckets.values()))
+    return len(buckets)
+
+async def ensure_buckets():
+    """Backfill the buckets once for deployments that logged events before they existed."""
+    if await mongo_db.adverse_event_daily.count_documents({}, limit=1) == 0 \
+            and await mongo_db.adverse_events.count_documents({}, limit=1) > 0:
+        days = await rebuild_buckets()
+        print(f"📊 Backfilled {days} adverse-event day buckets")
+
+def ewma(series, span):
+    """EWMA along the last axis (days) for every row at once."""
+    alpha = 2.0 / (span + 1)
+    out = np.empty_like(series, dtype=float)
+    out[..., 0] = series[..., 0]
+    for t in range(1, series.shape[-1]):
+        out[..., t] = alpha * series[..., t] + (1 - alpha) * out[..., t - 1]
+    return out
+
+async def trends(days, now=None):
+    today = _day(now or datetime.utcnow())
+    # Previous period for comparison, and enough history to warm up the long EWMA
+    history = max(2 * days, days + EWMA_LONG_SPAN)
+    start = today - timedelta(days=history - 1)
+    buckets = await mongo_db.adverse_event_daily.find(
+        {"day": {"$gte": start, "$lte": today}}, {"_id": 0}
+    ).to_list(history)
+
+    types = sorted({t for b in buckets for t in b.get("counts", {})})
+    severities = sorted({s for b in buckets for by_sev in b.get("counts", {}).values() for s in by_sev})
+    t_index = {t: i for i, t in enumerate(types)}
+    s_index = {s: i for i, s in enumerate(severities)}
+
+    # (event_type, severity, day) counts, oldest day first
+    counts = np.zeros((len(types), len(severities), history))
+    for b in buckets:
+        d = (b["day"] - start).days
+        for t, by_sev in b.get("counts", {}).items():
+            for s, n in by_sev.items():
+                counts[t_index[t], s_index[s], d] = n
+
+    by_type_day = counts.sum(axis=1)
+    window = counts[..., -days:]
+    by_type = window.sum(axis=(1, 2))
+    by_severity = window.sum(axis=(0, 2))
+
+    trending_up = []
+    if types:
+        short = ewma(by_type_day, EWMA_SHORT_SPAN)[:, -1]
+        long = ewma(by_type_day, EWMA_LONG_SPAN)[:, -1]
+        recent = by_type_day[:, -EWMA_SHORT_SPAN:].sum(axis=1)
+        flagged = (short > TRENDING_RATIO * long) & (recent >= TRENDING_MIN_EVENTS)
+        for i in np.nonzero(flagged)[0]:
+            trending_up.append({
+                "event_type": types[i],
+                "last_7_days": int(recent[i]),
+                "ewma_short": round(float(short[i]), 3),
+                "ewma_long": round(float(long[i]), 3)
+            })
+        trending_up.sort(key=lambda x: x["ewma_short"] / max(x["ewma_long"], 1e-9), reverse=True)
+
+    daily = by_type_day.sum(axis=0)
+    rolling = np.convolve(daily, np.ones(7), mode='full')[:history][-days:]
+    return {
+        "period_days": days,
+        "total_events": int(window.sum()),
+        "previous_period_events": int(daily[-2 * days:-days].sum()),
+        "by_type": {t: int(n) for t, n in zip(types, by_type) if n},
+        "by_severity": {s: int(n) for s, n in zip(severities, by_severity) if n},
+        "rolling_7_day": [
+            {"day": (today - timedelta(days=days - 1 - i)).date().isoformat(), "events": int(v)}
+            for i, v in enumerate(rolling)
+        ],
+        "trending_up": trending_up
+    }
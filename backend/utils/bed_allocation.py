@@ -0,0 +1,191 @@
+"""
+Race-free bed allocation.
+
+Every state change is a single conditional write on the bed's status, so two
+users can never hold the same bed: claiming matches `status: Available`,
+releasing matches `status: Occupied`, and whoever loses the race gets None.
+
+Bulk (mass-casualty) allocation reads all free beds with one aggregation,
+matches patients to beds in memory (highest severity first, requested bed
+type first, then a severity-dependent fallback order) and claims them with
+one unordered bulk write whose updates are conditional on the bed still
+being free. Beds taken concurrently are detected afterwards and the affected
+patients are matched again against a fresh read.
+
+Whatever route places a patient, their Waiting waitlist entries are marked
+Admitted and leave the waitlist queue and matcher.
+"""
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import UpdateOne, ReturnDocument
+
+from database.database import mongo_db
+from utils.bed_events import event_doc, record_bed_event, record_bed_events, ALLOCATED, RELEASED
+from utils.bed_topology import bed_index
+from utils.live_counters import live_counters
+from utils.revisions import revisions
+from utils.waitlist_matching import waitlist_matcher
+from utils.waitlist_queue import waitlist_queue
+
+# Bed types tried after the requested one
+CRITICAL_FALLBACK = ["ICU", "Emergency", "Private", "General"]
+STANDARD_FALLBACK = ["General", "Private", "Emergency", "ICU"]
+CRITICAL_SEVERITY = 4
+MAX_BULK_ROUNDS = 3
+
+CLEARED_FIELDS = {"status": "Available", "patient_id": None, "allocated_at": None, "diagnosis": None, "severity": None}
+
+def _now():
+    # MongoDB stores milliseconds; truncate so the stored value can be matched exactly
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+def _occupied_fields(patient_id, diagnosis, severity, allocated_at):
+    return {
+        "status": "Occupied",
+        "patient_id": patient_id,
+        "allocated_at": allocated_at,
+        "diagnosis": diagnosis,
+        "severity": severity
+    }
+
+async def admit_waitlisted(placements, admitted_at):
+    """Mark the Waiting waitlist entries of newly placed patients Admitted. `placements`: patient_id -> bed_id."""
+    entries = await mongo_db.waitlist.find(
+        {"patient_id": {"$in": list(placements)}, "status": "Waiting"}, {"patient_id": 1}
+    ).to_list(None)
+    if not entries:
+        return
+    await mongo_db.waitlist.bulk_write([
+        UpdateOne(
+            {"_id": e["_id"], "status": "Waiting"},
+            {"$set": {"status": "Admitted", "bed_id": placements[e["patient_id"]], "admitted_at": admitted_at}}
+        )
+        for e in entries
+    ], ordered=False)
+    for e in entries:
+        waitlist_queue.remove(str(e["_id"]))
+        waitlist_matcher.remove_patient(str(e["_id"]), solve=False)
+    waitlist_matcher.solve()
+
+async def claim_bed(bed_id, patient_id, diagnosis=None, severity=None):
+    """Available -> Occupied in one write. Returns the updated bed, or None if it was not available."""
+    allocated_at = _now()
+    async with revisions.stamp("beds") as rev:
+        bed = await mongo_db.beds.find_one_and_update(
+            {"_id": ObjectId(bed_id), "status": "Available"},
+            {"$set": {**_occupied_fields(patient_id, diagnosis, severity, allocated_at), "rev": rev}},
+            return_document=ReturnDocument.AFTER
+        )
+    if bed:
+        await record_bed_event(bed, ALLOCATED, patient_id, allocated_at)
+        live_counters.bed_status_changed(bed.get("type"), "Available", "Occupied")
+        waitlist_matcher.bed_taken(str(bed["_id"]))
+        bed_index.bed_taken(str(bed["_id"]))
+        await admit_waitlisted({patient_id: str(bed["_id"])}, allocated_at)
+    return bed
+
+async def release_bed(bed_id):
+    """Occupied -> Available in one write. Returns (bed as it was before release or None, release time)."""
+    released_at = _now()
+    async with revisions.stamp("beds") as rev:
+        bed = await mongo_db.beds.find_one_and_update(
+            {"_id": ObjectId(bed_id), "status": "Occupied"},
+            {"$set": {**CLEARED_FIELDS, "rev": rev}},
+            return_document=ReturnDocument.BEFORE
+        )
+    if bed:
+        await record_bed_event(bed, RELEASED, bed.get("patient_id"), released_at)
+        live_counters.bed_status_changed(bed.get("type"), "Occupied", "Available")
+        waitlist_matcher.bed_freed(bed)
+        bed_index.bed_freed(bed)
+    return bed, released_at
+
+def preference(patient):
+    fallback = CRITICAL_FALLBACK if (patient.get("severity") or 0) >= CRITICAL_SEVERITY else STANDARD_FALLBACK
+    requested = patient.get("bed_type")
+    return ([requested] if requested else []) + [t for t in fallback if t != requested]
+
+async def free_beds_by_type(ward=None):
+    """One aggregation: bed type -> free beds (preferred ward first, then by bed number)."""
+    pipeline = [{"$match": {"status": "Available"}}]
+    if ward:
+        pipeline += [{"$addFields": {"_other_ward": {"$ne": ["$ward", ward]}}}, {"$sort": {"_other_ward": 1, "bed_number": 1}}]
+    else:
+        pipeline += [{"$sort": {"bed_number": 1}}]
+    pipeline.append({"$group": {
+        "_id": {"$ifNull": ["$type", "General"]},
+        "beds": {"$push": {"_id": "$_id", "bed_number": "$bed_number", "type": "$type", "ward": "$ward"}}
+    }})
+    groups = await mongo_db.beds.aggregate(pipeline).to_list(None)
+    return {g["_id"]: g["beds"] for g in groups}
+
+def match_patients(patients, pools):
+    """Greedy match, most severe first. Returns [(patient, bed)] and the unmatched patients."""
+    matched, unmatched = [], []
+    for patient in sorted(patients, key=lambda p: -(p.get("severity") or 0)):
+        bed_type = next((t for t in preference(patient) if pools.get(t)), None)
+        if bed_type is None:
+            unmatched.append(patient)
+        else:
+            matched.append((patient, pools[bed_type].pop(0)))
+    return matched, unmatched
+
+async def allocate_bulk(patients, ward=None):
+    """
+    Assign many patients to free beds. `patients` are dicts with patient_id and
+    optional diagnosis, severity (1-5) and bed_type. Returns (allocated, unallocated).
+    """
+    allocated, unallocated, pending = [], [], list(patients)
+    for _ in range(MAX_BULK_ROUNDS):
+        if not pending:
+            break
+        matched, unmatched = match_patients(pending, await free_beds_by_type(ward))
+        # No bed of any acceptable type is free; a retry will not find one either
+        unallocated += unmatched
+        pending = []
+        if not matched:
+            break
+
+        allocated_at = _now()
+        async with revisions.stamp("beds") as rev:
+            result = await mongo_db.beds.bulk_write([
+                UpdateOne(
+                    {"_id": bed["_id"], "status": "Available"},
+                    {"$set": {**_occupied_fields(p["patient_id"], p.get("diagnosis"), p.get("severity"), allocated_at), "rev": rev}}
+                )
+                for p, bed in matched
+            ], ordered=False)
+
+        won = matched
+        if result.modified_count < len(matched):
+            # Some beds were taken between the read and the write: keep only ours
+            ours = {
+                (b["_id"], b["patient_id"])
+                async for b in mongo_db.beds.find(
+                    {"_id": {"$in": [bed["_id"] for _, bed in matched]}, "allocated_at": allocated_at},
+                    {"patient_id": 1}
+                )
+            }
+            won = [(p, bed) for p, bed in matched if (bed["_id"], p["patient_id"]) in ours]
+            pending = [p for p, bed in matched if (bed["_id"], p["patient_id"]) not in ours]
+
+        if won:
+            await record_bed_events([event_doc(bed, ALLOCATED, p["patient_id"], allocated_at) for p, bed in won])
+            for _, bed in won:
+                live_counters.bed_status_changed(bed.get("type"), "Available", "Occupied")
+            waitlist_matcher.beds_taken([str(bed["_id"]) for _, bed in won])
+            bed_index.beds_taken([str(bed["_id"]) for _, bed in won])
+            await admit_waitlisted({p["patient_id"]: str(bed["_id"]) for p, bed in won}, allocated_at)
+        allocated += [
+            {
+                "patient_id": p["patient_id"],
+                "bed_id": str(bed["_id"]),
+                "bed_number": bed.get("bed_number"),
+                "bed_type": bed.get("type", "General"),
+                "ward": bed.get("ward")
+            }
+            for p, bed in won
+        ]
+    return allocated, [p["patient_id"] for p in unallocated + pending]
@@ -0,0 +1,37 @@
+"""
+Append-only bed event log.
+
+Every bed state change made through the API (allocate, release) appends
+one document to `bed_events`. Bed documents keep only the current state;
+occupancy history and utilization analytics are derived from this log.
+"""
+from datetime import datetime
+
+from database.database import mongo_db
+
+ALLOCATED = "allocated"
+RELEASED = "released"
+
+UNASSIGNED_WARD = "Unassigned"
+
+def event_doc(bed, event, patient_id=None, at=None):
+    return {
+        "bed_id": str(bed["_id"]),
+        "bed_number": bed.get("bed_number"),
+        "bed_type": bed.get("type", "General"),
+        "ward": bed.get("ward") or UNASSIGNED_WARD,
+        "event": event,
+        "patient_id": patient_id,
+        "at": at or datetime.utcnow()
+    }
+
+async def record_bed_event(bed, event, patient_id=None, at=None):
+    doc = event_doc(bed, event, patient_id, at)
+    await mongo_db.bed_events.insert_one(doc)
+    return doc
+
+async def record_bed_events(docs):
+    """Append many event documents (from `event_doc`) in one write."""
+    if docs:
+        await mongo_db.bed_events.insert_many(docs)
+    return docs
@@ -0,0 +1,164 @@
+"""
+Hourly bed occupancy time series derived from the bed event log.
+
+`bed_events` is the append-only record of every bed transition; bed
+documents only hold the current state. A background job extends
+`bed_occupancy_hourly` (one document per hour) from a watermark up to the
+last completed hour: occupancy intervals for the pending span are built
+once and intersected with every hour in a single NumPy operation. The beds
+occupied at the watermark are saved with it, so each pass reads only its
+own span of the log.
+
+    {"hour": <UTC hour>, "occupied": 12.5, "capacity": 40,
+     "by_type": {"ICU": {"occupied": 3.0, "capacity": 5, "allocations": 1, "releases": 0}}}
+
+`occupied` is the average number of occupied beds during the hour.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from pymongo import UpdateOne
+
+from database.database import mongo_db
+from utils.bed_utilization import window_intervals, opening_from_log
+
+JOB_NAME = "bed_occupancy_hourly"
+OCCUPANCY_INTERVAL_SECONDS = int(os.getenv("OCCUPANCY_INTERVAL_SECONDS", "900"))
+# Hours materialized per pass, bounding memory for the (intervals x hours) matrix
+MAX_HOURS_PER_PASS = 24 * 7
+
+def floor_hour(ts):
+    return datetime(ts.year, ts.month, ts.day, ts.hour)
+
+def hourly_occupancy(w, n_hours):
+    """Per bed type (occupied bed-hours, allocations, releases) for each hour: (types, 3 arrays of (k, n_hours))."""
+    types = sorted({g[1] for g in w["group_of"]})
+    type_index = {t: i for i, t in enumerate(types)}
+    bed_type = np.array([type_index[g[1]] for g in w["group_of"]], dtype=int)
+    bed, s, e = w["intervals"]
+
+    # overlap[i, h] = time interval i spends inside hour h
+    edges = np.arange(n_hours, dtype=float)
+    overlap = np.clip(np.minimum(e[:, None], edges + 1) - np.maximum(s[:, None], edges), 0, 1)
+    occupied = np.zeros((len(types), n_hours))
+    np.add.at(occupied, bed_type[bed], overlap)
+
+    def counts(mask):
+        out = np.zeros((len(types), n_hours))
+        hour = np.minimum(w["hours"][mask].astype(int), n_hours - 1)
+        np.add.at(out, (bed_type[w["bed_codes"][mask]], hour), 1)
+        return out
+
+    allocations = counts(w["is_alloc"] & w["real"])
+    releases = counts(~w["is_alloc"] & w["real"])
+    capacity = np.bincount(bed_type[w["inventory"]], minlength=len(types))
+    return types, occupied, allocations, releases, capacity
+
+async def extend_series(now=None):
+    """Materialize every completed hour after the watermark. Returns hours written."""
+    last_complete = floor_hour(now or datetime.utcnow())
+    checkpoint = await mongo_db.job_checkpoints.find_one({"job": JOB_NAME})
+    if checkpoint and checkpoint.get("next_hour"):
+        start = checkpoint["next_hour"]
+        opening = checkpoint.get("open_beds")
+    else:
+        first = await mongo_db.bed_events.find_one({}, sort=[("at", 1)])
+        if not first:
+            return 0
+        start = floor_hour(first["at"])
+        opening = {}
+
+    written = 0
+    while start < last_complete:
+        n_hours = min(int((last_complete - start).total_seconds() // 3600), MAX_HOURS_PER_PASS)
+        end = start + timedelta(hours=n_hours)
+        if opening is None:
+            # Checkpoint written before closing states were saved
+            opening = await opening_from_log(start)
+        w = await window_intervals(start, end, opening)
+        # The (intervals x hours) matrix is built in a worker thread, off the event loop
+        types, occupied, allocations, releases, capacity = await asyncio.to_thread(hourly_occupancy, w, n_hours)
+
+        ops = []
+        for h in range(n_hours):
+            ops.append(UpdateOne(
+                {"hour": start + timedelta(hours=h)},
+                {"$set": {
+                    "occupied": round(float(occupied[:, h].sum()), 3),
+                    "capacity": int(capacity.sum()),
+                    "by_type": {
+                        t: {
+                            "occupied": round(float(occupied[i, h]), 3),
+                            "capacity": int(capacity[i]),
+                            "allocations": int(allocations[i, h]),
+                            "releases": int(releases[i, h])
+                        }
+                        for i, t in enumerate(types)
+                    }
+                }},
+                upsert=True
+            ))
+        if ops:
+            await mongo_db.bed_occupancy_hourly.bulk_write(ops, ordered=False)
+        await mongo_db.job_checkpoints.update_one(
+            {"job": JOB_NAME},
+            {"$set": {"next_hour": end, "open_beds": w["closing"], "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+        opening = w["closing"]
+        written += n_hours
+        start = end
+    return written
+
+async def series(start, end, bed_type=None):
+    docs = await mongo_db.bed_occupancy_hourly.find(
+        {"hour": {"$gte": start, "$lt": end}}, {"_id": 0}
+    ).sort("hour", 1).to_list(None)
+    if bed_type:
+        return [
+            {"hour": d["hour"], **d.get("by_type", {}).get(bed_type, {"occupied": 0.0, "capacity": 0, "allocations": 0, "releases": 0})}
+            for d in docs
+        ]
+    return docs
+
+async def daily_training_frame(start=None, end=None):
+    """
+    One bulk aggregation: hourly series -> daily rows in the resources_ai.csv layout
+    (beds, icu, er_visits, occupancy_rate). Other columns are not derivable from beds.
+    """
+    match = {}
+    if start or end:
+        match["hour"] = {k: v for k, v in (("$gte", start), ("$lt", end)) if v}
+    rows = await mongo_db.bed_occupancy_hourly.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$hour"}},
+            "beds": {"$max": "$occupied"},
+            "icu": {"$max": {"$ifNull": ["$by_type.ICU.occupied", 0]}},
+            "er_visits": {"$sum": {"$ifNull": ["$by_type.Emergency.allocations", 0]}},
+            "occupied_avg": {"$avg": "$occupied"},
+            "capacity": {"$max": "$capacity"}
+        }},
+        {"$sort": {"_id": 1}}
+    ], allowDiskUse=True).to_list(None)
+
+    df = pd.DataFrame(rows).rename(columns={"_id": "date"})
+    if df.empty:
+        return pd.DataFrame(columns=["date", "beds", "icu", "er_visits", "occupancy_rate"])
+    df["beds"] = np.ceil(df["beds"]).astype(int)
+    df["icu"] = np.ceil(df["icu"]).astype(int)
+    df["er_visits"] = df["er_visits"].astype(int)
+    df["occupancy_rate"] = (df["occupied_avg"] / df["capacity"].where(df["capacity"] > 0)).round(2)
+    return df[["date", "beds", "icu", "er_visits", "occupancy_rate"]]
+
+async def run():
+    """Background loop started at application startup."""
+    while True:
+        try:
+            await extend_series()
+        except Exception as e:
+            print(f"⚠️ Bed occupancy series update failed: {e}")
+        await asyncio.sleep(OCCUPANCY_INTERVAL_SECONDS)
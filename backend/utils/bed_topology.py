@@ -0,0 +1,175 @@
+"""
+Hospital topology and free-bed search index.
+
+Beds sit in building -> floor -> ward -> room and carry capability tags
+(isolation, oxygen, ventilator, ...). Wards are documents in `wards`:
+
+    {"name": "Floor 3 - ICU", "building": "Main", "floor": 3, "position": 2}
+
+`position` orders wards along a floor. Ward distance is the position gap on
+the same floor, FLOOR_DISTANCE per floor apart and BUILDING_DISTANCE across
+buildings.
+
+Free beds are indexed in memory per ward by capability bitset (bed type
+and tags are bits). A search for a required mask visits wards nearest
+first and, in each, only the few distinct bitsets that contain the mask,
+so its cost is O(matching beds). The index is loaded at startup and
+updated on every allocation and release.
+"""
+from database.database import mongo_db
+from utils.bed_events import UNASSIGNED_WARD
+
+FLOOR_DISTANCE = 10
+BUILDING_DISTANCE = 100
+DEFAULT_BUILDING = "Main"
+
+# Known tags; tags first seen on an indexed bed get the next free bit (searches never add bits)
+CAPABILITIES = ["isolation", "negative_pressure", "oxygen", "ventilator", "telemetry", "dialysis", "bariatric", "pediatric"]
+BED_TYPES = ["General", "ICU", "Private", "Emergency"]
+
+def ward_of(bed):
+    return bed.get("ward") or UNASSIGNED_WARD
+
+class BedIndex:
+    def __init__(self):
+        self._bits = {}
+        for tag in [f"type:{t}" for t in BED_TYPES] + CAPABILITIES:
+            self._bit(tag)
+        self.wards = {}       # ward name -> ward doc
+        self.free = {}        # ward name -> {bitset -> {bed id -> bed}}
+        self._location = {}   # free bed id -> (ward, bitset)
+
+    def _bit(self, tag):
+        if tag not in self._bits:
+            self._bits[tag] = 1 << len(self._bits)
+        return self._bits[tag]
+
+    def mask(self, bed_type=None, capabilities=()):
+        """Bitset for a bed's type and tags; unseen tags get a new bit."""
+        m = self._bit(f"type:{bed_type}") if bed_type else 0
+        for tag in capabilities:
+            m |= self._bit(tag.strip().lower())
+        return m
+
+    def required_mask(self, bed_type=None, capabilities=()):
+        """Bitset for a search without allocating bits; None if a tag is unknown (no bed can match)."""
+        tags = ([f"type:{bed_type}"] if bed_type else []) + [t.strip().lower() for t in capabilities]
+        if any(t not in self._bits for t in tags):
+            return None
+        m = 0
+        for t in tags:
+            m |= self._bits[t]
+        return m
+
+    def bed_mask(self, bed):
+        return self.mask(bed.get("type", "General"), bed.get("capabilities") or ())
+
+    # --- Updates ---
+
+    def bed_freed(self, bed):
+        bed_id = str(bed["_id"])
+        self.bed_taken(bed_id)
+        ward, bits = ward_of(bed), self.bed_mask(bed)
+        self.free.setdefault(ward, {}).setdefault(bits, {})[bed_id] = {
+            "_id": bed_id,
+            "bed_number": bed.get("bed_number"),
+            "type": bed.get("type", "General"),
+            "room": bed.get("room"),
+            "capabilities": list(bed.get("capabilities") or [])
+        }
+        self._location[bed_id] = (ward, bits)
+
+    def bed_taken(self, bed_id):
+        location = self._location.pop(bed_id, None)
+        if location is None:
+            return
+        ward, bits = location
+        group = self.free[ward][bits]
+        del group[bed_id]
+        if not group:
+            del self.free[ward][bits]
+
+    def beds_taken(self, bed_ids):
+        for bed_id in bed_ids:
+            self.bed_taken(bed_id)
+
+    def set_ward(self, ward):
+        self.wards[ward["name"]] = ward
+
+    # --- Search ---
+
+    def distance(self, a, b):
+        if a == b:
+            return 0
+        wa, wb = self.wards.get(a), self.wards.get(b)
+        if not wa or not wb:
+            # Wards without topology sort after every located ward
+            return BUILDING_DISTANCE * 10
+        if (wa.get("building") or DEFAULT_BUILDING) != (wb.get("building") or DEFAULT_BUILDING):
+            return BUILDING_DISTANCE + abs((wa.get("floor") or 0) - (wb.get("floor") or 0)) * FLOOR_DISTANCE
+        floors = abs((wa.get("floor") or 0) - (wb.get("floor") or 0))
+        return floors * FLOOR_DISTANCE + abs((wa.get("position") or 0) - (wb.get("position") or 0))
+
+    def search(self, near=None, bed_type=None, capabilities=(), limit=10):
+        """Free beds having every required capability, nearest ward first."""
+        required = self.required_mask(bed_type, capabilities)
+        if required is None:
+            return []
+        wards = [w for w in self.free if self.free[w]]
+        if near:
+            wards.sort(key=lambda w: (self.distance(near, w), w))
+        else:
+            wards.sort()
+
+        results = []
+        for ward in wards:
+            for bits, beds in self.free[ward].items():
+                if bits & required != required:
+                    continue
+                distance = self.distance(near, ward) if near else None
+                for bed in beds.values():
+                    results.append({**bed, "ward": ward, "distance": distance})
+                    if len(results) >= limit:
+                        return results
+        return results
+
+    def free_count(self, ward=None):
+        wards = [ward] if ward else list(self.free)
+        return sum(len(beds) for w in wards for beds in self.free.get(w, {}).values())
+
+    async def load(self):
+        """Rebuild from MongoDB (application startup)."""
+        self.wards, self.free, self._location = {}, {}, {}
+        async for ward in mongo_db.wards.find({}, {"_id": 0}):
+            self.set_ward(ward)
+        async for bed in mongo_db.beds.find(
+            {"status": "Available"}, {"bed_number": 1, "type": 1, "ward": 1, "room": 1, "capabilities": 1}
+        ):
+            self.bed_freed(bed)
+        print(f"🗺️ Bed index loaded: {len(self.wards)} wards, {self.free_count()} free beds")
+
+bed_index = BedIndex()
+
+async def topology():
+    """building -> floor -> ward -> room -> beds, with free counts per ward."""
+    wards = {w["name"]: w async for w in mongo_db.wards.find({}, {"_id": 0})}
+    tree = {}
+    async for bed in mongo_db.beds.find(
+        {}, {"bed_number": 1, "type": 1, "status": 1, "ward": 1, "floor": 1, "building": 1, "room": 1, "capabilities": 1}
+    ):
+        ward = ward_of(bed)
+        info = wards.get(ward, {})
+        building = bed.get("building") or info.get("building") or DEFAULT_BUILDING
+        floor = bed.get("floor") if bed.get("floor") is not None else info.get("floor")
+        node = tree.setdefault(building, {}).setdefault(str(floor), {}).setdefault(
+            ward, {"position": info.get("position"), "free": 0, "rooms": {}}
+        )
+        node["free"] += bed.get("status") == "Available"
+        node["rooms"].setdefault(bed.get("room") or "-", []).append({
+            "_id": str(bed["_id"]),
+            "bed_number": bed.get("bed_number"),
+            "type": bed.get("type"),
+            "status": bed.get("status"),
+            "capabilities": bed.get("capabilities") or []
+        })
+    return tree
@@ -0,0 +1,263 @@
+"""
+Bed utilization analytics derived from the bed event log.
+
+Occupancy intervals are rebuilt from `bed_events` (allocated -> released
+per bed) with NumPy. Per (ward, bed type) we compute occupied hours, idle
+hours, turnover and peak concurrent occupancy (a +1/-1 sweep over sorted
+interval boundaries). Completed days are summarized once into
+`bed_utilization_daily` by a background job, so a 30/90-day query reads
+one small document per day and group and only today is computed live.
+
+A window only reads its own events. The beds occupied when it opens come
+from the previous window's closing state (saved with the job checkpoint)
+or, for the live window ending now, from the current bed documents rewound
+through the window's events; the full log is scanned only to bootstrap.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+from pymongo import UpdateOne
+
+from database.database import mongo_db
+from utils.bed_events import ALLOCATED, UNASSIGNED_WARD
+
+JOB_NAME = "bed_utilization"
+UTILIZATION_INTERVAL_SECONDS = int(os.getenv("UTILIZATION_INTERVAL_SECONDS", "3600"))
+
+def _day(ts):
+    return datetime(ts.year, ts.month, ts.day)
+
+async def _bed_groups():
+    """bed_id -> (ward, bed type) for the current bed inventory."""
+    return {
+        str(b["_id"]): (b.get("ward") or UNASSIGNED_WARD, b.get("type", "General"))
+        async for b in mongo_db.beds.find({}, {"ward": 1, "type": 1})
+    }
+
+async def opening_from_log(start):
+    """bed_id -> {ward, bed_type} for beds occupied at `start`, from the whole log (bootstrap only)."""
+    opening = await mongo_db.bed_events.aggregate([
+        {"$match": {"at": {"$lt": start}}},
+        {"$sort": {"bed_id": 1, "at": -1}},
+        {"$group": {"_id": "$bed_id", "event": {"$first": "$event"}, "ward": {"$first": "$ward"}, "bed_type": {"$first": "$bed_type"}}},
+        {"$match": {"event": ALLOCATED}}
+    ], allowDiskUse=True).to_list(None)
+    return {o["_id"]: {"ward": o.get("ward"), "bed_type": o.get("bed_type")} for o in opening}
+
+async def _opening_from_beds(start, events):
+    """Beds occupied at `start`, from the current bed state rewound through `events` (every event since start)."""
+    first = {}
+    for e in sorted(events, key=lambda e: e["at"]):
+        first.setdefault(e["bed_id"], e)
+    opening = {}
+    async for b in mongo_db.beds.find({"status": "Occupied", "allocated_at": {"$lt": start}}, {"ward": 1, "type": 1}):
+        if str(b["_id"]) not in first:
+            opening[str(b["_id"])] = {"ward": b.get("ward") or UNASSIGNED_WARD, "bed_type": b.get("type", "General")}
+    for bed_id, e in first.items():
+        # A bed whose first event in the window is a release was occupied when it opened
+        if e["event"] != ALLOCATED:
+            opening[bed_id] = {"ward": e.get("ward"), "bed_type": e.get("bed_type")}
+    return opening
+
+async def _window_events(start, end, opening=None):
+    """
+    Events inside [start, end) plus one synthetic 'allocated' at start per bed in `opening`.
+    Without `opening` it is derived from the current bed state, which is only exact when `end` is now.
+    """
+    events = await mongo_db.bed_events.find(
+        {"at": {"$gte": start, "$lt": end}},
+        {"_id": 0, "bed_id": 1, "event": 1, "at": 1, "ward": 1, "bed_type": 1}
+    ).to_list(None)
+    if opening is None:
+        opening = await _opening_from_beds(start, events)
+    return [
+        {"bed_id": bed_id, "event": ALLOCATED, "at": start, "ward": o.get("ward"), "bed_type": o.get("bed_type"), "opening": True}
+        for bed_id, o in opening.items()
+    ] + events
+
+def closing_state(events):
+    """bed_id -> {ward, bed_type} for beds still occupied after `events` (openings first)."""
+    closing = {}
+    for e in sorted(events, key=lambda e: e["at"]):
+        if e["event"] == ALLOCATED:
+            closing[e["bed_id"]] = {"ward": e.get("ward"), "bed_type": e.get("bed_type")}
+        else:
+            closing.pop(e["bed_id"], None)
+    return closing
+
+def occupancy_intervals(bed_codes, hours, is_alloc, horizon):
+    """
+    Pair each allocation with the next event on the same bed.
+    Inputs are per-event arrays; returns (bed code, start hour, end hour) arrays.
+    An allocation with no later event stays open until `horizon`.
+    """
+    if len(bed_codes) == 0:
+        return np.empty(0, dtype=int), np.empty(0), np.empty(0)
+    order = np.lexsort((hours, bed_codes))
+    bed, t, alloc = bed_codes[order], hours[order], is_alloc[order]
+
+    same_bed_next = np.zeros(len(bed), dtype=bool)
+    same_bed_next[:-1] = bed[1:] == bed[:-1]
+    next_t = np.append(t[1:], horizon)
+    end = np.where(same_bed_next, next_t, horizon)
+
+    # Releases without an allocation in the window (and vice versa) are skipped
+    return bed[alloc], t[alloc], np.clip(end[alloc], 0, horizon)
+
+def peak_concurrency(starts, ends):
+    if len(starts) == 0:
+        return 0
+    times = np.concatenate([starts, ends])
+    deltas = np.concatenate([np.ones(len(starts)), -np.ones(len(ends))])
+    # Releases sort before allocations at the same instant
+    order = np.lexsort((deltas, times))
+    return int(np.cumsum(deltas[order]).max())
+
+async def window_intervals(start, end, opening=None):
+    """
+    Occupancy intervals for [start, end) as arrays, in hours since `start`.
+    Returns a dict with the bed -> (ward, bed type) mapping, per-event arrays,
+    the (bed, start, end) interval arrays and the closing state, which is the
+    `opening` of the next window.
+    """
+    horizon = (end - start).total_seconds() / 3600
+    groups = await _bed_groups()
+    events = await _window_events(start, end, opening)
+
+    ids = sorted({e["bed_id"] for e in events} | set(groups))
+    code = {bed_id: i for i, bed_id in enumerate(ids)}
+    group_of = [groups.get(bed_id) for bed_id in ids]
+    for e in events:
+        # Beds deleted since keep the group recorded on their events
+        if group_of[code[e["bed_id"]]] is None:
+            group_of[code[e["bed_id"]]] = (e.get("ward") or UNASSIGNED_WARD, e.get("bed_type") or "General")
+
+    bed_codes = np.array([code[e["bed_id"]] for e in events], dtype=int)
+    hours = np.array([(e["at"] - start).total_seconds() / 3600 for e in events], dtype=float)
+    is_alloc = np.array([e["event"] == ALLOCATED for e in events], dtype=bool)
+    real = np.array([not e.get("opening") for e in events], dtype=bool)   # exclude synthetic openings
+    bed, s, t_end = occupancy_intervals(bed_codes, hours, is_alloc, horizon)
+    return {
+        "horizon": horizon,
+        "group_of": group_of,
+        "inventory": np.array([code[b] for b in groups], dtype=int),
+        "bed_codes": bed_codes,
+        "hours": hours,
+        "is_alloc": is_alloc,
+        "real": real,
+        "intervals": (bed, s, t_end),
+        "closing": closing_state(events)
+    }
+
+async def summarize_window(start, end, opening=None):
+    """Per (ward, bed type) utilization for [start, end)."""
+    return summarize_intervals(await window_intervals(start, end, opening))
+
+def summarize_intervals(w):
+    horizon, group_of = w["horizon"], w["group_of"]
+    bed_codes, is_alloc, real = w["bed_codes"], w["is_alloc"], w["real"]
+    bed, s, t_end = w["intervals"]
+
+    labels = sorted(set(group_of))
+    label_index = {g: i for i, g in enumerate(labels)}
+    bed_group = np.array([label_index[g] for g in group_of], dtype=int)
+
+    occupied = np.bincount(bed_group[bed], weights=t_end - s, minlength=len(labels))
+    beds = np.bincount(bed_group[w["inventory"]], minlength=len(labels))
+    allocations = np.bincount(bed_group[bed_codes[is_alloc & real]], minlength=len(labels))
+    releases = np.bincount(bed_group[bed_codes[~is_alloc & real]], minlength=len(labels))
+
+    summary = []
+    for i, (ward, bed_type) in enumerate(labels):
+        in_group = bed_group[bed] == i
+        summary.append({
+            "ward": ward,
+            "bed_type": bed_type,
+            "beds": int(beds[i]),
+            "hours": horizon,
+            "occupied_hours": round(float(occupied[i]), 3),
+            "allocations": int(allocations[i]),
+            "releases": int(releases[i]),
+            "peak_occupied": peak_concurrency(s[in_group], t_end[in_group])
+        })
+    return summary
+
+async def summarize_completed_days(now=None):
+    """Summarize every fully elapsed day after the last summarized one."""
+    today = _day(now or datetime.utcnow())
+    checkpoint = await mongo_db.job_checkpoints.find_one({"job": JOB_NAME})
+    if checkpoint and checkpoint.get("last_day"):
+        day = checkpoint["last_day"] + timedelta(days=1)
+        opening = checkpoint.get("open_beds")
+    else:
+        first = await mongo_db.bed_events.find_one({}, sort=[("at", 1)])
+        if not first:
+            return 0
+        day = _day(first["at"])
+        opening = {}
+
+    summarized = 0
+    while day < today:
+        if opening is None:
+            # Checkpoint written before closing states were saved
+            opening = await opening_from_log(day)
+        w = await window_intervals(day, day + timedelta(days=1), opening)
+        rows = summarize_intervals(w)
+        if rows:
+            await mongo_db.bed_utilization_daily.bulk_write([
+                UpdateOne({"day": day, "ward": r["ward"], "bed_type": r["bed_type"]}, {"$set": {"day": day, **r}}, upsert=True)
+                for r in rows
+            ], ordered=False)
+        await mongo_db.job_checkpoints.update_one(
+            {"job": JOB_NAME},
+            {"$set": {"last_day": day, "open_beds": w["closing"], "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+        opening = w["closing"]
+        day += timedelta(days=1)
+        summarized += 1
+    return summarized
+
+def _rollup(rows, key):
+    out = {}
+    for r in rows:
+        g = out.setdefault(r[key], {"bed_hours": 0.0, "occupied_hours": 0.0, "allocations": 0, "releases": 0, "peak_occupied": 0, "beds_by_day": {}})
+        g["bed_hours"] += r["beds"] * r["hours"]
+        g["occupied_hours"] += r["occupied_hours"]
+        g["allocations"] += r["allocations"]
+        g["releases"] += r["releases"]
+        g["peak_occupied"] = max(g["peak_occupied"], r["peak_occupied"])
+        g["beds_by_day"][r["day"]] = g["beds_by_day"].get(r["day"], 0) + r["beds"]
+    for g in out.values():
+        g["beds"] = max(g.pop("beds_by_day").values())
+        g["utilization"] = round(g["occupied_hours"] / g["bed_hours"], 4) if g["bed_hours"] else None
+        g["idle_hours"] = round(max(g["bed_hours"] - g["occupied_hours"], 0), 1)
+        g["turnover_per_bed"] = round(g["releases"] / g["beds"], 2) if g["beds"] else None
+        g["occupied_hours"] = round(g["occupied_hours"], 1)
+        g["bed_hours"] = round(g["bed_hours"], 1)
+    return out
+
+async def utilization(days, now=None):
+    """Utilization over the last `days` days: stored daily summaries + today computed live."""
+    now = now or datetime.utcnow()
+    today = _day(now)
+    rows = await mongo_db.bed_utilization_daily.find(
+        {"day": {"$gte": today - timedelta(days=days - 1), "$lt": today}}, {"_id": 0}
+    ).to_list(None)
+    rows += [{"day": today, **r} for r in await summarize_window(today, now)]
+
+    by_ward = _rollup(rows, "ward")
+    by_type = _rollup(rows, "bed_type")
+    total = _rollup([{**r, "all": "all"} for r in rows], "all").get("all", {})
+    return {"by_ward": by_ward, "by_bed_type": by_type, "total": total}
+
+async def run():
+    """Background loop started at application startup."""
+    while True:
+        try:
+            await summarize_completed_days()
+        except Exception as e:
+            print(f"⚠️ Bed utilization summary failed: {e}")
+        await asyncio.sleep(UTILIZATION_INTERVAL_SECONDS)
@@ -0,0 +1,202 @@
+"""
+Cohort comparison: risk, 30-day readmission and length-of-stay outcomes.
+
+Only the columns a metric needs are pulled, joined server-side from the
+materialized membership in cohort_members, and turned into NumPy arrays.
+Kaplan-Meier curves, summaries and the log-rank test are fully vectorized.
+"""
+from datetime import datetime
+
+import numpy as np
+
+from database.database import mongo_db
+
+COMPARE_METRICS = ('risk', 'readmission', 'los')
+READMISSION_WINDOW_DAYS = 30
+
+# --- Data ---
+
+async def _joined(cohort_id, collection, fields, extra_stages=()):
+    """cohort_members ⋈ collection on patient_id, projected to `fields`."""
+    return await mongo_db.cohort_members.aggregate([
+        {"$match": {"cohort_id": cohort_id}},
+        {"$lookup": {"from": collection, "localField": "patient_id", "foreignField": "patient_id", "as": "j"}},
+        {"$unwind": "$j"},
+        *extra_stages,
+        {"$project": {"_id": 0, "patient_id": 1, **{f: f"$j.{f}" for f in fields}}}
+    ]).to_list(None)
+
+def _days(later, earlier):
+    return (later - earlier) / np.timedelta64(1, 'D')
+
+def _datetimes(rows, field):
+    return np.array([r.get(field) or np.datetime64('NaT') for r in rows], dtype='datetime64[s]')
+
+async def readmission_durations(cohort_id, now):
+    """
+    Days from each discharge to the patient's next admission.
+    Event = readmitted; the latest stay is censored at `now`.
+    """
+    rows = await _joined(cohort_id, "admissions", ["admitted_at", "discharged_at"])
+    if not rows:
+        return np.empty(0), np.empty(0, dtype=bool)
+    patients = np.array([r["patient_id"] for r in rows])
+    admitted = _datetimes(rows, "admitted_at")
+    discharged = _datetimes(rows, "discharged_at")
+
+    order = np.lexsort((admitted, patients))
+    patients, admitted, discharged = patients[order], admitted[order], discharged[order]
+
+    readmitted = np.zeros(len(rows), dtype=bool)
+    readmitted[:-1] = patients[1:] == patients[:-1]
+    next_admitted = np.empty_like(admitted)
+    next_admitted[:-1] = admitted[1:]
+    next_admitted[-1] = np.datetime64('NaT')
+
+    end = np.where(readmitted, next_admitted, np.datetime64(now, 's'))
+    durations = np.clip(_days(end, discharged), 0, None)
+    valid = ~np.isnan(durations)
+    return durations[valid], readmitted[valid]
+
+async def los_durations(cohort_id, now):
+    """Completed stays are events; patients still in a bed are censored at `now`."""
+    stays = await _joined(cohort_id, "admissions", ["los_days"])
+    current = await _joined(
+        cohort_id, "beds", ["allocated_at"],
+        extra_stages=[{"$match": {"j.status": "Occupied"}}]
+    )
+    completed = np.array([r.get("los_days") for r in stays if r.get("los_days") is not None], dtype=float)
+    ongoing = _days(np.datetime64(now, 's'), _datetimes(current, "allocated_at")) if current else np.empty(0)
+    ongoing = ongoing[~np.isnan(ongoing)]
+    durations = np.concatenate([completed, ongoing])
+    events = np.concatenate([np.ones(len(completed), dtype=bool), np.zeros(len(ongoing), dtype=bool)])
+    return durations, events
+
+async def risk_columns(cohort_id):
+    rows = await _joined(cohort_id, "patient_features", ["heart_probability", "diabetes_probability", "risk_level"])
+    heart = np.array([r.get("heart_probability") for r in rows], dtype=float)
+    diabetes = np.array([r.get("diabetes_probability") for r in rows], dtype=float)
+    levels = np.array([r.get("risk_level") or "Unknown" for r in rows])
+    return heart, diabetes, levels
+
+# --- Statistics ---
+
+def kaplan_meier(durations, events):
+    """Product-limit estimator. Returns (event times, survival, at-risk counts)."""
+    if len(durations) == 0:
+        return np.empty(0), np.empty(0), np.empty(0, dtype=int)
+    order = np.argsort(durations, kind='stable')
+    t, e = durations[order], events[order].astype(int)
+    times, first, counts = np.unique(t, return_index=True, return_counts=True)
+    deaths = np.add.reduceat(e, first)
+    at_risk = len(t) - np.concatenate([[0], np.cumsum(counts)[:-1]])
+    survival = np.cumprod(1.0 - deaths / at_risk)
+    keep = deaths > 0
+    return times[keep], survival[keep], at_risk[keep]
+
+def survival_at(times, survival, t):
+    idx = np.searchsorted(times, t, side='right') - 1
+    return float(survival[idx]) if idx >= 0 else 1.0
+
+def median_survival(times, survival):
+    below = np.nonzero(survival <= 0.5)[0]
+    return float(times[below[0]]) if len(below) else None
+
+def logrank(groups):
+    """k-sample log-rank test over [(durations, events), ...]. Returns (chi2, p-value)."""
+    from scipy.stats import chi2
+
+    groups = [(d, e) for d, e in groups if len(d)]
+    if len(groups) < 2:
+        return None, None
+    times = np.unique(np.concatenate([d[e.astype(bool)] for d, e in groups]))
+    if len(times) == 0:
+        return None, None
+
+    # (k groups x event times) matrices of at-risk counts and events
+    n = np.vstack([len(d) - np.searchsorted(np.sort(d), times, side='left') for d, _ in groups]).astype(float)
+    o = np.vstack([
+        np.bincount(np.searchsorted(times, d[e.astype(bool)]), minlength=len(times))
+        for d, e in groups
+    ]).astype(float)
+    n_tot, o_tot = n.sum(axis=0), o.sum(axis=0)
+    valid = n_tot > 1
+    n, o, n_tot, o_tot = n[:, valid], o[:, valid], n_tot[valid], o_tot[valid]
+
+    expected = (n * o_tot / n_tot).sum(axis=1)
+    diff = o.sum(axis=1) - expected
+    weight = o_tot * (n_tot - o_tot) / (n_tot - 1) / n_tot
+    p = n / n_tot
+    V = np.einsum('t,it,jt->ij', weight * n_tot, p, -p)
+    V[np.diag_indices_from(V)] = (weight * n_tot * p * (1 - p)).sum(axis=1)
+
+    # One group is redundant; drop it and invert
+    statistic = float(diff[:-1] @ np.linalg.pinv(V[:-1, :-1]) @ diff[:-1])
+    return statistic, float(chi2.sf(statistic, len(groups) - 1))
+
+def describe(values):
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return {"n": 0, "mean": None, "median": None, "p25": None, "p75": None}
+    p25, median, p75 = np.percentile(values, [25, 50, 75])
+    return {
+        "n": int(len(values)),
+        "mean": round(float(values.mean()), 4),
+        "median": round(float(median), 4),
+        "p25": round(float(p25), 4),
+        "p75": round(float(p75), 4)
+    }
+
+def curve(durations, events, horizon_days):
+    times, survival, at_risk = kaplan_meier(durations, events)
+    within = times <= horizon_days
+    return [
+        {"day": round(float(t), 2), "survival": round(float(s), 4), "at_risk": int(n)}
+        for t, s, n in zip(times[within], survival[within], at_risk[within])
+    ]
+
+# --- Comparison ---
+
+async def compare(cohorts, metric, horizon_days):
+    """cohorts: [(cohort_id, name)] -> comparison report for `metric`."""
+    now = datetime.utcnow()
+    report = {"metric": metric, "cohorts": []}
+
+    if metric == 'risk':
+        for cohort_id, name in cohorts:
+            heart, diabetes, levels = await risk_columns(cohort_id)
+            names, counts = np.unique(levels, return_counts=True)
+            report["cohorts"].append({
+                "cohort_id": cohort_id,
+                "name": name,
+                "n": int(len(levels)),
+                "heart_probability": describe(heart),
+                "diabetes_probability": describe(diabetes),
+                "risk_distribution": {str(k): int(v) for k, v in zip(names, counts)}
+            })
+        return report
+
+    loader = readmission_durations if metric == 'readmission' else los_durations
+    samples = []
+    for cohort_id, name in cohorts:
+        durations, events = await loader(cohort_id, now)
+        samples.append((durations, events))
+        times, survival, _ = kaplan_meier(durations, events)
+        entry = {
+            "cohort_id": cohort_id,
+            "name": name,
+            "n": int(len(durations)),
+            "events": int(events.sum()),
+            "censored": int(len(events) - events.sum()),
+            "median_days": median_survival(times, survival),
+            "curve": curve(durations, events, horizon_days)
+        }
+        if metric == 'readmission':
+            entry[f"readmission_rate_{READMISSION_WINDOW_DAYS}d"] = round(1 - survival_at(times, survival, READMISSION_WINDOW_DAYS), 4)
+        else:
+            entry["completed_stay_days"] = describe(durations[events])
+        report["cohorts"].append(entry)
+
+    statistic, p_value = logrank(samples)
+    report["logrank"] = {"chi2": statistic, "p_value": p_value}
+    return report
@@ -0,0 +1,236 @@
+"""
+Server-side cohort engine.
+
+Cohort filters are compiled into a `$match` over the flat facts stored on
+`patient_features` (age, gender, conditions, risk_level, heart/diabetes
+probability), all of which are indexed. Membership is materialized in
+`cohort_members` when a cohort is created (a single `$merge` pipeline) and
+then kept current incrementally: whenever a patient's facts change, only
+that patient is re-evaluated against every cohort, using cohort filters
+cached in memory. Each membership change bumps the cohort's `version`.
+Stats are one `$facet` aggregation over the materialized members.
+"""
+import os
+from collections import Counter
+from datetime import datetime
+
+from pymongo import UpdateOne, DeleteOne
+
+from database.database import mongo_db
+
+COHORT_FILTERS = (
+    'age_min', 'age_max', 'gender', 'risk_level', 'conditions',
+    'heart_probability_min', 'diabetes_probability_min'
+)
+
+# model -> (fact field on patient_features, prediction doc field)
+RISK_FACTS = {
+    'heart': ('heart_probability', 'probability'),
+    'diabetes': ('diabetes_probability', 'probability'),
+    'cluster': ('risk_level', 'risk_level'),
+}
+
+# Cohorts created or deleted by other processes are picked up after this long
+COHORT_CACHE_SECONDS = int(os.getenv("COHORT_CACHE_SECONDS", "300"))
+
+_cohort_cache = {"at": None, "cohorts": []}
+
+FACT_PROJECTION = {
+    "_id": 0, "patient_id": 1, "age": 1, "gender": 1, "conditions": 1,
+    "risk_level": 1, "heart_probability": 1, "diabetes_probability": 1
+}
+
+def _as_list(value):
+    return value if isinstance(value, list) else [value]
+
+def validate_filters(filters):
+    unknown = set(filters) - set(COHORT_FILTERS)
+    if unknown:
+        raise ValueError(f"Unsupported cohort filters: {sorted(unknown)}. Options: {list(COHORT_FILTERS)}")
+
+def compile_match(filters):
+    """Translate cohort filters into a $match on patient_features."""
+    match = {}
+    if "age_min" in filters:
+        match.setdefault("age", {})["$gte"] = filters["age_min"]
+    if "age_max" in filters:
+        match.setdefault("age", {})["$lte"] = filters["age_max"]
+    if "gender" in filters:
+        match["gender"] = str(filters["gender"]).lower()
+    if "risk_level" in filters:
+        match["risk_level"] = {"$in": _as_list(filters["risk_level"])}
+    if filters.get("conditions"):
+        match["conditions"] = {"$all": [str(c).strip().lower() for c in _as_list(filters["conditions"])]}
+    if "heart_probability_min" in filters:
+        match["heart_probability"] = {"$gte": filters["heart_probability_min"]}
+    if "diabetes_probability_min" in filters:
+        match["diabetes_probability"] = {"$gte": filters["diabetes_probability_min"]}
+    return match
+
+def matches(filters, facts):
+    """Python twin of compile_match, used for incremental re-evaluation of single patients."""
+    def at_least(field, bound):
+        value = facts.get(field)
+        return value is not None and value >= bound
+
+    age = facts.get("age")
+    if "age_min" in filters and not at_least("age", filters["age_min"]):
+        return False
+    if "age_max" in filters and (age is None or age > filters["age_max"]):
+        return False
+    if "gender" in filters and facts.get("gender") != str(filters["gender"]).lower():
+        return False
+    if "risk_level" in filters and facts.get("risk_level") not in _as_list(filters["risk_level"]):
+        return False
+    if filters.get("conditions"):
+        wanted = {str(c).strip().lower() for c in _as_list(filters["conditions"])}
+        if not wanted <= set(facts.get("conditions") or []):
+            return False
+    if "heart_probability_min" in filters and not at_least("heart_probability", filters["heart_probability_min"]):
+        return False
+    if "diabetes_probability_min" in filters and not at_least("diabetes_probability", filters["diabetes_probability_min"]):
+        return False
+    return True
+
+# --- Membership ---
+
+def invalidate_cohorts():
+    """Drop the cached cohort filters (call after creating or deleting a cohort)."""
+    _cohort_cache["at"] = None
+
+async def _cohorts():
+    """[(cohort _id, filters)] for every cohort, cached for COHORT_CACHE_SECONDS."""
+    at = _cohort_cache["at"]
+    if at is None or (datetime.utcnow() - at).total_seconds() > COHORT_CACHE_SECONDS:
+        _cohort_cache["cohorts"] = [
+            (c["_id"], c.get("filters") or {})
+            async for c in mongo_db.cohorts.find({}, {"filters": 1})
+        ]
+        _cohort_cache["at"] = datetime.utcnow()
+    return _cohort_cache["cohorts"]
+
+async def materialize_cohort(cohort_id, filters):
+    """
+    Recompute a cohort's membership server-side and return its size. Members
+    are merged first and stamped with this run's start time; members that
+    were not stamped (no longer matching) are deleted afterwards, so readers
+    never see the cohort empty.
+    """
+    cohort_id = str(cohort_id)
+    stamp = datetime.utcnow()
+    await mongo_db.patient_features.aggregate([
+        {"$match": compile_match(filters)},
+        {"$project": {"_id": 0, "cohort_id": {"$literal": cohort_id}, "patient_id": 1, "stamped_at": {"$literal": stamp}}},
+        {"$merge": {"into": "cohort_members", "on": ["cohort_id", "patient_id"], "whenMatched": "merge"}}
+    ]).to_list(None)
+    # Members added incrementally during the run carry a later stamp and are kept
+    await mongo_db.cohort_members.delete_many({
+        "cohort_id": cohort_id,
+        "$or": [{"stamped_at": {"$lt": stamp}}, {"stamped_at": {"$exists": False}}]
+    })
+    count = await mongo_db.cohort_members.count_documents({"cohort_id": cohort_id})
+
+    from bson import ObjectId
+    await mongo_db.cohorts.update_one(
+        {"_id": ObjectId(cohort_id)},
+        {"$set": {"patient_count": count, "refreshed_at": datetime.utcnow()}, "$inc": {"version": 1}}
+    )
+    return count
+
+async def refresh_patients(patient_ids):
+    """Re-evaluate cohort membership for patients whose facts changed."""
+    patient_ids = list(set(patient_ids))
+    cohorts = await _cohorts()
+    if not cohorts or not patient_ids:
+        return
+
+    facts = {
+        d["patient_id"]: d
+        async for d in mongo_db.patient_features.find({"patient_id": {"$in": patient_ids}}, FACT_PROJECTION)
+    }
+    current = {
+        (m["cohort_id"], m["patient_id"])
+        async for m in mongo_db.cohort_members.find({"patient_id": {"$in": patient_ids}}, {"cohort_id": 1, "patient_id": 1})
+    }
+
+    ops, deltas = [], Counter()
+    now = datetime.utcnow()
+    for cohort_oid, filters in cohorts:
+        cohort_id = str(cohort_oid)
+        for pid in patient_ids:
+            want = pid in facts and matches(filters, facts[pid])
+            have = (cohort_id, pid) in current
+            if want and not have:
+                ops.append(UpdateOne(
+                    {"cohort_id": cohort_id, "patient_id": pid},
+                    {"$set": {"stamped_at": now}, "$setOnInsert": {"cohort_id": cohort_id, "patient_id": pid}},
+                    upsert=True
+                ))
+                deltas[cohort_oid] += 1
+            elif have and not want:
+                ops.append(DeleteOne({"cohort_id": cohort_id, "patient_id": pid}))
+                deltas[cohort_oid] -= 1
+
+    if ops:
+        await mongo_db.cohort_members.bulk_write(ops, ordered=False)
+    for cohort_oid, delta in deltas.items():
+        await mongo_db.cohorts.update_one(
+            {"_id": cohort_oid},
+            {"$inc": {"patient_count": delta, "version": 1}, "$set": {"refreshed_at": now}}
+        )
+
+async def record_risk_facts(model, docs):
+    """Copy the latest risk outputs onto patient_features and refresh those patients' cohorts."""
+    field, source = RISK_FACTS[model]
+    latest = {doc["patient_id"]: doc.get(source) for doc in docs}
+    if not latest:
+        return
+    # Only patients with a materialized profile take part in cohorts
+    await mongo_db.patient_features.bulk_write([
+        UpdateOne({"patient_id": pid}, {"$set": {field: value}})
+        for pid, value in latest.items()
+    ], ordered=False)
+    await refresh_patients(list(latest))
+
+# --- Stats ---
+
+async def cohort_stats(cohort_id, top_conditions=10):
+    """Cohort statistics: the materialized members joined to their facts, then a single $facet."""
+    rows = await mongo_db.cohort_members.aggregate([
+        {"$match": {"cohort_id": str(cohort_id)}},
+        {"$lookup": {"from": "patient_features", "localField": "patient_id", "foreignField": "patient_id", "as": "f"}},
+        {"$unwind": "$f"},
+        {"$replaceRoot": {"newRoot": "$f"}},
+        {"$facet": {
+            "summary": [{"$group": {
+                "_id": None,
+                "total": {"$sum": 1},
+                "avg_age": {"$avg": "$age"},
+                "avg_heart_probability": {"$avg": "$heart_probability"},
+                "avg_diabetes_probability": {"$avg": "$diabetes_probability"}
+            }}],
+            "risk": [{"$group": {"_id": {"$ifNull": ["$risk_level", "Unknown"]}, "count": {"$sum": 1}}}],
+            "gender": [{"$group": {"_id": {"$ifNull": ["$gender", "unknown"]}, "count": {"$sum": 1}}}],
+            "conditions": [
+                {"$unwind": "$conditions"},
+                {"$sortByCount": "$conditions"},
+                {"$limit": top_conditions}
+            ]
+        }}
+    ]).to_list(1)
+
+    facet = rows[0] if rows else {}
+    summary = (facet.get("summary") or [{}])[0]
+
+    def rounded(value, digits):
+        return round(value, digits) if value is not None else None
+
+    return {
+        "total_patients": summary.get("total", 0),
+        "avg_age": rounded(summary.get("avg_age"), 1) or 0,
+        "avg_heart_probability": rounded(summary.get("avg_heart_probability"), 3),
+        "avg_diabetes_probability": rounded(summary.get("avg_diabetes_probability"), 3),
+        "risk_distribution": {r["_id"]: r["count"] for r in facet.get("risk", [])},
+        "gender_distribution": {r["_id"]: r["count"] for r in facet.get("gender", [])},
+        "common_conditions": [{"condition": c["_id"], "count": c["count"]} for c in facet.get("conditions", [])]
+    }
@@ -0,0 +1,178 @@
+"""
+Cost-per-bill analytics with mergeable quantile sketches.
+
+For every (day, department, category) there is one document in
+`cost_sketches`. Category "total" holds bill amounts; the other categories
+hold line-item costs. Every statistic is per bill (a stay can produce
+several bills), not per patient. Recording a bill is an atomic `$inc` of count/sum plus
+a `$push` of the raw value onto `pending`. A background compactor folds the
+pending values into the document's t-digest. Period queries merge one
+digest per day instead of sorting every bill; pending values are folded in
+on read, so answers never lag the compactor.
+"""
+import asyncio
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from database.database import mongo_db
+from utils.quantile_sketch import TDigest
+
+TOTAL = "total"
+ITEM_CATEGORIES = ("consultations", "procedures", "medications", "room", "other")
+UNASSIGNED_DEPARTMENT = "unassigned"
+COMPACT_INTERVAL_SECONDS = int(os.getenv("COST_SKETCH_COMPACT_SECONDS", "300"))
+
+# Keyword -> category for items without an explicit category
+CATEGORY_KEYWORDS = [
+    ("room", ("hospital stay", "bed", "room", "ward")),
+    ("consultations", ("consult", "visit", "appointment", "checkup", "check-up")),
+    ("medications", ("medicine", "medication", "drug", "tablet", "pharmacy", "injection")),
+    ("procedures", ("procedure", "surgery", "scan", "x-ray", "xray", "mri", "ct", "test", "lab")),
+]
+
+def _day(ts):
+    return datetime(ts.year, ts.month, ts.day)
+
+def categorize(item):
+    if item.get("category") in ITEM_CATEGORIES:
+        return item["category"]
+    text = (item.get("description") or "").lower()
+    for category, keywords in CATEGORY_KEYWORDS:
+        if any(k in text for k in keywords):
+            return category
+    return "other"
+
+def _department(bill):
+    return (bill.get("department") or UNASSIGNED_DEPARTMENT).strip().replace(".", "_") or UNASSIGNED_DEPARTMENT
+
+def bill_values(bill):
+    """(category, value) pairs contributed by one bill."""
+    values = [(TOTAL, float(bill.get("amount") or 0.0))]
+    for item in bill.get("items") or []:
+        values.append((categorize(item), float(item.get("cost") or 0.0)))
+    return values
+
+async def record_bill(bill):
+    day = _day(bill.get("date") or datetime.utcnow())
+    department = _department(bill)
+    await mongo_db.cost_sketches.bulk_write([
+        UpdateOne(
+            {"day": day, "department": department, "category": category},
+            {"$inc": {"count": 1, "sum": value}, "$push": {"pending": {"id": ObjectId(), "v": value}}},
+            upsert=True
+        )
+        for category, value in bill_values(bill)
+    ], ordered=False)
+
+async def record_bill_costs(bill):
+    """Feed the cost sketches from a billing write (never fails the billing request)."""
+    try:
+        await record_bill(bill)
+    except Exception as e:
+        print(f"⚠️ Cost sketch update failed: {e}")
+
+async def compact(doc):
+    """Fold a document's pending values into its digest (optimistic on `rev`)."""
+    pending = doc.get("pending") or []
+    if not pending:
+        return False
+    digest = TDigest.from_dict(doc.get("digest")).add_many([p["v"] for p in pending])
+    result = await mongo_db.cost_sketches.update_one(
+        {"_id": doc["_id"], "rev": doc.get("rev")},
+        {
+            "$set": {"digest": digest.to_dict(), "rev": (doc.get("rev") or 0) + 1},
+            # Values pushed after the read stay pending for the next pass
+            "$pull": {"pending": {"id": {"$in": [p["id"] for p in pending]}}}
+        }
+    )
+    return result.modified_count == 1
+
+async def compact_all():
+    compacted = 0
+    async for doc in mongo_db.cost_sketches.find({"pending.0": {"$exists": True}}):
+        compacted += await compact(doc)
+    return compacted
+
+async def rebuild_sketches():
+    """Recompute every sketch from the bills collection (backfill / repair)."""
+    values = defaultdict(list)
+    async for bill in mongo_db.bills.find({}, {"amount": 1, "items": 1, "date": 1, "department": 1}):
+        day = _day(bill.get("date") or datetime.utcnow())
+        for category, value in bill_values(bill):
+            values[(day, _department(bill), category)].append(value)
+
+    await mongo_db.cost_sketches.delete_many({})
+    docs = [
+        {
+            "day": day, "department": department, "category": category,
+            "count": len(v), "sum": float(sum(v)),
+            "digest": TDigest().add_many(v).to_dict(), "rev": 0, "pending": []
+        }
+        for (day, department, category), v in values.items()
+    ]
+    if docs:
+        await mongo_db.cost_sketches.insert_many(docs)
+    return len(docs)
+
+async def ensure_sketches():
+    """Backfill once for deployments that billed before sketches existed."""
+    if await mongo_db.cost_sketches.count_documents({}, limit=1) == 0 \
+            and await mongo_db.bills.count_documents({}, limit=1) > 0:
+        n = await rebuild_sketches()
+        print(f"💰 Backfilled {n} cost sketches")
+
+def _summary(count, total, digest):
+    return {
+        "count": int(count),
+        "mean": round(total / count, 2) if count else 0,
+        "median": round(digest.quantile(0.5), 2) if count else 0,
+        "p90": round(digest.quantile(0.9), 2) if count else 0
+    }
+
+async def cost_summary(days, department=None, now=None):
+    """Per-bill mean/median/p90 per category (and per department) over the last `days` days."""
+    today = _day(now or datetime.utcnow())
+    query = {"day": {"$gte": today - timedelta(days=days - 1), "$lte": today}}
+    if department:
+        # Same normalization as the recorded key
+        query["department"] = _department({"department": department})
+
+    merged = {}   # (department, category) -> [count, sum, digest]
+    async for doc in mongo_db.cost_sketches.find(query, {"_id": 0, "day": 0, "rev": 0}):
+        digest = TDigest.from_dict(doc.get("digest"))
+        if doc.get("pending"):
+            digest.add_many([p["v"] for p in doc["pending"]])
+        for key in ((doc["department"], doc["category"]), ("all", doc["category"])):
+            entry = merged.setdefault(key, [0, 0.0, TDigest()])
+            entry[0] += doc.get("count", 0)
+            entry[1] += doc.get("sum", 0.0)
+            entry[2].merge(digest)
+
+    def section(dept):
+        total = merged.get((dept, TOTAL))
+        return {
+            **(_summary(*total) if total else _summary(0, 0.0, TDigest())),
+            "cost_breakdown": {
+                c: _summary(*merged[(dept, c)]) if (dept, c) in merged else _summary(0, 0.0, TDigest())
+                for c in ITEM_CATEGORIES
+            }
+        }
+
+    departments = sorted({d for d, _ in merged if d != "all"})
+    return {
+        "overall": section("all"),
+        "by_department": {d: section(d) for d in departments} if not department else {}
+    }
+
+async def run():
+    """Background compactor started at application startup."""
+    while True:
+        await asyncio.sleep(COMPACT_INTERVAL_SECONDS)
+        try:
+            await compact_all()
+        except Exception as e:
+            print(f"⚠️ Cost sketch compaction failed: {e}")
@@ -0,0 +1,100 @@
+"""
+Remaining-stay forecasts for occupied beds.
+
+With a trained length-of-stay model, every occupied bed gets p10/p50/p90
+LOS quantiles from one vectorized model call; otherwise the empirical
+quantiles of recorded stays (admissions) per bed type are used. Remaining
+stay = quantile - days already spent. Used by the census endpoint and by
+waitlist wait-time estimates.
+"""
+from datetime import datetime
+
+import numpy as np
+
+from database.database import mongo_db
+
+QUANTILES = (0.1, 0.5, 0.9)
+FORECAST_CACHE_SECONDS = 60
+HISTORY_LIMIT = 5000
+# Used when no admission of a bed type has been recorded yet
+DEFAULT_LOS_DAYS = (1.0, 3.0, 7.0)
+
+_cache = {"at": None, "releases": None}
+
+async def fetch_los_context(patient_ids):
+    """Age (from profiles) and active-condition count (from medical_history) per patient."""
+    ages = {
+        p["patient_id"]: p.get("age")
+        async for p in mongo_db.patient_profiles.find({"patient_id": {"$in": patient_ids}}, {"patient_id": 1, "age": 1})
+    }
+    comorbidities = {
+        row["_id"]: row["count"]
+        async for row in mongo_db.medical_history.aggregate([
+            {"$match": {"patient_id": {"$in": patient_ids}, "status": {"$ne": "Cured"}}},
+            {"$group": {"_id": "$patient_id", "count": {"$sum": 1}}}
+        ])
+    }
+    return ages, comorbidities
+
+async def model_quantiles(beds, bundle):
+    """LOS quantiles (n_beds, 3) from the LOS model."""
+    from routers.ml_models import los_matrix, predict_los_quantiles
+
+    ages, comorbidities = await fetch_los_context([b.get("patient_id") for b in beds])
+    rows = [{
+        "age": ages.get(b.get("patient_id")),
+        "severity": b.get("severity"),
+        "comorbidities": comorbidities.get(b.get("patient_id"), 0),
+        "bed_type": b.get("type")
+    } for b in beds]
+    return predict_los_quantiles(bundle, los_matrix(rows, bundle['bed_types']), QUANTILES)
+
+async def historical_quantiles(beds):
+    """Empirical LOS quantiles (n_beds, 3) of recent recorded stays per bed type."""
+    stays = await mongo_db.admissions.find(
+        {"los_days": {"$gt": 0}}, {"_id": 0, "bed_type": 1, "los_days": 1}
+    ).sort("discharged_at", -1).limit(HISTORY_LIMIT).to_list(None)
+    by_type = {}
+    for s in stays:
+        by_type.setdefault(s.get("bed_type") or "General", []).append(s["los_days"])
+    per_type = {
+        t: np.quantile(np.asarray(v, dtype=float), QUANTILES)
+        for t, v in by_type.items()
+    }
+    return np.array([
+        per_type.get(b.get("type") or "General", DEFAULT_LOS_DAYS) for b in beds
+    ], dtype=float).reshape(-1, len(QUANTILES))
+
+def elapsed_days(beds, now):
+    return np.array([
+        (now - b["allocated_at"]).total_seconds() / 86400 if b.get("allocated_at") else 0.0
+        for b in beds
+    ])
+
+async def expected_releases(now=None):
+    """
+    bed type -> remaining-stay quantiles (k, 3) in days for its occupied beds,
+    sorted by the median. Cached for FORECAST_CACHE_SECONDS.
+    """
+    from routers.ml_models import get_model
+
+    now = now or datetime.utcnow()
+    if _cache["at"] and (now - _cache["at"]).total_seconds() < FORECAST_CACHE_SECONDS:
+        return _cache["releases"]
+
+    beds = await mongo_db.beds.find(
+        {"status": "Occupied"},
+        {"patient_id": 1, "type": 1, "severity": 1, "allocated_at": 1}
+    ).to_list(None)
+    releases = {}
+    if beds:
+        bundle = get_model('los')
+        quantiles = await model_quantiles(beds, bundle) if bundle else await historical_quantiles(beds)
+        remaining = np.maximum(quantiles - elapsed_days(beds, now)[:, None], 0)
+        types = np.array([b.get("type") or "General" for b in beds], dtype=object)
+        for t in set(types):
+            r = remaining[types == t]
+            releases[t] = r[np.argsort(r[:, 1], kind='stable')]
+
+    _cache["at"], _cache["releases"] = now, releases
+    return releases
@@ -0,0 +1,166 @@
+"""
+Online input-drift monitor for the heart and diabetes predict endpoints.
+
+Each prediction updates per-feature streaming sketches in O(1):
+  - numeric features: Welford mean/variance + fixed-bin histogram
+  - categorical features: category counts
+Bin edges and reference distributions come from the training datasets in
+models/data. A background loop periodically compares the live sketches to
+those baselines (PSI, and KS for numeric features) and publishes the
+results as Prometheus gauges on /metrics.
+"""
+import asyncio
+import math
+import os
+from bisect import bisect_right
+
+import numpy as np
+import pandas as pd
+
+from routers.metrics import ml_input_drift_psi, ml_input_drift_ks, ml_input_mean, ml_drift_observations
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, 'models', 'data')
+
+DRIFT_INTERVAL_SECONDS = int(os.getenv("DRIFT_INTERVAL_SECONDS", "60"))
+DRIFT_MIN_SAMPLES = int(os.getenv("DRIFT_MIN_SAMPLES", "30"))
+HISTOGRAM_BINS = 10
+EPSILON = 1e-4
+
+HEART_CATEGORICAL = ['sex', 'cp', 'fbs', 'restecg', 'exang', 'slope', 'ca', 'thal']
+
+# --- Baselines ---
+
+def _heart_training_frame():
+    return pd.read_csv(os.path.join(DATA_DIR, 'Heart_disease_cleveland_new.csv'), encoding='utf-8-sig')
+
+def _diabetes_training_frame():
+    from routers.ml_models import DIABETES_FEATURES
+    df = pd.read_csv(os.path.join(DATA_DIR, 'diabetes_data_upload.csv'))
+    df = df.drop(columns=['class']).set_axis(DIABETES_FEATURES, axis=1)
+    # API receives symptoms as 0/1 and gender as text
+    for col in DIABETES_FEATURES[2:]:
+        df[col] = (df[col] == 'Yes').astype(int)
+    return df
+
+BASELINE_SOURCES = {
+    'heart': (_heart_training_frame, HEART_CATEGORICAL),
+    'diabetes': (_diabetes_training_frame, None),  # everything except age is categorical
+}
+
+class NumericSketch:
+    def __init__(self, values):
+        interior = np.unique(np.quantile(values, np.linspace(0, 1, HISTOGRAM_BINS + 1))[1:-1])
+        self.edges = interior.tolist()
+        # len(edges) + 1 bins, the outer ones open-ended
+        expected = np.bincount(np.searchsorted(interior, values, side='right'), minlength=len(self.edges) + 1)
+        self.expected = expected / expected.sum()
+        self.counts = [0] * (len(self.edges) + 1)
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, x):
+        x = float(x)
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        self.counts[bisect_right(self.edges, x)] += 1
+
+    @property
+    def variance(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    def scores(self):
+        actual = np.asarray(self.counts, dtype=float) / self.n
+        ks = float(np.max(np.abs(np.cumsum(actual) - np.cumsum(self.expected))))
+        return psi(self.expected, actual), ks
+
+class CategoricalSketch:
+    def __init__(self, values):
+        counts = pd.Series(values).astype(str).value_counts()
+        self.expected = (counts / counts.sum()).to_dict()
+        self.counts = {}
+        self.n = 0
+
+    def update(self, x):
+        key = str(x)
+        self.n += 1
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def scores(self):
+        categories = set(self.expected) | set(self.counts)
+        expected = np.array([self.expected.get(c, 0.0) for c in categories])
+        actual = np.array([self.counts.get(c, 0) / self.n for c in categories])
+        return psi(expected, actual), None
+
+def psi(expected, actual):
+    """Population Stability Index with epsilon smoothing for empty bins."""
+    e = np.clip(expected, EPSILON, None)
+    a = np.clip(actual, EPSILON, None)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+# --- Monitor ---
+
+class DriftMonitor:
+    def __init__(self):
+        self.sketches = {}
+
+    def _init_model(self, model):
+        loader, categorical = BASELINE_SOURCES[model]
+        df = loader()
+        sketches = {}
+        for col in df.columns:
+            if col in ('target',):
+                continue
+            is_categorical = col in categorical if categorical is not None else col != 'age'
+            if is_categorical:
+                sketches[col] = CategoricalSketch(df[col].to_numpy())
+            else:
+                sketches[col] = NumericSketch(df[col].to_numpy(dtype=float))
+        self.sketches[model] = sketches
+
+    def observe(self, model, inputs):
+        """Record one prediction's inputs. Never raises into the request path."""
+        try:
+            if model not in self.sketches:
+                self._init_model(model)
+            for feature, sketch in self.sketches[model].items():
+                value = inputs.get(feature)
+                if value is not None and not (isinstance(value, float) and math.isnan(value)):
+                    sketch.update(value)
+        except Exception as e:
+            print(f"⚠️ Drift monitor update failed ({model}): {e}")
+
+    def evaluate(self):
+        """Compute PSI/KS for every feature with enough samples and export gauges."""
+        report = {}
+        for model, sketches in self.sketches.items():
+            report[model] = {}
+            observations = 0
+            for feature, sketch in sketches.items():
+                observations = max(observations, sketch.n)
+                if sketch.n < DRIFT_MIN_SAMPLES:
+                    continue
+                psi_value, ks_value = sketch.scores()
+                ml_input_drift_psi.labels(model=model, feature=feature).set(psi_value)
+                entry = {"n": sketch.n, "psi": round(psi_value, 4)}
+                if ks_value is not None:
+                    ml_input_drift_ks.labels(model=model, feature=feature).set(ks_value)
+                    ml_input_mean.labels(model=model, feature=feature).set(sketch.mean)
+                    entry.update({"ks": round(ks_value, 4), "mean": sketch.mean, "std": math.sqrt(sketch.variance)})
+                report[model][feature] = entry
+            ml_drift_observations.labels(model=model).set(observations)
+        return report
+
+    async def run(self):
+        """Background loop started at application startup."""
+        while True:
+            await asyncio.sleep(DRIFT_INTERVAL_SECONDS)
+            try:
+                self.evaluate()
+            except Exception as e:
+                print(f"⚠️ Drift evaluation failed: {e}")
+
+drift_monitor = DriftMonitor()
@@ -0,0 +1,251 @@
+"""
+Patient feature store.
+
+Profiles saved through /portal/profile are materialized into model-ready,
+fixed-width float64 vectors (one per model) and stored in
+`patient_features`, so a patient can be scored from a single indexed read.
+Missing inputs are stored as NaN and listed under `missing`. Inputs that are
+present but outside what a model was trained on (the diabetes model only
+knows the genders in its training data) are explained under `unsupported`.
+
+The same document carries flat, indexable cohort facts (age, gender,
+conditions, latest risk outputs) used by the cohort engine.
+"""
+import math
+import re
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from database.database import mongo_db
+
+# Bump whenever the vector layout or the profile -> feature mapping changes.
+FEATURE_SCHEMA_VERSION = 3
+
+FEATURE_MODELS = ('heart', 'diabetes', 'clustering')
+
+DIABETES_SYMPTOMS = [
+    'polyuria', 'polydipsia', 'sudden_weight_loss', 'weakness', 'polyphagia',
+    'genital_thrush', 'visual_blurring', 'itching', 'irritability',
+    'delayed_healing', 'partial_paresis', 'muscle_stiffness', 'alopecia'
+]
+
+# --- Profile -> raw feature mapping ---
+
+def _num(value):
+    """Coerce to float, mapping None/blank to NaN."""
+    if value is None or value == "":
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+def _sex(gender):
+    """Training data encodes sex as 1 = male, 0 = female."""
+    if isinstance(gender, (int, float)):
+        return float(gender)
+    if not gender:
+        return math.nan
+    g = str(gender).strip().lower()
+    if g in ("male", "m"):
+        return 1.0
+    if g in ("female", "f"):
+        return 0.0
+    return math.nan
+
+def _bmi(profile):
+    height = _num(profile.get("height"))
+    weight = _num(profile.get("weight"))
+    if math.isnan(height) or math.isnan(weight) or height <= 0:
+        return math.nan
+    # Profiles store height in cm; tolerate metres
+    height_m = height / 100 if height > 3 else height
+    return weight / (height_m ** 2)
+
+def _smoking_status(smoking):
+    if not smoking:
+        return None
+    s = str(smoking).strip().lower()
+    if s in ("no", "never", "none", "non-smoker", "non smoker", "nonsmoker"):
+        return "Non-Smoker"
+    if s in ("yes", "current", "smoker", "former", "occasional", "daily"):
+        return "Smoker"
+    return "Unknown"
+
+def _hypertension(profile):
+    if profile.get("hypertension") is not None:
+        return _num(profile.get("hypertension"))
+    systolic = _num(profile.get("systolic_bp"))
+    diastolic = _num(profile.get("diastolic_bp"))
+    if math.isnan(systolic) and math.isnan(diastolic):
+        return math.nan
+    return 1.0 if (systolic >= 140 or diastolic >= 90) else 0.0
+
+def heart_inputs(profile):
+    """Map a patient profile onto HeartDiseaseData field names."""
+    glucose = _num(profile.get("glucose"))
+    return {
+        "age": _num(profile.get("age")),
+        "sex": _sex(profile.get("gender")),
+        "cp": _num(profile.get("chest_pain_type")),
+        "trestbps": _num(profile.get("systolic_bp")),
+        "chol": _num(profile.get("cholesterol")),
+        "fbs": math.nan if math.isnan(glucose) else float(glucose > 120),
+        "restecg": _num(profile.get("resting_ecg")),
+        "thalach": _num(profile.get("max_heart_rate")),
+        "exang": _num(profile.get("exercise_angina")),
+        "oldpeak": _num(profile.get("st_depression")),
+        "slope": _num(profile.get("st_slope")),
+        "ca": _num(profile.get("major_vessels")),
+        "thal": _num(profile.get("thalassemia")),
+    }
+
+def diabetes_inputs(profile):
+    """Map a patient profile onto DiabetesData field names (gender left as text)."""
+    inputs = {"age": _num(profile.get("age")), "gender": profile.get("gender")}
+    for symptom in DIABETES_SYMPTOMS:
+        inputs[symptom] = _num(profile.get(symptom))
+    obesity = _num(profile.get("obesity"))
+    if math.isnan(obesity):
+        bmi = _bmi(profile)
+        obesity = math.nan if math.isnan(bmi) else float(bmi >= 30)
+    inputs["obesity"] = obesity
+    return inputs
+
+def clustering_inputs(profile):
+    """Map a patient profile onto ClusteringData field names."""
+    return {
+        "age": _num(profile.get("age")),
+        "gender": _sex(profile.get("gender")),
+        "chest_pain_type": _num(profile.get("chest_pain_type")),
+        "blood_pressure": _num(profile.get("systolic_bp")),
+        "cholesterol": _num(profile.get("cholesterol")),
+        "max_heart_rate": _num(profile.get("max_heart_rate")),
+        "exercise_angina": _num(profile.get("exercise_angina")),
+        "plasma_glucose": _num(profile.get("glucose")),
+        "skin_thickness": _num(profile.get("skin_thickness")),
+        "insulin": _num(profile.get("insulin")),
+        "bmi": _bmi(profile),
+        "diabetes_pedigree": _num(profile.get("diabetes_pedigree")),
+        "hypertension": _hypertension(profile),
+        "residence_type": profile.get("residence_type"),
+        "smoking_status": _smoking_status(profile.get("smoking")),
+    }
+
+def profile_facts(profile):
+    """Scalar cohort facts taken from the profile."""
+    age = _num(profile.get("age"))
+    sex = _sex(profile.get("gender"))
+    conditions = re.split(r"[,;\n]", profile.get("conditions") or "")
+    return {
+        "age": None if math.isnan(age) else age,
+        "gender": None if math.isnan(sex) else ("male" if sex == 1 else "female"),
+        "conditions": sorted({c.strip().lower() for c in conditions if c.strip()})
+    }
+
+# --- Vector encoding ---
+
+def encode_vector(values):
+    return np.asarray(values, dtype='<f8').tobytes()
+
+def decode_vector(raw):
+    return np.frombuffer(raw, dtype='<f8')
+
+def build_vectors(profile):
+    """
+    Build model-ready vectors for one profile.
+    Returns ({model: np.ndarray}, {model: [missing field names]}, {model: [unsupported input reasons]}).
+    """
+    from routers.ml_models import (
+        get_model, preprocess_clustering, HEART_FEATURES, DIABETES_FEATURES
+    )
+
+    vectors, missing, unsupported = {}, {}, {}
+
+    heart = heart_inputs(profile)
+    vectors['heart'] = np.array([heart[f] for f in HEART_FEATURES], dtype=float)
+    missing['heart'] = [f for f in HEART_FEATURES if math.isnan(heart[f])]
+
+    diabetes = diabetes_inputs(profile)
+    missing['diabetes'] = [
+        f for f in DIABETES_FEATURES
+        if f != 'gender' and math.isnan(diabetes[f])
+    ]
+    gender_code = math.nan
+    diabetes_models = get_model('diabetes')
+    if diabetes_models and diabetes.get("gender"):
+        encoder = diabetes_models['encoders'].get('Gender') or diabetes_models['encoders'].get('gender')
+        if encoder is not None and diabetes["gender"] in set(encoder.classes_):
+            gender_code = float(encoder.transform([diabetes["gender"]])[0])
+        elif encoder is not None:
+            # Recorded, but the model was trained without this gender
+            unsupported['diabetes'] = [
+                f"gender '{diabetes['gender']}' is not supported by the diabetes model (trained on: {list(encoder.classes_)})"
+            ]
+    if math.isnan(gender_code) and 'diabetes' not in unsupported:
+        missing['diabetes'].insert(1, 'gender')
+    diabetes['gender'] = gender_code
+    vectors['diabetes'] = np.array([diabetes[f] for f in DIABETES_FEATURES], dtype=float)
+
+    # Clustering vectors are stored imputed + encoded, so they are always complete
+    clustering_model = get_model('clustering')
+    if clustering_model:
+        df = preprocess_clustering(pd.DataFrame([clustering_inputs(profile)]), clustering_model)
+        vectors['clustering'] = df.to_numpy(dtype=float)[0]
+        missing['clustering'] = []
+
+    return vectors, missing, unsupported
+
+def build_feature_doc(profile):
+    vectors, missing, unsupported = build_vectors(profile)
+    return {
+        "patient_id": profile["patient_id"],
+        "schema_version": FEATURE_SCHEMA_VERSION,
+        "vectors": {name: encode_vector(vec) for name, vec in vectors.items()},
+        "missing": missing,
+        "unsupported": unsupported,
+        **profile_facts(profile),
+        "updated_at": datetime.utcnow()
+    }
+
+# --- Storage ---
+
+async def materialize_profile(profile):
+    """Recompute and upsert the feature document for a saved profile."""
+    doc = build_feature_doc(profile)
+    await mongo_db.patient_features.update_one(
+        {"patient_id": doc["patient_id"]},
+        {"$set": doc},
+        upsert=True
+    )
+
+    if 'clustering' in doc["vectors"]:
+        from utils.similarity_index import similarity_index
+        await similarity_index.upsert(doc["patient_id"], decode_vector(doc["vectors"]["clustering"]))
+
+    from utils.cohort_engine import refresh_patients
+    await refresh_patients([doc["patient_id"]])
+    return doc
+
+async def load_features(patient_id, model):
+    """
+    Fetch one model's vector for a patient.
+    Returns (vector, missing, unsupported) or None if the patient has no profile.
+    """
+    doc = await mongo_db.patient_features.find_one(
+        {"patient_id": patient_id},
+        {"_id": 0, "schema_version": 1, f"vectors.{model}": 1, f"missing.{model}": 1, f"unsupported.{model}": 1}
+    )
+
+    if not doc or doc.get("schema_version") != FEATURE_SCHEMA_VERSION or model not in doc.get("vectors", {}):
+        # Stale or never materialized: rebuild from the source profile
+        profile = await mongo_db.patient_profiles.find_one({"patient_id": patient_id})
+        if not profile:
+            return None
+        doc = await materialize_profile(profile)
+        if model not in doc["vectors"]:
+            return None
+
+    return decode_vector(doc["vectors"][model]), doc["missing"].get(model, []), (doc.get("unsupported") or {}).get(model, [])
@@ -0,0 +1,128 @@
+"""
+In-process counters for dashboard stats.
+
+Counts are seeded from the databases at startup, adjusted in place by every
+bed, appointment and user mutation routed through the API, and reconciled
+against the databases periodically to absorb writes made elsewhere
+(scripts, other processes). Reads are dictionary lookups; if the last
+reconciliation is older than COUNTER_MAX_STALENESS_SECONDS a read
+reconciles first, which bounds how stale a count can be.
+
+Keys are tuples:
+    ("beds", status), ("beds", status, bed_type)
+    ("appointments",), ("appointments", status)
+    ("users",), ("users", role)
+"""
+import asyncio
+import os
+import threading
+from collections import Counter
+from datetime import datetime
+
+from database.database import mongo_db, SessionLocal
+
+COUNTER_RECONCILE_SECONDS = int(os.getenv("COUNTER_RECONCILE_SECONDS", "300"))
+COUNTER_MAX_STALENESS_SECONDS = int(os.getenv("COUNTER_MAX_STALENESS_SECONDS", "900"))
+
+def _role(role):
+    return getattr(role, "value", role)
+
+def _count_users():
+    from sqlalchemy import func
+    from database.models_sql import User
+
+    db = SessionLocal()
+    try:
+        return db.query(User.role, func.count(User.id)).group_by(User.role).all()
+    finally:
+        db.close()
+
+class LiveCounters:
+    def __init__(self):
+        self._counts = Counter()
+        # Sync (threadpool) routes update users, so writes take a lock
+        self._lock = threading.Lock()
+        self.reconciled_at = None
+
+    def get(self, *key):
+        return self._counts.get(key, 0)
+
+    # --- Mutation hooks ---
+
+    def bed_status_changed(self, bed_type, old_status, new_status, n=1):
+        bed_type = bed_type or "General"
+        with self._lock:
+            for status, delta in ((old_status, -n), (new_status, n)):
+                self._counts[("beds", status)] += delta
+                self._counts[("beds", status, bed_type)] += delta
+
+    def appointment_added(self, status):
+        with self._lock:
+            self._counts[("appointments",)] += 1
+            self._counts[("appointments", status)] += 1
+
+    def appointment_status_changed(self, old_status, new_status):
+        with self._lock:
+            self._counts[("appointments", old_status)] -= 1
+            self._counts[("appointments", new_status)] += 1
+
+    def appointment_removed(self, status):
+        with self._lock:
+            self._counts[("appointments",)] -= 1
+            self._counts[("appointments", status)] -= 1
+
+    def user_added(self, role):
+        with self._lock:
+            self._counts[("users",)] += 1
+            self._counts[("users", _role(role))] += 1
+
+    def user_role_changed(self, old_role, new_role):
+        with self._lock:
+            self._counts[("users", _role(old_role))] -= 1
+            self._counts[("users", _role(new_role))] += 1
+
+    # --- Reconciliation ---
+
+    async def reconcile(self):
+        """Recount everything (one aggregation per collection, one grouped SQL query)."""
+        counts = Counter()
+        async for row in mongo_db.beds.aggregate([
+            {"$group": {"_id": {"status": "$status", "type": {"$ifNull": ["$type", "General"]}}, "count": {"$sum": 1}}}
+        ]):
+            counts[("beds", row["_id"]["status"])] += row["count"]
+            counts[("beds", row["_id"]["status"], row["_id"]["type"])] += row["count"]
+        async for row in mongo_db.appointments.aggregate([
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+        ]):
+            counts[("appointments",)] += row["count"]
+            counts[("appointments", row["_id"])] += row["count"]
+        for role, count in await asyncio.to_thread(_count_users):
+            counts[("users",)] += count
+            counts[("users", _role(role))] += count
+
+        # Mutations applied while recounting may be lost or doubled; the next pass corrects them
+        with self._lock:
+            drifted = sum(1 for k in set(counts) | set(self._counts) if counts.get(k, 0) != self._counts.get(k, 0))
+            self._counts = counts
+        if self.reconciled_at and drifted:
+            print(f"🔢 Counters reconciled: {drifted} had drifted")
+        self.reconciled_at = datetime.utcnow()
+        return counts
+
+    async def fresh(self):
+        """The counters, reconciled first if older than the staleness bound."""
+        if not self.reconciled_at or \
+                (datetime.utcnow() - self.reconciled_at).total_seconds() > COUNTER_MAX_STALENESS_SECONDS:
+            await self.reconcile()
+        return self
+
+    async def run(self):
+        """Background reconciliation started at application startup."""
+        while True:
+            await asyncio.sleep(COUNTER_RECONCILE_SECONDS)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                print(f"⚠️ Counter reconciliation failed: {e}")
+
+live_counters = LiveCounters()
@@ -0,0 +1,213 @@
+"""
+Treatment outcome and 30-day readmission analytics.
+
+An episode is one completed stay in `admissions` (written by
+/beds/deallocate). An episode counts as a success when the patient is not
+admitted again within READMISSION_WINDOW_DAYS of discharge, so it can only
+be scored once that window has closed. A readmission is any later
+admission: a completed stay, a bed allocation in `bed_events` or a bed
+currently occupied by the patient.
+
+The nightly job scores discharges in (watermark, now - window], joining
+the readmissions, the prescriptions issued during the stay and the
+condition (stay diagnosis, else the latest medical_history entry). Each
+scored stay is upserted into `stay_outcomes` under the stay's `_id`, and
+the touched (condition, month) totals in `treatment_outcomes` are then
+recomputed from it, so a run interrupted before the watermark moves can be
+repeated without counting a stay twice. The endpoint reads the totals.
+"""
+import asyncio
+import os
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+from database.database import mongo_db
+from utils.bed_events import ALLOCATED
+
+JOB_NAME = "treatment_outcomes"
+READMISSION_WINDOW_DAYS = 30
+OUTCOMES_INTERVAL_SECONDS = int(os.getenv("OUTCOMES_INTERVAL_SECONDS", str(24 * 3600)))
+
+def _condition(value):
+    return (value or "").strip().lower().replace(".", "_") or "unspecified"
+
+async def _conditions_from_history(patient_ids):
+    """patient_id -> [(recorded_at, condition)] sorted, for stays without a diagnosis."""
+    history = defaultdict(list)
+    async for h in mongo_db.medical_history.find(
+        {"patient_id": {"$in": patient_ids}}, {"patient_id": 1, "condition": 1, "created_at": 1}
+    ):
+        history[h["patient_id"]].append((h.get("created_at") or datetime.min, _condition(h.get("condition"))))
+    for entries in history.values():
+        entries.sort()
+    return history
+
+async def _admission_times(patient_ids, since):
+    """patient_id -> sorted admission times after `since`: completed stays, bed allocations and current occupancy."""
+    times = defaultdict(set)
+    async for a in mongo_db.admissions.find(
+        {"patient_id": {"$in": patient_ids}, "admitted_at": {"$gt": since}}, {"patient_id": 1, "admitted_at": 1}
+    ):
+        times[a["patient_id"]].add(a["admitted_at"])
+    async for e in mongo_db.bed_events.find(
+        {"patient_id": {"$in": patient_ids}, "event": ALLOCATED, "at": {"$gt": since}}, {"patient_id": 1, "at": 1}
+    ):
+        times[e["patient_id"]].add(e["at"])
+    async for b in mongo_db.beds.find(
+        {"patient_id": {"$in": patient_ids}, "status": "Occupied", "allocated_at": {"$gt": since}},
+        {"patient_id": 1, "allocated_at": 1}
+    ):
+        times[b["patient_id"]].add(b["allocated_at"])
+    return {pid: sorted(t) for pid, t in times.items()}
+
+async def _prescription_times(patient_ids, since):
+    times = defaultdict(list)
+    async for p in mongo_db.prescriptions.find(
+        {"patient_id": {"$in": patient_ids}, "$or": [{"date": {"$gte": since}}, {"created_at": {"$gte": since}}]},
+        {"patient_id": 1, "date": 1, "created_at": 1}
+    ):
+        ts = p.get("date") or p.get("created_at")
+        if isinstance(ts, datetime):
+            times[p["patient_id"]].append(ts)
+    for t in times.values():
+        t.sort()
+    return times
+
+async def process_new_discharges(now=None):
+    """Score every discharge whose readmission window closed since the last run."""
+    checkpoint = await mongo_db.job_checkpoints.find_one({"job": JOB_NAME})
+    watermark = checkpoint.get("watermark") if checkpoint else None
+    cutoff = (now or datetime.utcnow()) - timedelta(days=READMISSION_WINDOW_DAYS)
+
+    window = {"$lte": cutoff}
+    if watermark:
+        window["$gt"] = watermark
+    stays = await mongo_db.admissions.find(
+        {"discharged_at": window},
+        {"patient_id": 1, "diagnosis": 1, "admitted_at": 1, "discharged_at": 1, "los_days": 1}
+    ).to_list(None)
+
+    if stays:
+        patient_ids = list({s["patient_id"] for s in stays})
+        earliest = min(s["admitted_at"] for s in stays)
+        admissions = await _admission_times(patient_ids, earliest)
+        prescriptions = await _prescription_times(patient_ids, earliest)
+        history = await _conditions_from_history(patient_ids)
+
+        outcomes = []
+        for stay in stays:
+            pid, admitted, discharged = stay["patient_id"], stay["admitted_at"], stay["discharged_at"]
+
+            condition = _condition(stay.get("diagnosis"))
+            if condition == "unspecified":
+                known = [c for recorded_at, c in history.get(pid, []) if recorded_at <= discharged]
+                if known:
+                    condition = known[-1]
+
+            later = admissions.get(pid, [])
+            i = bisect_right(later, discharged)
+            readmitted = i < len(later) and later[i] <= discharged + timedelta(days=READMISSION_WINDOW_DAYS)
+
+            issued = prescriptions.get(pid, [])
+            n_prescriptions = bisect_right(issued, discharged) - bisect_left(issued, admitted)
+
+            outcomes.append({
+                "_id": stay["_id"],
+                "condition": condition,
+                "month": discharged.strftime("%Y-%m"),
+                "readmitted_30d": int(readmitted),
+                "los_days": stay.get("los_days") or 0.0,
+                "prescriptions": n_prescriptions
+            })
+
+        # Keyed by stay: repeating a run overwrites instead of double counting
+        await mongo_db.stay_outcomes.bulk_write([
+            UpdateOne({"_id": o["_id"]}, {"$set": o}, upsert=True) for o in outcomes
+        ], ordered=False)
+        await _recompute_totals({(o["condition"], o["month"]) for o in outcomes})
+
+    await mongo_db.job_checkpoints.update_one(
+        {"job": JOB_NAME},
+        {"$set": {"watermark": cutoff, "processed": len(stays), "updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+    return len(stays)
+
+async def _recompute_totals(cells):
+    """Rewrite the (condition, month) totals in `cells` from `stay_outcomes`."""
+    rows = await mongo_db.stay_outcomes.aggregate([
+        {"$match": {"$or": [{"condition": c, "month": m} for c, m in cells]}},
+        {"$group": {
+            "_id": {"condition": "$condition", "month": "$month"},
+            "episodes": {"$sum": 1},
+            "readmissions_30d": {"$sum": "$readmitted_30d"},
+            "los_days_sum": {"$sum": "$los_days"},
+            "prescriptions_sum": {"$sum": "$prescriptions"}
+        }}
+    ]).to_list(None)
+    await mongo_db.treatment_outcomes.bulk_write([
+        UpdateOne(
+            {"condition": r["_id"]["condition"], "month": r["_id"]["month"]},
+            {"$set": {
+                "episodes": r["episodes"],
+                "readmissions_30d": r["readmissions_30d"],
+                "los_days_sum": r["los_days_sum"],
+                "prescriptions_sum": r["prescriptions_sum"],
+                "updated_at": datetime.utcnow()
+            }},
+            upsert=True
+        )
+        for r in rows
+    ], ordered=False)
+
+async def summarize(condition=None, start_month=None):
+    """Aggregate the precomputed (condition, month) totals."""
+    match = {}
+    if condition:
+        match["condition"] = _condition(condition)
+    if start_month:
+        match["month"] = {"$gte": start_month}
+    rows = await mongo_db.treatment_outcomes.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": "$condition",
+            "episodes": {"$sum": "$episodes"},
+            "readmissions_30d": {"$sum": "$readmissions_30d"},
+            "los_days_sum": {"$sum": "$los_days_sum"},
+            "prescriptions_sum": {"$sum": "$prescriptions_sum"}
+        }},
+        {"$sort": {"episodes": -1}}
+    ]).to_list(None)
+
+    def rates(r):
+        n = r["episodes"]
+        return {
+            "total_treatments": int(n),
+            "success_rate": round(1 - r["readmissions_30d"] / n, 4) if n else None,
+            "readmission_rate_30d": round(r["readmissions_30d"] / n, 4) if n else None,
+            "avg_recovery_days": round(r["los_days_sum"] / n, 1) if n else 0,
+            "avg_prescriptions_per_stay": round(r["prescriptions_sum"] / n, 2) if n else 0
+        }
+
+    overall = {k: sum(r[k] for r in rows) for k in ("episodes", "readmissions_30d", "los_days_sum", "prescriptions_sum")}
+    checkpoint = await mongo_db.job_checkpoints.find_one({"job": JOB_NAME}, {"watermark": 1})
+    return {
+        "condition": condition or "all",
+        **rates(overall),
+        "by_condition": [{"condition": r["_id"], **rates(r)} for r in rows] if not condition else [],
+        "computed_through": checkpoint.get("watermark") if checkpoint else None
+    }
+
+async def run():
+    """Background loop started at application startup (first pass runs immediately)."""
+    while True:
+        try:
+            processed = await process_new_discharges()
+            if processed:
+                print(f"🩺 Treatment outcomes: scored {processed} new discharges")
+        except Exception as e:
+            print(f"⚠️ Treatment outcome aggregation failed: {e}")
+        await asyncio.sleep(OUTCOMES_INTERVAL_SECONDS)
@@ -0,0 +1,140 @@
+"""
+Vectorized scoring of many patient profiles at once.
+
+`score_profiles` is a plain function over picklable inputs so it can run in
+a process pool; each worker loads the models once through `get_model`.
+"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+SCORABLE_MODELS = ('heart', 'diabetes', 'cluster')
+
+TARGET_COLLECTIONS = {
+    'heart': 'heart_predictions',
+    'diabetes': 'diabetes_predictions',
+    'cluster': 'clustering_predictions'
+}
+
+def _predict(model, X):
+    """predict + predict_proba in one pass (argmax over classes, as sklearn does)."""
+    proba = model.predict_proba(X)
+    predictions = model.classes_.take(np.argmax(proba, axis=1))
+    return predictions, proba[:, 1]
+
+def score_profiles(profiles, model_names=SCORABLE_MODELS, source="rescore"):
+    """
+    Score a batch of patient profiles.
+    Returns {"heart": [docs], "diabetes": [docs], "cluster": [docs], "skipped": {model: count}}
+    where docs match the shape written by the /ml/predict endpoints.
+    """
+    from routers.ml_models import (
+        get_model, get_model_version, assign_clusters,
+        HEART_FEATURES, DIABETES_FEATURES, CLUSTERING_FEATURES
+    )
+    from utils.feature_store import build_vectors
+
+    now = datetime.utcnow()
+    results = {name: [] for name in model_names}
+    results["skipped"] = {name: 0 for name in model_names}
+
+    rows = {'heart': [], 'diabetes': [], 'clustering': []}
+    owners = {'heart': [], 'diabetes': [], 'clustering': []}
+    for profile in profiles:
+        vectors, missing, unsupported = build_vectors(profile)
+        for key in rows:
+            if key in vectors and not missing.get(key) and not unsupported.get(key):
+                rows[key].append(vectors[key])
+                owners[key].append(profile)
+
+    if 'heart' in model_names:
+        model = get_model('heart')
+        results["skipped"]['heart'] = len(profiles) - len(rows['heart'])
+        if model is not None and rows['heart']:
+            X = np.vstack(rows['heart'])
+            predictions, probabilities = _predict(model, X)
+            version = get_model_version('heart')
+            for profile, x, pred, prob in zip(owners['heart'], X, predictions, probabilities):
+                results['heart'].append({
+                    "prediction": int(pred),
+                    "probability": float(prob),
+                    "label": "Heart Disease Detected" if pred == 1 else "No Heart Disease",
+                    "patient_id": profile["patient_id"],
+                    "created_at": now,
+                    "input_data": dict(zip(HEART_FEATURES, x.tolist())),
+                    "source": source,
+                    "model_version": version
+                })
+
+    if 'diabetes' in model_names:
+        diabetes_models = get_model('diabetes')
+        results["skipped"]['diabetes'] = len(profiles) - len(rows['diabetes'])
+        if diabetes_models and rows['diabetes']:
+            X = pd.DataFrame(np.vstack(rows['diabetes']), columns=DIABETES_FEATURES)
+            predictions, probabilities = _predict(diabetes_models['model'], X)
+            version = get_model_version('diabetes')
+            for profile, x, pred, prob in zip(owners['diabetes'], X.to_numpy(), predictions, probabilities):
+                results['diabetes'].append({
+                    "prediction": int(pred),
+                    "probability": float(prob),
+                    "label": "Diabetes Detected" if pred == 1 else "No Diabetes",
+                    "patient_id": profile["patient_id"],
+                    "created_at": now,
+                    "input_data": dict(zip(DIABETES_FEATURES, x.tolist())),
+                    "source": source,
+                    "model_version": version
+                })
+
+    if 'cluster' in model_names:
+        m = get_model('clustering')
+        results["skipped"]['cluster'] = len(profiles) - len(rows['clustering'])
+        if m and rows['clustering']:
+            X = pd.DataFrame(np.vstack(rows['clustering']), columns=CLUSTERING_FEATURES)
+            clusters, _ = assign_clusters(X, m)
+            version = get_model_version('clustering')
+            for profile, cluster in zip(owners['clustering'], clusters):
+                results['cluster'].append({
+                    "patient_id": profile["patient_id"],
+                    "cluster": int(cluster),
+                    "risk_level": m['mapping'].get(cluster, "Unknown"),
+                    "age": profile.get("age"),
+                    "gender": profile.get("gender"),
+                    "created_at": now,
+                    "source": source,
+                    "model_version": version
+                })
+
+    return results
+
+async def write_results(results, model_names, upsert=False):
+    """
+    Write one batch of predictions, one unordered bulk write per collection.
+    Appends by default; with `upsert` each prediction replaces the one with the
+    same (patient_id, model_version, source), so a replayed batch adds no rows.
+    """
+    from pymongo import InsertOne, UpdateOne
+    from database.database import mongo_db
+    from utils.risk_rollups import record_predictions
+    from utils.cohort_engine import record_risk_facts
+
+    written = 0
+    for name in model_names:
+        docs = results.get(name, [])
+        if docs:
+            if upsert:
+                ops = [
+                    UpdateOne(
+                        {"patient_id": doc["patient_id"], "model_version": doc.get("model_version"), "source": doc.get("source")},
+                        {"$set": doc},
+                        upsert=True
+                    )
+                    for doc in docs
+                ]
+            else:
+                ops = [InsertOne(doc) for doc in docs]
+            await mongo_db[TARGET_COLLECTIONS[name]].bulk_write(ops, ordered=False)
+            await record_predictions(name, docs)
+            await record_risk_facts(name, docs)
+            written += len(docs)
+    return written
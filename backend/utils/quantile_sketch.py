@@ -0,0 +1,98 @@
+"""
+Mergeable t-digest for streaming quantiles.
+
+A digest is a sorted list of (mean, weight) centroids whose sizes are
+bounded by the k1 scale function, so tails stay precise while the middle is
+summarized coarsely. Digests built on different days or departments merge
+by concatenating centroids and compressing again; quantiles interpolate
+between centroid means. Serialized as plain lists for MongoDB.
+"""
+import math
+
+import numpy as np
+
+class TDigest:
+    def __init__(self, compression=100, means=None, weights=None, minimum=None, maximum=None):
+        self.compression = compression
+        self.means = np.asarray(means if means is not None else [], dtype=float)
+        self.weights = np.asarray(weights if weights is not None else [], dtype=float)
+        self.min = minimum if minimum is not None else (float(self.means.min()) if len(self.means) else math.inf)
+        self.max = maximum if maximum is not None else (float(self.means.max()) if len(self.means) else -math.inf)
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def _k(self, q):
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.means = np.concatenate([self.means, values])
+        self.weights = np.concatenate([self.weights, np.ones(len(values))])
+        return self.compress()
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.means = np.concatenate([self.means, other.means])
+        self.weights = np.concatenate([self.weights, other.weights])
+        return self.compress()
+
+    def compress(self):
+        if len(self.means) <= 1:
+            return self
+        order = np.argsort(self.means, kind='stable')
+        means, weights = self.means[order], self.weights[order]
+        total = weights.sum()
+
+        out_means, out_weights = [means[0]], [weights[0]]
+        seen = 0.0   # weight strictly before the current output centroid
+        k_lower = self._k(0.0)
+        for m, w in zip(means[1:], weights[1:]):
+            proposed = out_weights[-1] + w
+            if self._k(min((seen + proposed) / total, 1.0)) - k_lower <= 1:
+                out_means[-1] += (m - out_means[-1]) * w / proposed
+                out_weights[-1] = proposed
+            else:
+                seen += out_weights[-1]
+                k_lower = self._k(min(seen / total, 1.0))
+                out_means.append(m)
+                out_weights.append(w)
+
+        self.means = np.array(out_means)
+        self.weights = np.array(out_weights)
+        return self
+
+    def quantile(self, q):
+        n = len(self.means)
+        if n == 0:
+            return None
+        if n == 1:
+            return float(self.means[0])
+        total = self.weights.sum()
+        # Cumulative weight at each centroid's center, with the extremes pinned to min/max
+        centers = np.cumsum(self.weights) - self.weights / 2
+        xs = np.concatenate([[0.0], centers, [total]])
+        ys = np.concatenate([[self.min], self.means, [self.max]])
+        return float(np.interp(q * total, xs, ys))
+
+    def to_dict(self):
+        return {
+            "means": self.means.tolist(),
+            "weights": self.weights.tolist(),
+            "min": self.min if math.isfinite(self.min) else None,
+            "max": self.max if math.isfinite(self.max) else None
+        }
+
+    @classmethod
+    def from_dict(cls, data, compression=100):
+        data = data or {}
+        return cls(compression, data.get("means"), data.get("weights"), data.get("min"), data.get("max"))
@@ -0,0 +1,147 @@
+"""
+Change-driven re-prediction.
+
+Writes to patient_profiles, lab_results and vitals_checks enqueue the
+affected patient id. A background worker waits until a patient has been
+quiet for REPREDICT_DEBOUNCE_SECONDS (or has been pending for
+REPREDICT_MAX_DELAY_SECONDS), so a burst of writes costs one re-score, then
+scores the due patients in batches with `score_profiles` and appends the
+results to the prediction collections with source "change".
+
+Profiles are overlaid with newer lab results and vitals before scoring, so
+a lab import moves the prediction even if the profile itself is unchanged.
+"""
+import asyncio
+import os
+import time
+
+from database.database import mongo_db
+from utils.population_scoring import score_profiles, write_results, SCORABLE_MODELS
+
+REPREDICT_DEBOUNCE_SECONDS = float(os.getenv("REPREDICT_DEBOUNCE_SECONDS", "5"))
+REPREDICT_MAX_DELAY_SECONDS = float(os.getenv("REPREDICT_MAX_DELAY_SECONDS", "30"))
+REPREDICT_BATCH_SIZE = int(os.getenv("REPREDICT_BATCH_SIZE", "500"))
+
+# lab_type -> profile field
+LAB_FIELDS = {
+    'glucose': 'glucose',
+    'blood_glucose': 'glucose',
+    'cholesterol': 'cholesterol',
+    'total_cholesterol': 'cholesterol',
+    'insulin': 'insulin',
+}
+
+# vitals_checks field -> profile field
+VITALS_FIELDS = {
+    'bp_systolic': 'systolic_bp',
+    'bp_diastolic': 'diastolic_bp',
+}
+
+async def overlay_observations(profiles):
+    """Apply lab results and vitals recorded after the profile was last saved."""
+    ids = [p["patient_id"] for p in profiles]
+
+    labs = await mongo_db.lab_results.aggregate([
+        {"$match": {"patient_id": {"$in": ids}, "lab_type": {"$in": list(LAB_FIELDS)}}},
+        {"$sort": {"imported_at": -1}},
+        {"$group": {
+            "_id": {"patient_id": "$patient_id", "lab_type": "$lab_type"},
+            "value": {"$first": "$value"},
+            "recorded_at": {"$first": "$imported_at"}
+        }}
+    ]).to_list(None)
+
+    vitals = await mongo_db.vitals_checks.aggregate([
+        {"$match": {"patient_id": {"$in": ids}}},
+        {"$sort": {"checked_at": -1}},
+        {"$group": {
+            "_id": "$patient_id",
+            "recorded_at": {"$first": "$checked_at"},
+            **{field: {"$first": f"${field}"} for field in VITALS_FIELDS}
+        }}
+    ]).to_list(None)
+
+    observations = {}   # patient_id -> [(recorded_at, profile field, value)]
+    for lab in labs:
+        observations.setdefault(lab["_id"]["patient_id"], []).append(
+            (lab["recorded_at"], LAB_FIELDS[lab["_id"]["lab_type"]], lab["value"])
+        )
+    for check in vitals:
+        for field, target in VITALS_FIELDS.items():
+            if check.get(field) is not None:
+                observations.setdefault(check["_id"], []).append((check["recorded_at"], target, check[field]))
+
+    for profile in profiles:
+        updated_at = profile.get("updated_at")
+        # Oldest first so the newest observation of a field wins
+        for recorded_at, field, value in sorted(observations.get(profile["patient_id"], []), key=lambda o: o[0]):
+            if updated_at is None or (recorded_at and recorded_at > updated_at):
+                profile[field] = value
+    return profiles
+
+class RePredictionQueue:
+    def __init__(self):
+        self.pending = {}   # patient_id -> (first enqueued, last enqueued)
+        self._wakeup = asyncio.Event()
+        self.stats = {"enqueued": 0, "coalesced": 0, "rescored": 0, "batches": 0, "errors": 0}
+
+    def enqueue(self, patient_id):
+        """Mark a patient's inputs as changed. O(1); never touches the database."""
+        if not patient_id:
+            return
+        now = time.monotonic()
+        self.stats["enqueued"] += 1
+        if patient_id in self.pending:
+            self.pending[patient_id] = (self.pending[patient_id][0], now)
+            self.stats["coalesced"] += 1
+        else:
+            self.pending[patient_id] = (now, now)
+        self._wakeup.set()
+
+    def _due(self, now):
+        return [
+            pid for pid, (first, last) in self.pending.items()
+            if now - last >= REPREDICT_DEBOUNCE_SECONDS or now - first >= REPREDICT_MAX_DELAY_SECONDS
+        ]
+
+    def _next_deadline(self):
+        return min(
+            min(last + REPREDICT_DEBOUNCE_SECONDS, first + REPREDICT_MAX_DELAY_SECONDS)
+            for first, last in self.pending.values()
+        )
+
+    async def rescore(self, patient_ids):
+        profiles = await mongo_db.patient_profiles.find(
+            {"patient_id": {"$in": patient_ids}}, {"_id": 0}
+        ).to_list(None)
+        if not profiles:
+            return 0
+        await overlay_observations(profiles)
+        results = await asyncio.to_thread(score_profiles, profiles, SCORABLE_MODELS, "change")
+        return await write_results(results, SCORABLE_MODELS)
+
+    async def run(self):
+        """Background worker started at application startup."""
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self.pending:
+                due = self._due(time.monotonic())
+                if not due:
+                    await asyncio.sleep(max(self._next_deadline() - time.monotonic(), 0.05))
+                    continue
+                # Writes arriving while a batch is scored re-enqueue the patient
+                for pid in due:
+                    del self.pending[pid]
+                for i in range(0, len(due), REPREDICT_BATCH_SIZE):
+                    batch = due[i:i + REPREDICT_BATCH_SIZE]
+                    try:
+                        written = await self.rescore(batch)
+                        self.stats["rescored"] += len(batch)
+                        self.stats["batches"] += 1
+                        print(f"🔁 Re-scored {len(batch)} changed patients ({written} predictions)")
+                    except Exception as e:
+                        self.stats["errors"] += 1
+                        print(f"⚠️ Change-driven re-scoring failed: {e}")
+
+repredict_queue = RePredictionQueue()
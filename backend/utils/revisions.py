@@ -0,0 +1,94 @@
+"""
+Monotonic revisions for delta sync of the bed and resource boards.
+
+Every write to a synced collection takes the next revision of its stream
+from `counters` (`$inc`, so revisions never repeat) and stamps it on the
+changed documents as `rev`. The documents themselves are the compacted
+change log: `{"rev": {"$gt": since}}` returns everything changed since a
+client's last sync.
+
+Clients are only handed a *safe* revision: below every write still in
+flight, so a slower writer can never commit a revision a client has already
+moved past. Deleting documents (reseeding) records `reset_rev`; clients
+older than that get a full snapshot. Current revisions are kept in memory,
+so an unchanged board is answered with 304 without touching MongoDB.
+
+    {"_id": "beds", "seq": 1287, "reset_rev": 1200}
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+from pymongo import ReturnDocument
+
+from database.database import mongo_db
+
+STREAMS = ("beds", "resources")
+REVISION_REFRESH_SECONDS = int(os.getenv("REVISION_REFRESH_SECONDS", "30"))
+
+async def next_revision(stream, n=1):
+    doc = await mongo_db.counters.find_one_and_update(
+        {"_id": stream},
+        {"$inc": {"seq": n}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return doc["seq"]
+
+async def mark_reset(stream, rev):
+    """Record that documents of `stream` were deleted or replaced at `rev` (after the new documents are written)."""
+    await mongo_db.counters.update_one({"_id": stream}, {"$max": {"reset_rev": rev}}, upsert=True)
+
+class RevisionTracker:
+    def __init__(self):
+        self.current = {s: 0 for s in STREAMS}
+        self.reset = {s: 0 for s in STREAMS}
+        self._inflight = {s: set() for s in STREAMS}
+
+    @asynccontextmanager
+    async def stamp(self, stream):
+        """Issue a revision for one write; it becomes visible to clients when the block exits."""
+        rev = await next_revision(stream)
+        self._inflight[stream].add(rev)
+        try:
+            yield rev
+        finally:
+            self._inflight[stream].discard(rev)
+            self.current[stream] = max(self.current[stream], rev)
+
+    def watermark(self, stream):
+        """Highest revision below which every write has completed."""
+        inflight = self._inflight[stream]
+        if inflight:
+            return min(min(inflight) - 1, self.current[stream])
+        return self.current[stream]
+
+    def etag(self, stream, rev=None):
+        return f'W/"{stream}-{self.watermark(stream) if rev is None else rev}"'
+
+    def needs_snapshot(self, stream, since):
+        return since is None or since <= 0 or since < self.reset[stream]
+
+    async def load(self):
+        """Seed from `counters` (application startup)."""
+        async for doc in mongo_db.counters.find({"_id": {"$in": list(STREAMS)}}):
+            self.current[doc["_id"]] = max(self.current[doc["_id"]], doc.get("seq", 0))
+            self.reset[doc["_id"]] = max(self.reset[doc["_id"]], doc.get("reset_rev", 0))
+
+    async def refresh(self):
+        """Pick up reseeds done by scripts; they publish reset_rev only after writing."""
+        async for doc in mongo_db.counters.find({"_id": {"$in": list(STREAMS)}}, {"reset_rev": 1}):
+            reset = doc.get("reset_rev", 0)
+            self.reset[doc["_id"]] = max(self.reset[doc["_id"]], reset)
+            self.current[doc["_id"]] = max(self.current[doc["_id"]], reset)
+
+    async def run(self):
+        """Background refresh started at application startup."""
+        while True:
+            await asyncio.sleep(REVISION_REFRESH_SECONDS)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"⚠️ Revision refresh failed: {e}")
+
+revisions = RevisionTracker()
@@ -0,0 +1,188 @@
+"""
+Incrementally maintained population risk rollups.
+
+Every prediction write moves the patient's counter between cells of a
+per-model rollup document in `risk_rollups`:
+
+    {"model": "heart", "patients": 1234,
+     "cells": {"<age band>": {"<gender>": {"<cluster>": {"<risk bucket>": count}}}}}
+
+The cluster is the one in the prediction itself for the clustering model
+and the patient's latest cluster assignment at prediction time for the
+others. The cell each patient currently occupies is kept in
+`risk_rollup_state`, so a new prediction is a `$inc` of +1 on the new cell
+and -1 on the old one and the rollup always describes each patient's latest
+prediction. The state is swapped with one `find_one_and_update` per patient
+(single and bulk writes alike), so concurrent writers always see the cell
+they are leaving. The dashboard reads the (at most three) rollup documents
+directly. rebuild_risk_rollups.py recomputes everything from the prediction
+collections (run it after changing the cell layout).
+"""
+import asyncio
+import math
+from collections import Counter
+from datetime import datetime
+
+from pymongo import ReturnDocument
+
+from database.database import mongo_db
+
+ROLLUP_MODELS = ('heart', 'diabetes', 'cluster')
+
+AGE_BANDS = [(0, 18, "0-17"), (18, 30, "18-29"), (30, 40, "30-39"), (40, 50, "40-49"),
+             (50, 60, "50-59"), (60, 70, "60-69"), (70, 80, "70-79")]
+
+# Probability cut-offs for heart/diabetes risk buckets
+RISK_BUCKETS = [(0.3, "low"), (0.7, "moderate")]
+
+UNKNOWN = "unknown"
+
+def age_band(age):
+    try:
+        age = float(age)
+    except (TypeError, ValueError):
+        return UNKNOWN
+    if math.isnan(age):
+        return UNKNOWN
+    for low, high, label in AGE_BANDS:
+        if low <= age < high:
+            return label
+    return "80+" if age >= 80 else UNKNOWN
+
+def gender_label(value, model=None):
+    if value is None:
+        return UNKNOWN
+    if isinstance(value, str):
+        g = value.strip().lower()
+        if g in ("male", "m"):
+            return "male"
+        if g in ("female", "f"):
+            return "female"
+        return UNKNOWN
+    try:
+        code = float(value)
+    except (TypeError, ValueError):
+        return UNKNOWN
+    if math.isnan(code):
+        return UNKNOWN
+    if model == 'diabetes':
+        # Feature-store / rescore docs carry the label-encoded gender
+        from routers.ml_models import get_model
+        diabetes_models = get_model('diabetes')
+        encoder = diabetes_models and (diabetes_models['encoders'].get('Gender') or diabetes_models['encoders'].get('gender'))
+        if encoder is not None and 0 <= int(code) < len(encoder.classes_):
+            return gender_label(str(encoder.classes_[int(code)]))
+        return UNKNOWN
+    # Heart/clustering encoding: 1 = male, 0 = female
+    return "male" if code == 1 else "female" if code == 0 else UNKNOWN
+
+def risk_bucket(probability):
+    for cutoff, label in RISK_BUCKETS:
+        if probability < cutoff:
+            return label
+    return "high"
+
+def cell_of(model, doc, cluster=None):
+    """Rollup cell (age band, gender, cluster, risk bucket) of one prediction document."""
+    if model == 'cluster':
+        age, gender = doc.get("age"), doc.get("gender")
+        cluster = doc.get("cluster")
+        bucket = str(doc.get("risk_level") or UNKNOWN)
+    else:
+        inputs = doc.get("input_data") or {}
+        age = inputs.get("age")
+        gender = inputs.get("sex") if model == 'heart' else inputs.get("gender")
+        bucket = risk_bucket(float(doc["probability"]))
+    cluster = UNKNOWN if cluster is None else str(cluster)
+    # Field names in the rollup document cannot contain dots
+    return (age_band(age), gender_label(gender, model), cluster.replace(".", "_"), bucket.replace(".", "_"))
+
+def _path(cell):
+    return "cells." + ".".join(cell)
+
+async def current_clusters(patient_ids):
+    """patient_id -> latest cluster, from the clustering model's rollup state."""
+    return {
+        s["patient_id"]: s["cell"][2]
+        async for s in mongo_db.risk_rollup_state.find(
+            {"model": "cluster", "patient_id": {"$in": list(patient_ids)}}, {"patient_id": 1, "cell": 1}
+        )
+        if len(s.get("cell") or []) == 4
+    }
+
+async def _move(model, patient_id, cell, now):
+    """Swap the patient's state to `cell`; returns the $inc for the rollup (empty if unchanged)."""
+    previous = await mongo_db.risk_rollup_state.find_one_and_update(
+        {"patient_id": patient_id, "model": model},
+        {"$set": {"cell": cell, "updated_at": now}},
+        upsert=True,
+        projection={"cell": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if previous is None:
+        return {_path(cell): 1, "patients": 1}
+    if previous.get("cell") == cell:
+        return {}
+    return {_path(cell): 1, _path(previous["cell"]): -1}
+
+async def record_prediction(model, doc):
+    """Move one patient to the cell of their new prediction."""
+    clusters = {} if model == 'cluster' else await current_clusters([doc["patient_id"]])
+    cell = list(cell_of(model, doc, clusters.get(doc["patient_id"])))
+    now = datetime.utcnow()
+    inc = await _move(model, doc["patient_id"], cell, now)
+    if inc:
+        await mongo_db.risk_rollups.update_one(
+            {"model": model},
+            {"$inc": inc, "$set": {"updated_at": now}},
+            upsert=True
+        )
+
+async def record_predictions(model, docs):
+    """Batch variant for bulk writers: per-patient state swaps (run concurrently) and one $inc."""
+    latest = {}
+    for doc in docs:
+        latest[doc["patient_id"]] = doc   # last write per patient wins
+    if not latest:
+        return
+
+    clusters = {} if model == 'cluster' else await current_clusters(latest)
+    now = datetime.utcnow()
+    moves = await asyncio.gather(*[
+        _move(model, pid, list(cell_of(model, doc, clusters.get(pid))), now)
+        for pid, doc in latest.items()
+    ])
+
+    inc = Counter()
+    for move in moves:
+        inc.update(move)
+    inc = {path: n for path, n in inc.items() if n}
+    if inc:
+        await mongo_db.risk_rollups.update_one(
+            {"model": model},
+            {"$inc": inc, "$set": {"updated_at": now}},
+            upsert=True
+        )
+
+def summarize(rollup):
+    """Totals per risk bucket, and risk distribution by age band, by gender and by cluster."""
+    by_risk, by_age, by_gender, by_cluster = Counter(), {}, {}, {}
+    for band, genders in rollup.get("cells", {}).items():
+        for gender, clusters in genders.items():
+            for cluster, buckets in clusters.items():
+                for bucket, n in buckets.items():
+                    if n <= 0:
+                        continue
+                    by_risk[bucket] += n
+                    by_age.setdefault(band, Counter())[bucket] += n
+                    by_gender.setdefault(gender, Counter())[bucket] += n
+                    by_cluster.setdefault(cluster, Counter())[bucket] += n
+    return {
+        "patients": rollup.get("patients", 0),
+        "risk_distribution": dict(by_risk),
+        "by_age_band": {k: dict(v) for k, v in sorted(by_age.items())},
+        "by_gender": {k: dict(v) for k, v in by_gender.items()},
+        "by_cluster": {k: dict(v) for k, v in sorted(by_cluster.items())},
+        "cells": rollup.get("cells", {}),
+        "updated_at": rollup.get("updated_at")
+    }
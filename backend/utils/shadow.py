@@ -0,0 +1,133 @@
+"""
+Shadow evaluation of candidate heart/diabetes models against live traffic.
+
+A sample of predict requests (SHADOW_SAMPLE_RATE) is re-scored by the
+candidate model from a background task after the response has been sent,
+so the primary path only pays for a random draw. Agreement and latency are
+aggregated in memory and flushed to shadow_reports every
+SHADOW_FLUSH_SECONDS.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+from database.database import mongo_db
+
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0.1"))
+SHADOW_FLUSH_SECONDS = int(os.getenv("SHADOW_FLUSH_SECONDS", "300"))
+
+SHADOW_MODELS = ('heart', 'diabetes')
+
+def _empty_stats():
+    return {
+        "samples": 0,
+        "agreements": 0,
+        "abs_probability_diff_sum": 0.0,
+        "primary_latency_sum": 0.0,
+        "primary_latency_max": 0.0,
+        "candidate_latency_sum": 0.0,
+        "candidate_latency_max": 0.0,
+        "errors": 0,
+        "window_started_at": datetime.utcnow()
+    }
+
+class ShadowEvaluator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {name: _empty_stats() for name in SHADOW_MODELS}
+        # Refreshed by the flush loop so the request path never touches the filesystem
+        self.available = {name: False for name in SHADOW_MODELS}
+
+    def refresh_availability(self):
+        from routers.ml_models import get_model_version
+        for name in SHADOW_MODELS:
+            self.available[name] = get_model_version(name, candidate=True) is not None
+
+    def should_sample(self, model):
+        return self.available.get(model, False) and random.random() < SHADOW_SAMPLE_RATE
+
+    def evaluate(self, model, X, primary_prediction, primary_probability, primary_latency):
+        """Score X with the candidate model. Runs in the threadpool after the response."""
+        from routers.ml_models import get_candidate_model
+
+        try:
+            candidate = get_candidate_model(model)
+            if candidate is None:
+                return
+            estimator = candidate['model'] if isinstance(candidate, dict) else candidate
+
+            started = time.perf_counter()
+            prediction = int(estimator.predict(X)[0])
+            probability = float(estimator.predict_proba(X)[0][1])
+            candidate_latency = time.perf_counter() - started
+        except Exception as e:
+            print(f"⚠️ Shadow evaluation failed ({model}): {e}")
+            with self._lock:
+                self.stats[model]["errors"] += 1
+            return
+
+        with self._lock:
+            s = self.stats[model]
+            s["samples"] += 1
+            s["agreements"] += int(prediction == primary_prediction)
+            s["abs_probability_diff_sum"] += abs(probability - primary_probability)
+            s["primary_latency_sum"] += primary_latency
+            s["primary_latency_max"] = max(s["primary_latency_max"], primary_latency)
+            s["candidate_latency_sum"] += candidate_latency
+            s["candidate_latency_max"] = max(s["candidate_latency_max"], candidate_latency)
+
+    def snapshot(self, reset=False):
+        """Summarize the current window per model (optionally starting a new one)."""
+        from routers.ml_models import get_model_version
+
+        with self._lock:
+            stats = self.stats
+            if reset:
+                self.stats = {name: _empty_stats() for name in SHADOW_MODELS}
+
+        report = {}
+        for name, s in stats.items():
+            n = s["samples"]
+            report[name] = {
+                "primary_version": get_model_version(name),
+                "candidate_version": get_model_version(name, candidate=True),
+                "samples": n,
+                "errors": s["errors"],
+                "agreement_rate": round(s["agreements"] / n, 4) if n else None,
+                "mean_abs_probability_diff": round(s["abs_probability_diff_sum"] / n, 4) if n else None,
+                "primary_latency_ms": {
+                    "mean": round(1000 * s["primary_latency_sum"] / n, 3) if n else None,
+                    "max": round(1000 * s["primary_latency_max"], 3)
+                },
+                "candidate_latency_ms": {
+                    "mean": round(1000 * s["candidate_latency_sum"] / n, 3) if n else None,
+                    "max": round(1000 * s["candidate_latency_max"], 3)
+                },
+                "window_started_at": s["window_started_at"]
+            }
+        return report
+
+    async def flush(self):
+        report = self.snapshot(reset=True)
+        if any(r["samples"] or r["errors"] for r in report.values()):
+            await mongo_db.shadow_reports.insert_one({
+                "flushed_at": datetime.utcnow(),
+                "sample_rate": SHADOW_SAMPLE_RATE,
+                "models": report
+            })
+
+    async def run(self):
+        """Background loop started at application startup."""
+        self.refresh_availability()
+        while True:
+            await asyncio.sleep(SHADOW_FLUSH_SECONDS)
+            try:
+                self.refresh_availability()
+                await self.flush()
+            except Exception as e:
+                print(f"⚠️ Shadow report flush failed: {e}")
+
+shadow_evaluator = ShadowEvaluator()
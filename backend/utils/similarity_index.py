@@ -0,0 +1,206 @@
+"""
+Nearest-neighbour index over the clustering scaler space.
+
+All materialized patients (patient_features.vectors.clustering) are scaled
+with the clustering RobustScaler and kept in a KD-tree. Profile updates go
+to a small brute-force buffer and superseded tree rows are tombstoned; the
+tree is rebuilt in memory once the buffer grows past REBUILD_FRACTION of the
+indexed population. Scaling and tree builds run in a worker thread; upserts
+arriving during a build or compaction are held and applied afterwards.
+"""
+import asyncio
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+
+from database.database import mongo_db
+
+REBUILD_MIN_BUFFER = 1000
+REBUILD_FRACTION = 0.05
+# Extra tree neighbours fetched per query for skipped (tombstoned) rows before retrying wider
+QUERY_OVERFETCH = 32
+
+def _new_tree(X):
+    return KDTree(X, leaf_size=40) if len(X) else None
+
+class SimilarityIndex:
+    def __init__(self):
+        self.ready = False
+        self._lock = asyncio.Lock()         # one build at a time
+        self._write_lock = asyncio.Lock()   # upserts are applied in order
+        self._busy = False                  # a build or compaction is running
+        self._pending = {}                  # patient_id -> vector received while busy
+        self._reset()
+
+    def _reset(self):
+        self.tree = None
+        self.tree_ids = []
+        self.tree_X = np.empty((0, 0))
+        self.tree_risk = []
+        self.tombstones = set()        # tree rows replaced by a newer vector
+        self.buffer_ids = []
+        self.buffer_X = []
+        self.buffer_risk = []
+        self.location = {}             # patient_id -> ("tree" | "buffer", row)
+
+    # --- Building ---
+
+    def _scale(self, vectors):
+        """Scale clustering vectors; returns (scaled, risk labels)."""
+        from routers.ml_models import get_model, assign_clusters, CLUSTERING_FEATURES
+        m = get_model('clustering')
+        df = pd.DataFrame(vectors, columns=CLUSTERING_FEATURES)
+        clusters, _ = assign_clusters(df, m)
+        risks = [m['mapping'].get(c, "Unknown") for c in clusters]
+        return m['scaler'].transform(df), risks
+
+    def _install(self, ids, X, risks, tree):
+        self._reset()
+        self.tree_ids = list(ids)
+        self.tree_X = X
+        self.tree_risk = list(risks)
+        self.tree = tree
+        self.location = {pid: ("tree", i) for i, pid in enumerate(self.tree_ids)}
+
+    async def build(self):
+        """Load every stored clustering vector and build the tree (upserts meanwhile are buffered)."""
+        from utils.feature_store import decode_vector
+
+        self._busy = True
+        try:
+            ids, vectors = [], []
+            cursor = mongo_db.patient_features.find(
+                {"vectors.clustering": {"$exists": True}},
+                {"_id": 0, "patient_id": 1, "vectors.clustering": 1}
+            ).batch_size(5000)
+            async for doc in cursor:
+                ids.append(doc["patient_id"])
+                vectors.append(decode_vector(doc["vectors"]["clustering"]))
+
+            def index():
+                if not vectors:
+                    return np.empty((0, 0)), [], None
+                X, risks = self._scale(np.vstack(vectors))
+                return X, risks, _new_tree(X)
+
+            X, risks, tree = await asyncio.to_thread(index)
+            self._install(ids, X, risks, tree)
+            self.ready = True
+            print(f"🧭 Similarity index built with {len(ids)} patients")
+        finally:
+            self._busy = False
+        await self._drain()
+
+    async def ensure_ready(self):
+        if self.ready:
+            return
+        async with self._lock:
+            if not self.ready:
+                await self.build()
+
+    def _folded(self):
+        """Tree rows still live plus the buffer, as one (ids, X, risks, tree); runs in a worker thread."""
+        keep = [i for i in range(len(self.tree_ids)) if i not in self.tombstones]
+        ids = [self.tree_ids[i] for i in keep] + self.buffer_ids
+        risks = [self.tree_risk[i] for i in keep] + self.buffer_risk
+        parts = []
+        if keep:
+            parts.append(self.tree_X[keep])
+        if self.buffer_X:
+            parts.append(np.vstack(self.buffer_X))
+        X = np.vstack(parts) if parts else np.empty((0, 0))
+        return ids, X, risks, _new_tree(X)
+
+    async def _compact(self):
+        """Fold the buffer into a fresh tree off the event loop; queries keep using the old one."""
+        self._busy = True
+        try:
+            self._install(*await asyncio.to_thread(self._folded))
+        finally:
+            self._busy = False
+
+    # --- Updates ---
+
+    async def upsert(self, patient_id, clustering_vector):
+        """Add or replace one patient. Buffered while building or compacting; no-op before the first build."""
+        if self._busy:
+            self._pending[patient_id] = clustering_vector
+            return
+        if not self.ready:
+            return
+        await self._apply({patient_id: clustering_vector})
+
+    async def _apply(self, vectors):
+        async with self._write_lock:
+            ids = list(vectors)
+            scaled, risks = await asyncio.to_thread(self._scale, np.vstack([vectors[p].reshape(1, -1) for p in ids]))
+            for patient_id, x, risk in zip(ids, scaled, risks):
+                self._insert(patient_id, x, risk)
+            if len(self.buffer_ids) > max(REBUILD_MIN_BUFFER, REBUILD_FRACTION * len(self.tree_ids)):
+                await self._compact()
+        await self._drain()
+
+    async def _drain(self):
+        """Apply the upserts that arrived while the index was busy."""
+        if self._pending and self.ready and not self._busy:
+            pending, self._pending = self._pending, {}
+            await self._apply(pending)
+
+    def _insert(self, patient_id, x, risk):
+        where = self.location.get(patient_id)
+        if where and where[0] == "buffer":
+            self.buffer_X[where[1]] = x
+            self.buffer_risk[where[1]] = risk
+            return
+        if where:
+            self.tombstones.add(where[1])
+
+        self.location[patient_id] = ("buffer", len(self.buffer_ids))
+        self.buffer_ids.append(patient_id)
+        self.buffer_X.append(x)
+        self.buffer_risk.append(risk)
+
+    # --- Queries ---
+
+    def _vector_of(self, patient_id):
+        where = self.location.get(patient_id)
+        if not where:
+            return None
+        return self.tree_X[where[1]] if where[0] == "tree" else self.buffer_X[where[1]]
+
+    def query(self, patient_id, k):
+        """Return [(patient_id, distance, risk_level)] for the k nearest other patients."""
+        x = self._vector_of(patient_id)
+        if x is None:
+            return None
+
+        candidates = []
+        if self.tree is not None:
+            # Over-fetch a little to cover the query patient and tombstoned rows;
+            # widen only when too many of the neighbours found were tombstoned
+            n = min(len(self.tree_ids), k + 1 + min(len(self.tombstones), QUERY_OVERFETCH))
+            while True:
+                dist, idx = self.tree.query(x.reshape(1, -1), k=n)
+                candidates = [
+                    (self.tree_ids[i], float(d), self.tree_risk[i])
+                    for d, i in zip(dist[0], idx[0])
+                    if i not in self.tombstones and self.tree_ids[i] != patient_id
+                ][:k]
+                if len(candidates) >= k or n >= len(self.tree_ids):
+                    break
+                n = min(len(self.tree_ids), 2 * n)
+
+        if self.buffer_X:
+            dist = np.linalg.norm(np.vstack(self.buffer_X) - x, axis=1)
+            for i in np.argsort(dist)[:k + 1]:
+                if self.buffer_ids[i] != patient_id:
+                    candidates.append((self.buffer_ids[i], float(dist[i]), self.buffer_risk[i]))
+
+        candidates.sort(key=lambda c: c[1])
+        return candidates[:k]
+
+    def __len__(self):
+        return len(self.tree_ids) - len(self.tombstones) + len(self.buffer_ids)
+
+similarity_index = SimilarityIndex()
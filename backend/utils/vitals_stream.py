@@ -0,0 +1,250 @@
+"""
+Continuous ICU-transfer risk scoring over streaming vitals.
+
+Each monitored patient owns a slot in fixed-size ring buffers holding the
+last VITALS_WINDOW readings. Ingest is O(1) (running sums for mean/variance
+are updated as readings enter and leave the window). Every
+ICU_SCORE_INTERVAL_SECONDS the whole census is scored in one vectorized
+call: windowed min/max/variance/trend are computed across all slots at once
+and the ICU-transfer model is fed the worst value seen in the window.
+Patients crossing ICU_ALERT_THRESHOLD are published as alerts.
+
+Slots are recycled when the patient's bed is released and, for patients
+that leave without a release (or were never admitted), once no reading has
+arrived for VITALS_EXPIRY_HOURS.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+from database.database import mongo_db
+
+VITALS = ['o2_saturation', 'heart_rate', 'bp_systolic', 'temperature']
+VITALS_WINDOW = int(os.getenv("VITALS_WINDOW", "30"))
+ICU_SCORE_INTERVAL_SECONDS = int(os.getenv("ICU_SCORE_INTERVAL_SECONDS", "15"))
+ICU_ALERT_THRESHOLD = float(os.getenv("ICU_ALERT_THRESHOLD", "0.7"))
+# Re-arm an alert only after risk falls this far below the threshold
+ICU_ALERT_HYSTERESIS = 0.05
+VITALS_EXPIRY_HOURS = float(os.getenv("VITALS_EXPIRY_HOURS", "6"))
+
+INITIAL_CAPACITY = 256
+
+class VitalsStream:
+    def __init__(self, window=VITALS_WINDOW):
+        self.window = window
+        self.slots = {}          # patient_id -> slot
+        self.patients = []       # slot -> patient_id (None when free)
+        self.free = []
+        self._allocate(INITIAL_CAPACITY)
+        self.latest_scores = {}
+        self.last_scored_at = None
+
+    def _allocate(self, capacity):
+        old = getattr(self, "values", None)
+        n_vitals = len(VITALS)
+        values = np.full((capacity, self.window, n_vitals), np.nan)
+        sums = np.zeros((capacity, n_vitals))
+        sumsq = np.zeros((capacity, n_vitals))
+        counts = np.zeros((capacity, n_vitals))
+        head = np.zeros(capacity, dtype=int)
+        age = np.full(capacity, np.nan)
+        alerted = np.zeros(capacity, dtype=bool)
+        last_seen = np.zeros(capacity)
+        if old is not None:
+            n = old.shape[0]
+            values[:n], sums[:n], sumsq[:n], counts[:n] = old, self.sums, self.sumsq, self.counts
+            head[:n], age[:n], alerted[:n], last_seen[:n] = self.head, self.age, self.alerted, self.last_seen
+        self.values, self.sums, self.sumsq, self.counts = values, sums, sumsq, counts
+        self.head, self.age, self.alerted, self.last_seen = head, age, alerted, last_seen
+        start = len(self.patients)
+        self.patients.extend([None] * (capacity - start))
+        self.free.extend(range(capacity - 1, start - 1, -1))
+
+    def _slot(self, patient_id):
+        slot = self.slots.get(patient_id)
+        if slot is None:
+            if not self.free:
+                self._allocate(2 * len(self.patients))
+            slot = self.free.pop()
+            self.slots[patient_id] = slot
+            self.patients[slot] = patient_id
+        return slot
+
+    def is_monitored(self, patient_id):
+        return patient_id in self.slots
+
+    def ingest(self, patient_id, reading, age=None):
+        """Add one reading (dict keyed by VITALS; missing values allowed). O(1)."""
+        slot = self._slot(patient_id)
+        if age is not None:
+            self.age[slot] = float(age)
+
+        row = np.array([reading.get(v) if reading.get(v) is not None else np.nan for v in VITALS], dtype=float)
+        pos = self.head[slot]
+        evicted = self.values[slot, pos]
+
+        # Running sums over the window: drop the evicted reading, add the new one
+        out = ~np.isnan(evicted)
+        self.sums[slot, out] -= evicted[out]
+        self.sumsq[slot, out] -= evicted[out] ** 2
+        self.counts[slot, out] -= 1
+        inn = ~np.isnan(row)
+        self.sums[slot, inn] += row[inn]
+        self.sumsq[slot, inn] += row[inn] ** 2
+        self.counts[slot, inn] += 1
+
+        self.values[slot, pos] = row
+        self.head[slot] = (pos + 1) % self.window
+        self.last_seen[slot] = time.monotonic()
+
+    def discharge(self, patient_id):
+        """Stop monitoring a patient and recycle the slot."""
+        slot = self.slots.pop(patient_id, None)
+        if slot is None:
+            return
+        self.values[slot] = np.nan
+        self.sums[slot] = self.sumsq[slot] = self.counts[slot] = 0
+        self.head[slot] = 0
+        self.age[slot] = np.nan
+        self.alerted[slot] = False
+        self.patients[slot] = None
+        self.free.append(slot)
+        self.latest_scores.pop(patient_id, None)
+
+    def expire(self, max_idle_seconds=VITALS_EXPIRY_HOURS * 3600):
+        """Discharge every patient without a reading for `max_idle_seconds`. Returns how many."""
+        cutoff = time.monotonic() - max_idle_seconds
+        idle = [p for p, slot in self.slots.items() if self.last_seen[slot] < cutoff]
+        for patient_id in idle:
+            self.discharge(patient_id)
+        return len(idle)
+
+    def snapshot(self):
+        """Copy the active slots so scoring can run off the event loop."""
+        active = np.array(sorted(self.slots.values()), dtype=int)
+        return (
+            active,
+            self.values[active].copy(),
+            self.sums[active].copy(),
+            self.sumsq[active].copy(),
+            self.counts[active].copy(),
+            self.head[active].copy(),
+            self.age[active].copy()
+        )
+
+    @staticmethod
+    def window_features(values, sums, sumsq, counts, head):
+        """Vectorized windowed features for all patients: (n, n_vitals) each."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = sums / counts
+            variance = np.maximum(sumsq / counts - mean ** 2, 0) * counts / np.maximum(counts - 1, 1)
+            vmin = np.where(np.isnan(values), np.inf, values).min(axis=1)
+            vmax = np.where(np.isnan(values), -np.inf, values).max(axis=1)
+            vmin[np.isinf(vmin)] = np.nan
+            vmax[np.isinf(vmax)] = np.nan
+
+            # Trend: least-squares slope per reading, oldest -> newest
+            window = values.shape[1]
+            order = (np.arange(window)[None, :] - head[:, None]) % window   # 0 = oldest
+            t = np.broadcast_to(order[:, :, None], values.shape).astype(float)
+            mask = ~np.isnan(values)
+            n = mask.sum(axis=1)
+            t_mean = np.where(mask, t, 0).sum(axis=1) / n
+            dt = np.where(mask, t - t_mean[:, None, :], 0)
+            dy = np.where(mask, values - mean[:, None, :], 0)
+            trend = (dt * dy).sum(axis=1) / (dt ** 2).sum(axis=1)
+        return {"mean": mean, "variance": variance, "min": vmin, "max": vmax, "trend": trend}
+
+    @staticmethod
+    def score(model, age, features):
+        """
+        Feed the ICU-transfer model the worst value in each window:
+        lowest O2 and systolic BP, highest heart rate and temperature.
+        Model input order: age, o2_saturation, heart_rate, bp_systolic, temperature
+        (VITALS is ordered to match columns 1-4).
+        """
+        idx = {v: i for i, v in enumerate(VITALS)}
+        X = np.column_stack([
+            age,
+            features["min"][:, idx['o2_saturation']],
+            features["max"][:, idx['heart_rate']],
+            features["min"][:, idx['bp_systolic']],
+            features["max"][:, idx['temperature']],
+        ])
+        # Fill gaps with window means, then population-typical values
+        fallback = np.array([60.0, 97.0, 80.0, 120.0, 37.0])
+        X[:, 1:] = np.where(np.isnan(X[:, 1:]), features["mean"], X[:, 1:])
+        X = np.where(np.isnan(X), fallback, X)
+        return model.predict_proba(X)[:, 1]
+
+    async def tick(self):
+        """Score every monitored patient once and publish threshold crossings."""
+        from routers.ml_models import get_model
+        from routers.websocket import manager
+
+        self.expire()
+        if not self.slots:
+            return []
+        model = get_model('icu_transfer')
+        if model is None:
+            return []
+
+        active, values, sums, sumsq, counts, head, age = self.snapshot()
+        ids = [self.patients[slot] for slot in active]
+
+        def compute():
+            features = self.window_features(values, sums, sumsq, counts, head)
+            return features, self.score(model, age, features)
+
+        features, risk = await asyncio.to_thread(compute)
+
+        now = datetime.utcnow()
+        alerts = []
+        for i, (slot, patient_id) in enumerate(zip(active, ids)):
+            if self.slots.get(patient_id) != slot:   # discharged while scoring
+                continue
+            self.latest_scores[patient_id] = {
+                "risk": float(risk[i]),
+                "scored_at": now,
+                "trend": {v: None if np.isnan(features["trend"][i, j]) else round(float(features["trend"][i, j]), 3) for j, v in enumerate(VITALS)}
+            }
+            if risk[i] >= ICU_ALERT_THRESHOLD and not self.alerted[slot]:
+                self.alerted[slot] = True
+                alerts.append({
+                    "type": "icu_transfer_alert",
+                    "patient_id": patient_id,
+                    "risk": round(float(risk[i]), 3),
+                    "threshold": ICU_ALERT_THRESHOLD,
+                    "window": {
+                        v: {
+                            "min": None if np.isnan(features["min"][i, j]) else float(features["min"][i, j]),
+                            "max": None if np.isnan(features["max"][i, j]) else float(features["max"][i, j]),
+                            "trend": self.latest_scores[patient_id]["trend"][v]
+                        }
+                        for j, v in enumerate(VITALS)
+                    },
+                    "timestamp": now.isoformat()
+                })
+            elif risk[i] < ICU_ALERT_THRESHOLD - ICU_ALERT_HYSTERESIS:
+                self.alerted[slot] = False
+
+        self.last_scored_at = now
+        if alerts:
+            await mongo_db.icu_alerts.insert_many([dict(a) for a in alerts])
+            for alert in alerts:
+                await manager.broadcast(alert)
+        return alerts
+
+    async def run(self):
+        """Background loop started at application startup."""
+        while True:
+            await asyncio.sleep(ICU_SCORE_INTERVAL_SECONDS)
+            try:
+                await self.tick()
+            except Exception as e:
+                print(f"⚠️ ICU streaming scorer failed: {e}")
+
+vitals_stream = VitalsStream()
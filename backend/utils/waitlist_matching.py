@@ -0,0 +1,189 @@
+"""
+Waitlist-to-bed matching.
+
+Waiting patients and free beds are kept in memory, loaded once at startup
+and updated by events (patient joined or left the waitlist, bed freed or
+claimed). Each (patient, bed) pair has a score:
+
+    priority weight + bed type fit + ward/department match + wait hours * WAIT_WEIGHT
+
+The static part (everything except wait time) is stored as a matrix that
+grows and shrinks by one row or column per event; only the new row/column is
+computed. On every event the optimal assignment is re-solved as a weighted
+bipartite matching with `scipy.optimize.linear_sum_assignment`, adding the
+current wait times as a per-row vector. Pairs a patient cannot use (wrong
+required bed type) are forbidden. The department bonus applies when the
+bed's ward lists the entry's department in its `departments` (see the
+`wards` collection).
+
+The result is a proposal: `GET /operations/waitlist/matches` lists it and
+`POST /operations/waitlist/{id}/admit` claims the proposed bed.
+"""
+import time
+from datetime import datetime
+
+import numpy as np
+
+from database.database import mongo_db
+
+PRIORITY_WEIGHT = {"High": 100.0, "Medium": 50.0, "Low": 20.0}
+REQUIRED_TYPE_BONUS = 30.0
+# Patients without a required type are steered away from scarce beds
+UNREQUIRED_TYPE_SCORE = {"General": 10.0, "Private": 5.0, "Emergency": -10.0, "ICU": -25.0}
+DEPARTMENT_BONUS = 5.0
+WAIT_WEIGHT = 1.0   # per hour waited
+FORBIDDEN = -1e6
+
+class WaitlistMatcher:
+    def __init__(self):
+        self.patients = {}   # entry id -> waitlist entry
+        self.beds = {}       # bed id -> bed
+        self._rows = []      # entry ids in matrix row order
+        self._cols = []      # bed ids in matrix column order
+        self._static = np.zeros((0, 0))
+        self.ward_departments = {}   # ward name -> departments it serves (lowercase)
+        self.matches = []
+        self.solved_at = None
+        self.solve_ms = None
+
+    # --- Scoring ---
+
+    def _pair_scores(self, patients, beds):
+        """Static score matrix for lists of patients x beds."""
+        if not patients or not beds:
+            return np.zeros((len(patients), len(beds)))
+        bed_type = np.array([b.get("type", "General") for b in beds], dtype=object)
+        bed_departments = [self.ward_departments.get(b.get("ward"), set()) for b in beds]
+        unrequired = np.array([UNREQUIRED_TYPE_SCORE.get(t, 0.0) for t in bed_type])
+
+        rows = []
+        for p in patients:
+            required = p.get("required_bed_type")
+            if required:
+                row = np.where(bed_type == required, REQUIRED_TYPE_BONUS, FORBIDDEN)
+            else:
+                row = unrequired.copy()
+            row = row + PRIORITY_WEIGHT.get(p.get("priority"), PRIORITY_WEIGHT["Low"])
+            department = (p.get("department") or "").strip().lower()
+            if department:
+                row = row + np.array([DEPARTMENT_BONUS if department in d else 0.0 for d in bed_departments])
+            rows.append(row)
+        return np.vstack(rows)
+
+    # --- Incremental updates ---
+
+    def add_patient(self, entry):
+        entry_id = str(entry["_id"])
+        if entry_id in self.patients:
+            self.remove_patient(entry_id, solve=False)
+        self.patients[entry_id] = entry
+        row = self._pair_scores([entry], [self.beds[b] for b in self._cols])
+        self._static = np.vstack([self._static, row.reshape(1, len(self._cols))])
+        self._rows.append(entry_id)
+        self.solve()
+
+    def remove_patient(self, entry_id, solve=True):
+        if self.patients.pop(entry_id, None) is None:
+            return
+        i = self._rows.index(entry_id)
+        self._static = np.delete(self._static, i, axis=0)
+        del self._rows[i]
+        if solve:
+            self.solve()
+
+    def bed_freed(self, bed):
+        bed_id = str(bed["_id"])
+        if bed_id in self.beds:
+            self.bed_taken(bed_id, solve=False)
+        self.beds[bed_id] = bed
+        col = self._pair_scores([self.patients[p] for p in self._rows], [bed])
+        self._static = np.hstack([self._static, col.reshape(len(self._rows), 1)])
+        self._cols.append(bed_id)
+        self.solve()
+
+    def bed_taken(self, bed_id, solve=True):
+        if self.beds.pop(bed_id, None) is None:
+            return
+        j = self._cols.index(bed_id)
+        self._static = np.delete(self._static, j, axis=1)
+        del self._cols[j]
+        if solve:
+            self.solve()
+
+    def beds_taken(self, bed_ids):
+        for bed_id in bed_ids:
+            self.bed_taken(bed_id, solve=False)
+        self.solve()
+
+    # --- Solving ---
+
+    def solve(self, now=None):
+        from scipy.optimize import linear_sum_assignment
+
+        started = time.perf_counter()
+        now = now or datetime.utcnow()
+        matches = []
+        if self._rows and self._cols:
+            waited = np.array([
+                max((now - (self.patients[p].get("created_at") or now)).total_seconds() / 3600, 0.0)
+                for p in self._rows
+            ])
+            score = self._static + (waited * WAIT_WEIGHT)[:, None]
+            rows, cols = linear_sum_assignment(score, maximize=True)
+            for i, j in zip(rows, cols):
+                if self._static[i, j] <= FORBIDDEN / 2:
+                    continue
+                entry, bed = self.patients[self._rows[i]], self.beds[self._cols[j]]
+                matches.append({
+                    "waitlist_id": self._rows[i],
+                    "patient_id": entry.get("patient_id"),
+                    "priority": entry.get("priority"),
+                    "bed_id": self._cols[j],
+                    "bed_number": bed.get("bed_number"),
+                    "bed_type": bed.get("type", "General"),
+                    "ward": bed.get("ward"),
+                    "waited_hours": round(float(waited[i]), 2),
+                    "score": round(float(score[i, j]), 2)
+                })
+        matches.sort(key=lambda m: -m["score"])
+        self.matches = matches
+        self.solved_at = now
+        self.solve_ms = round((time.perf_counter() - started) * 1000, 3)
+        return matches
+
+    def set_ward(self, ward):
+        """Ward -> departments mapping changed: rescore every pair."""
+        self.ward_departments[ward["name"]] = {d.strip().lower() for d in ward.get("departments") or []}
+        self._static = self._pair_scores(
+            [self.patients[p] for p in self._rows], [self.beds[b] for b in self._cols]
+        ).reshape(len(self._rows), len(self._cols))
+        self.solve()
+
+    def match_for(self, entry_id):
+        return next((m for m in self.matches if m["waitlist_id"] == entry_id), None)
+
+    async def load(self):
+        """Rebuild state from MongoDB (application startup)."""
+        self.ward_departments = {
+            w["name"]: {d.strip().lower() for d in w.get("departments") or []}
+            async for w in mongo_db.wards.find({}, {"name": 1, "departments": 1})
+        }
+        patients = await mongo_db.waitlist.find({"status": "Waiting"}).to_list(None)
+        beds = await mongo_db.beds.find({"status": "Available"}, {"type": 1, "ward": 1, "bed_number": 1}).to_list(None)
+        self.patients = {str(p["_id"]): p for p in patients}
+        self.beds = {str(b["_id"]): b for b in beds}
+        self._rows, self._cols = list(self.patients), list(self.beds)
+        self._static = self._pair_scores(patients, beds).reshape(len(patients), len(beds))
+        self.solve()
+        print(f"🛏️ Waitlist matcher loaded: {len(patients)} waiting, {len(beds)} free beds, {len(self.matches)} matches")
+
+    def summary(self):
+        return {
+            "waiting": len(self._rows),
+            "free_beds": len(self._cols),
+            "matches": self.matches,
+            "solved_at": self.solved_at,
+            "solve_ms": self.solve_ms
+        }
+
+waitlist_matcher = WaitlistMatcher()
@@ -0,0 +1,194 @@
+"""
+In-memory priority queue over the waitlist.
+
+`IndexedPriorityQueue` is a binary min-heap with a key -> heap index map,
+so insert, priority change and removal of an arbitrary entry are all
+O(log n). A patient's position is the number of entries ahead of it, found
+by walking only the heap nodes that sort before it (O(position)).
+
+`waitlist_queue` holds the waiting entries ordered by (priority, joined
+at). It is rebuilt from MongoDB at startup and updated by the waitlist
+routes after every write.
+"""
+import heapq
+from datetime import datetime
+
+from database.database import mongo_db
+
+PRIORITY_RANK = {"High": 0, "Medium": 1, "Low": 2}
+
+class IndexedPriorityQueue:
+    def __init__(self):
+        self._heap = []   # keys
+        self._pos = {}    # key -> index in _heap
+        self._prio = {}   # key -> sortable priority
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, key):
+        return key in self._pos
+
+    def _less(self, i, j):
+        return self._prio[self._heap[i]] < self._prio[self._heap[j]]
+
+    def _swap(self, i, j):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._pos[heap[i]] = i
+        self._pos[heap[j]] = j
+
+    def _sift_up(self, i):
+        while i > 0:
+            parent = (i - 1) // 2
+            if not self._less(i, parent):
+                break
+            self._swap(i, parent)
+            i = parent
+        return i
+
+    def _sift_down(self, i):
+        n = len(self._heap)
+        while True:
+            smallest, left, right = i, 2 * i + 1, 2 * i + 2
+            if left < n and self._less(left, smallest):
+                smallest = left
+            if right < n and self._less(right, smallest):
+                smallest = right
+            if smallest == i:
+                return i
+            self._swap(i, smallest)
+            i = smallest
+
+    def push(self, key, priority):
+        """Insert, or change the priority of an existing key."""
+        if key in self._pos:
+            return self.update(key, priority)
+        self._prio[key] = priority
+        self._heap.append(key)
+        self._pos[key] = len(self._heap) - 1
+        self._sift_up(len(self._heap) - 1)
+
+    def update(self, key, priority):
+        self._prio[key] = priority
+        i = self._pos[key]
+        self._sift_down(self._sift_up(i))
+
+    def remove(self, key):
+        i = self._pos.pop(key)
+        del self._prio[key]
+        last = self._heap.pop()
+        if i < len(self._heap):
+            self._heap[i] = last
+            self._pos[last] = i
+            self._sift_down(self._sift_up(i))
+
+    def peek(self):
+        return self._heap[0] if self._heap else None
+
+    def priority(self, key):
+        return self._prio[key]
+
+    def ahead(self, key):
+        """Keys that sort before `key`: a heap walk pruned at the first node that does not."""
+        target = self._prio[key]
+        out, stack = [], [0] if self._heap else []
+        while stack:
+            i = stack.pop()
+            k = self._heap[i]
+            if self._prio[k] < target:
+                out.append(k)
+                stack += [c for c in (2 * i + 1, 2 * i + 2) if c < len(self._heap)]
+        return out
+
+    def ordered(self, limit=None):
+        """Keys in priority order (the first `limit` only if given)."""
+        if limit is None:
+            return sorted(self._heap, key=self._prio.__getitem__)
+        return heapq.nsmallest(limit, self._heap, key=self._prio.__getitem__)
+
+class WaitlistQueue:
+    def __init__(self):
+        self.queue = IndexedPriorityQueue()
+        self.entries = {}   # entry id -> waitlist entry
+
+    @staticmethod
+    def _priority(entry, entry_id):
+        # Ties broken by join time, then id, so the order is total and stable
+        return (
+            PRIORITY_RANK.get(entry.get("priority"), len(PRIORITY_RANK)),
+            entry.get("created_at") or datetime.min,
+            entry_id
+        )
+
+    def add(self, entry):
+        entry_id = str(entry["_id"])
+        self.entries[entry_id] = entry
+        self.queue.push(entry_id, self._priority(entry, entry_id))
+
+    def set_priority(self, entry_id, priority):
+        entry = self.entries[entry_id]
+        entry["priority"] = priority
+        self.queue.update(entry_id, self._priority(entry, entry_id))
+
+    def remove(self, entry_id):
+        if entry_id in self.queue:
+            self.queue.remove(entry_id)
+            del self.entries[entry_id]
+
+    def ordered(self, limit=None):
+        return [self.entries[k] for k in self.queue.ordered(limit)]
+
+    def ahead(self, entry_id):
+        return [self.entries[k] for k in self.queue.ahead(entry_id)]
+
+    async def load(self):
+        """Rebuild from MongoDB (application startup)."""
+        self.queue = IndexedPriorityQueue()
+        self.entries = {}
+        async for entry in mongo_db.waitlist.find({"status": "Waiting"}):
+            self.add(entry)
+        print(f"📋 Waitlist queue loaded: {len(self.queue)} waiting")
+
+waitlist_queue = WaitlistQueue()
+
+async def estimate_wait(entry_id, now=None):
+    """
+    Position and estimated wait for a waiting entry. Competing entries ahead
+    (same required bed type, or none required) take free beds first, then beds
+    in order of forecast discharge.
+    """
+    from utils.discharge_forecast import expected_releases
+    from utils.waitlist_matching import waitlist_matcher
+
+    entry = waitlist_queue.entries[entry_id]
+    required = entry.get("required_bed_type")
+    ahead = waitlist_queue.ahead(entry_id)
+    competing = [
+        e for e in ahead
+        if not required or not e.get("required_bed_type") or e.get("required_bed_type") == required
+    ]
+
+    free = sum(1 for b in waitlist_matcher.beds.values() if not required or b.get("type", "General") == required)
+    releases = await expected_releases(now)
+    pool = [r for t, rs in releases.items() if not required or t == required for r in rs]
+    # This patient gets the (len(competing) + 1)-th bed; beyond the free ones it waits for a discharge
+    needed = len(competing) - free
+    wait = None
+    if needed < 0:
+        wait = {"p10": 0.0, "p50": 0.0, "p90": 0.0}
+    elif needed < len(pool):
+        p10, p50, p90 = (sorted(r[q] for r in pool)[needed] for q in range(3))
+        wait = {"p10": round(p10 * 24, 1), "p50": round(p50 * 24, 1), "p90": round(p90 * 24, 1)}
+
+    return {
+        "waitlist_id": entry_id,
+        "patient_id": entry.get("patient_id"),
+        "priority": entry.get("priority"),
+        "position": len(ahead) + 1,
+        "waiting_total": len(waitlist_queue.queue),
+        "competing_ahead": len(competing),
+        "free_beds": free,
+        # None: more patients ahead than beds in the current census forecast
+        "estimated_wait_hours": wait
+    }